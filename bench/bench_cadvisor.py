@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#
+# Benchmark nagios/check_cadvisor.py against local cAdvisor stand-in
+# ===
+#
+# Runs check_cadvisor.py code paths against cadvisor_standin.py with
+# reproducible fixtures and reports median per-phase timings:
+# import, HTTP, JSON decode and evaluation.
+#
+# Modes:
+#   single  - one check per container, as Nagios runs it by default
+#   batch   - one /api/v1.2/docker/ request for all containers (-N/-r)
+#   v2      - batch over v2.0 stats/spec API with -S samples (-A 2.0)
+#   cached  - batch with warm on-disk response cache (-d)
+#   fleet   - batch over many stand-in nodes with asyncio fleet check
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+NAGIOS_DIR = os.path.join(BENCH_DIR, os.pardir, "nagios")
+sys.path.insert(0, NAGIOS_DIR)
+
+import requests  # noqa: E402
+import check_cadvisor  # noqa: E402
+import check_cadvisor_fleet  # noqa: E402
+import cadvisor_standin  # noqa: E402
+
+MODES = ("single", "batch", "v2", "cached", "fleet")
+PHASES = ("http", "decode", "eval")
+
+
+class Timer(object):
+    """Accumulate time spent in named phases"""
+    def __init__(self):
+        self.phases = dict((phase, 0.0) for phase in PHASES)
+
+    def get_json(self, session, url):
+        start = time.perf_counter()
+        text = session.get(url, timeout=30).text
+        middle = time.perf_counter()
+        payload = json.loads(text)
+        self.phases["http"] += middle - start
+        self.phases["decode"] += time.perf_counter() - middle
+        return payload
+
+    def evaluate(self, machine_data, hosts_data, args):
+        start = time.perf_counter()
+        for host_data in hosts_data:
+            if args.cpu:
+                check_cadvisor.evaluate_cpu(machine_data, host_data, 80, 90,
+                                            args.aggregation)
+            else:
+                check_cadvisor.evaluate_mem(machine_data, host_data, True,
+                                            80, 90, args.aggregation)
+        self.phases["eval"] += time.perf_counter() - start
+
+
+def measure_import():
+    """Return seconds spent importing check_cadvisor in fresh interpreter"""
+    code = ("import time; start = time.perf_counter(); import check_cadvisor; "
+            "print(time.perf_counter() - start)")
+    output = subprocess.check_output([sys.executable, "-c", code],
+                                     cwd=NAGIOS_DIR)
+    return float(output)
+
+
+def run_single(url, names, args):
+    timer = Timer()
+    for name in names:
+        session = requests.Session()
+        host_data = timer.get_json(session, url + "/api/v1.2/docker/" + name)
+        machine_data = timer.get_json(session, url + "/api/v1.2/machine")
+        timer.evaluate(machine_data, list(host_data.values()), args)
+        session.close()
+    return timer
+
+
+def run_batch(url, names, args):
+    timer = Timer()
+    session = requests.Session()
+    hosts_data = timer.get_json(session, url + "/api/v1.2/docker/")
+    machine_data = timer.get_json(session, url + "/api/v1.2/machine")
+    selected = check_cadvisor.select_hosts(list(hosts_data.values()), names)
+    timer.evaluate(machine_data, selected, args)
+    return timer
+
+
+def run_v2(url, names, args):
+    timer = Timer()
+    session = requests.Session()
+    stats = timer.get_json(session, url + "/api/v2.0/stats/?type=docker"
+                           "&recursive=true&count=%d" % args.v2_samples)
+    spec = timer.get_json(session, url + "/api/v2.0/spec/?type=docker"
+                          "&recursive=true")
+    machine_data = timer.get_json(session, url + "/api/v1.2/machine")
+    start = time.perf_counter()
+    hosts_data = check_cadvisor.merge_v2_data(stats, spec)
+    timer.phases["decode"] += time.perf_counter() - start
+    selected = check_cadvisor.select_hosts(hosts_data, names)
+    timer.evaluate(machine_data, selected, args)
+    return timer
+
+
+def run_cached(url, names, args, cache):
+    timer = Timer()
+    session = requests.Session()
+    # decoding is part of cache reads, account it all as http
+    start = time.perf_counter()
+    hosts_data = check_cadvisor.get_all_hosts_data(url, session, cache)
+    machine_data = check_cadvisor.get_machine_data(url, session, cache)
+    timer.phases["http"] += time.perf_counter() - start
+    selected = check_cadvisor.select_hosts(hosts_data, names)
+    timer.evaluate(machine_data, selected, args)
+    return timer
+
+
+def run_fleet(urls, names, args):
+    timer = Timer()
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    try:
+        results = loop.run_until_complete(check_cadvisor_fleet.fetch_fleet(
+            urls, args.concurrency, 30, None))
+    finally:
+        loop.close()
+    timer.phases["http"] += time.perf_counter() - start
+    for url, data, error in results:
+        if error is not None:
+            raise RuntimeError("%s: %s" % (url, error))
+        machine_data, hosts_data = data
+        timer.evaluate(machine_data,
+                       check_cadvisor.select_hosts(hosts_data, names), args)
+    return timer
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def benchmark(args):
+    fixtures = cadvisor_standin.build_fixtures(args.containers, args.samples,
+                                               args.seed)
+    names = ["container%d" % i for i in range(min(args.checks,
+                                                  args.containers))]
+    servers = [cadvisor_standin.start_server(fixtures, latency=args.latency)
+               for _ in range(args.nodes if "fleet" in args.modes else 1)]
+    url = servers[0].url
+    cache_dir = tempfile.mkdtemp(prefix="bench_cadvisor")
+    cache = check_cadvisor.ResponseCache(cache_dir, 3600, 3600)
+    results = {"import": median([measure_import() for _ in range(args.runs)]),
+               "modes": {}}
+    try:
+        for mode in args.modes:
+            timings = []
+            sent = []
+            if mode == "cached":
+                # warm up cache, so runs measure cache hits only
+                run_cached(url, names, args, cache)
+            for _ in range(args.runs):
+                sent_before = sum(s.bytes_sent for s in servers)
+                start = time.perf_counter()
+                if mode == "single":
+                    timer = run_single(url, names, args)
+                elif mode == "batch":
+                    timer = run_batch(url, names, args)
+                elif mode == "v2":
+                    timer = run_v2(url, names, args)
+                elif mode == "cached":
+                    timer = run_cached(url, names, args, cache)
+                else:
+                    timer = run_fleet([s.url for s in servers], names, args)
+                timer.phases["total"] = time.perf_counter() - start
+                timings.append(timer)
+                sent.append(sum(s.bytes_sent for s in servers) - sent_before)
+            results["modes"][mode] = dict(
+                (phase, median([t.phases[phase] for t in timings]))
+                for phase in PHASES + ("total",))
+            results["modes"][mode]["bytes"] = sent[-1]
+    finally:
+        shutil.rmtree(cache_dir)
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    return results
+
+
+def print_results(results, args):
+    print("%d containers x %d samples, %d checked, %d runs, latency %.3fs" %
+          (args.containers, args.samples, min(args.checks, args.containers),
+           args.runs, args.latency))
+    print("import: %.2f ms" % (results["import"] * 1000))
+    print("%-8s %10s %10s %10s %10s %12s" % ("mode", "http ms", "decode ms",
+                                            "eval ms", "total ms", "bytes"))
+    for mode, timing in results["modes"].items():
+        print("%-8s %10.2f %10.2f %10.2f %10.2f %12d" % (
+            mode, timing["http"] * 1000, timing["decode"] * 1000,
+            timing["eval"] * 1000, timing["total"] * 1000, timing["bytes"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark check_cadvisor.py')
+    parser.add_argument('-m', dest='modes', action='append', choices=MODES,
+                        help='Mode to benchmark, may be given multiple times '
+                             '(default: all)')
+    parser.add_argument('-n', dest='containers', type=int, default=100,
+                        help='Number of containers on node (default: 100)')
+    parser.add_argument('-s', dest='samples', type=int, default=60,
+                        help='Stats samples per container (default: 60)')
+    parser.add_argument('-k', dest='checks', type=int, default=20,
+                        help='Number of containers to check (default: 20)')
+    parser.add_argument('-S', dest='v2_samples', type=int, default=2,
+                        help='Samples requested in v2 mode (default: 2)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    parser.add_argument('-N', dest='nodes', type=int, default=10,
+                        help='Number of nodes in fleet mode (default: 10)')
+    parser.add_argument('-j', dest='concurrency', type=int, default=20,
+                        help='Fleet mode concurrency (default: 20)')
+    parser.add_argument('-r', dest='runs', type=int, default=5,
+                        help='Runs per mode, median is reported (default: 5)')
+    parser.add_argument('-a', dest='aggregation', default='mean',
+                        choices=check_cadvisor.AGGREGATIONS,
+                        help='Stats aggregation (default: mean)')
+    parser.add_argument('-M', dest='cpu', action='store_false',
+                        help='Evaluate memory instead of CPU checks')
+    parser.add_argument('--seed', dest='seed', type=int, default=0,
+                        help='Seed for generated fixtures (default: 0)')
+    parser.add_argument('--json', dest='json', action='store_true',
+                        help='Print results as JSON')
+    args = parser.parse_args()
+    args.modes = args.modes or list(MODES)
+    results = benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_results(results, args)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+#
+# Benchmark zabbix/data_collectors and RAID nagios checks
+# ===
+#
+# Runs every collector end to end in fresh interpreter against
+# fake_cli.py tw-cli, hpacucli and rabbitmqctl, and HTTP and SNMP
+# stand-ins of RabbitMQ management API, Riak, switches and printers
+# at configurable scale, and reports median wall time, number of
+# CLI calls and exit code, both with cold and warm snapshot caches.
+# Parsers are also timed in-process on the same generated output.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, os.pardir)
+COLLECTORS_DIR = os.path.join(ROOT_DIR, "zabbix", "data_collectors")
+NAGIOS_DIR = os.path.join(ROOT_DIR, "nagios")
+sys.path.insert(0, COLLECTORS_DIR)
+
+import fake_cli  # noqa: E402
+import rabbitmq_api_standin  # noqa: E402
+import riak_standin  # noqa: E402
+import snmp_standin  # noqa: E402
+import printer_standin  # noqa: E402
+import tw_snapshot  # noqa: E402
+import hpacucli_snapshot  # noqa: E402
+import rabbitmq_discovery  # noqa: E402
+import rabbitmq_queue_stats  # noqa: E402
+
+# Runs collector in child interpreter: zabbix scripts are imported and
+# their main() called after binary and cache paths are patched, nagios
+# checks are run as __main__ with tools from PATH.
+RUNNER = """
+import os, sys, json, runpy, importlib.util
+path, patches, argv = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3:]
+sys.path.insert(0, os.path.dirname(os.path.realpath(path)))
+# nagios checks prepend sudo for non-root users
+os.getuid = lambda: 0
+sys.argv = [path] + argv
+script_patches = patches.pop('', None)
+for name, attrs in patches.items():
+    module = __import__(name)
+    for attr, value in attrs.items():
+        setattr(module, attr, value)
+if script_patches is None:
+    runpy.run_path(path, run_name='__main__')
+else:
+    spec = importlib.util.spec_from_file_location('collector', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for attr, value in script_patches.items():
+        setattr(module, attr, value)
+    module.main()
+"""
+
+
+def collectors(fakebin, cache_dir, api_url, riak_url, switches, printers):
+    """Return [(name, path, argv, patches)] of benchmarked collectors"""
+    tw_cli = os.path.join(fakebin, "tw-cli")
+    hpacucli = os.path.join(fakebin, "hpacucli")
+    tw_cache = os.path.join(cache_dir, "tw.json")
+    hp_cache = os.path.join(cache_dir, "hp.json")
+    tw = {"binary_path": tw_cli, "cache_file": tw_cache}
+    hp = {"binary_path": hpacucli, "cache_file": hp_cache}
+    rabbit = {"cache_dir": cache_dir}
+    riak = {"cache_dir": cache_dir}
+    mac = {"cache_dir": cache_dir}
+    toner = {"cache_dir": cache_dir}
+    printers_file = os.path.join(fakebin, "printers.conf")
+    with open(printers_file, "w") as f:
+        for printer, model in printers:
+            f.write("%s %s\n" % (printer, model))
+    return [
+        ("3ware_discovery", os.path.join(COLLECTORS_DIR, "3ware_discovery.py"),
+         [], {"": tw}),
+        ("3ware_status", os.path.join(COLLECTORS_DIR, "3ware_status.py"),
+         ["c0u0p0"], {"": tw}),
+        ("check_3ware", os.path.join(NAGIOS_DIR, "check_3ware.py"),
+         ["-f", tw_cache], {}),
+        ("check_3ware -a", os.path.join(NAGIOS_DIR, "check_3ware.py"),
+         ["-f", tw_cache, "-a"], {}),
+        ("smartarray_discovery",
+         os.path.join(COLLECTORS_DIR, "smartarray_discovery.py"),
+         [], {"": hp}),
+        ("smartarray_status",
+         os.path.join(COLLECTORS_DIR, "smartarray_status.py"),
+         ["0:1I:1:1"], {"": hp}),
+        ("check_smartarray", os.path.join(NAGIOS_DIR, "check_smartarray.py"),
+         ["-f", hp_cache], {}),
+        ("raid_trapper", os.path.join(COLLECTORS_DIR, "raid_trapper.py"),
+         ["--dry-run", "-t", "3ware", "-t", "smartarray", "-s", "bench",
+          "-c", os.devnull], {"": {}, "tw_snapshot": tw,
+                              "hpacucli_snapshot": hp}),
+        ("rabbitmq_discovery",
+         os.path.join(COLLECTORS_DIR, "rabbitmq_discovery.py"), [], {"": {}}),
+        ("rabbitmq_discovery -a",
+         os.path.join(COLLECTORS_DIR, "rabbitmq_discovery.py"),
+         ["-a", api_url], {"": {}}),
+        ("rabbitmq_queue_stats",
+         os.path.join(COLLECTORS_DIR, "rabbitmq_queue_stats.py"),
+         ["/", "queue.1", "messages"], {"": rabbit}),
+        ("rabbitmq_queue_stats -a",
+         os.path.join(COLLECTORS_DIR, "rabbitmq_queue_stats.py"),
+         ["-a", api_url, "/", "queue.1", "messages"], {"": rabbit}),
+        ("riak_stats", os.path.join(COLLECTORS_DIR, "riak_stats.py"),
+         ["-a", riak_url, "node_gets", "node_get_fsm_time_95"],
+         {"": riak}),
+        ("riak_stats --trapper", os.path.join(COLLECTORS_DIR, "riak_stats.py"),
+         ["-a", riak_url, "--trapper", "--dry-run", "-s", "bench",
+          "-c", os.devnull], {"": riak}),
+        ("mac_table", os.path.join(COLLECTORS_DIR, "mac_table.py"),
+         [switches[0], "5"], {"": mac}),
+        ("mac_table -r", os.path.join(COLLECTORS_DIR, "mac_table.py"),
+         ["-r"] + switches, {"": mac}),
+        ("toner_levels", os.path.join(COLLECTORS_DIR, "toner_levels.py"),
+         ["-f", printers_file, printers[0][0], "Black"], {"": toner}),
+        ("toner_levels -r", os.path.join(COLLECTORS_DIR, "toner_levels.py"),
+         ["-f", printers_file, "-r"], {"": toner}),
+    ]
+
+
+def fake_env(args, fakebin, log):
+    env = dict(os.environ)
+    env["PATH"] = fakebin + os.pathsep + env.get("PATH", "")
+    env.update({
+        "FAKE_CLI_CONTROLLERS": str(args.controllers),
+        "FAKE_CLI_DISKS": str(args.disks),
+        "FAKE_CLI_BAD_EVERY": str(args.bad_every),
+        "FAKE_CLI_VHOSTS": str(args.vhosts),
+        "FAKE_CLI_QUEUES": str(args.queues),
+        "FAKE_CLI_LATENCY": str(args.latency),
+        "FAKE_CLI_LOG": log})
+    for name, value in (("FAIL", args.fail), ("HANG", args.hang)):
+        if value:
+            env["FAKE_CLI_" + name] = value
+    return env
+
+
+def clear_cache(cache_dir):
+    for name in os.listdir(cache_dir):
+        os.unlink(os.path.join(cache_dir, name))
+
+
+def run_collector(path, argv, patches, env, log):
+    """Run collector once, return (seconds, CLI calls, rc, output bytes)"""
+    if os.path.exists(log):
+        os.unlink(log)
+    command = [sys.executable, "-c", RUNNER, path, json.dumps(patches)] + argv
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    calls = 0
+    if os.path.exists(log):
+        with open(log) as f:
+            calls = len(f.readlines())
+    if b"Traceback" in process.stderr:
+        sys.stderr.write(process.stderr.decode("utf-8", "replace"))
+    return elapsed, calls, process.returncode, len(process.stdout)
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def time_call(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+
+def bench_parsers(args):
+    """Return {parser: median seconds} on generated output"""
+    os.environ["FAKE_CLI_BAD_EVERY"] = str(args.bad_every)
+    tw_info = fake_cli.tw_info(args.controllers)
+    tw_controller = fake_cli.tw_controller(args.disks)
+    tw_alarms = fake_cli.tw_alarms("c0")
+    hp_config = fake_cli.hp_config(args.controllers, args.disks)
+    vhosts = fake_cli.rabbit_vhosts(args.vhosts).splitlines()
+    queues = fake_cli.rabbit_queues(["/"], args.queues, ["name"]).splitlines()
+    all_queues = fake_cli.rabbit_queues(
+        fake_cli.vhost_names(args.vhosts), args.queues,
+        ["vhost", "name"]).splitlines()
+    all_stats = fake_cli.rabbit_queues(
+        fake_cli.vhost_names(args.vhosts), args.queues,
+        ["vhost", "name"] + rabbitmq_queue_stats.METRICS).splitlines()
+    return {
+        "tw_snapshot.parse_controllers": time_call(
+            lambda: tw_snapshot.parse_controllers(tw_info), args.runs),
+        "tw_snapshot.parse_disks x controllers": time_call(
+            lambda: [tw_snapshot.parse_disks(tw_controller)
+                     for _ in range(args.controllers)], args.runs),
+        "tw_snapshot.parse_alarms": time_call(
+            lambda: tw_snapshot.parse_alarms(tw_alarms), args.runs),
+        "hpacucli_snapshot.parse_config": time_call(
+            lambda: hpacucli_snapshot.parse_config(hp_config), args.runs),
+        "rabbitmq_discovery.parse_vhosts": time_call(
+            lambda: list(rabbitmq_discovery.parse_vhosts(vhosts)), args.runs),
+        "rabbitmq_discovery.parse_stat x vhosts": time_call(
+            lambda: [list(rabbitmq_discovery.parse_stat(queues, "/"))
+                     for _ in range(args.vhosts)], args.runs),
+        "rabbitmq_discovery.parse_queues": time_call(
+            lambda: list(rabbitmq_discovery.parse_queues(all_queues)),
+            args.runs),
+        "rabbitmq_queue_stats.parse_stats": time_call(
+            lambda: rabbitmq_queue_stats.parse_stats(all_stats), args.runs),
+    }
+
+
+def benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_collectors")
+    fakebin = os.path.join(work_dir, "bin")
+    cache_dir = os.path.join(work_dir, "cache")
+    os.makedirs(cache_dir)
+    log = os.path.join(work_dir, "calls.log")
+    fake_cli.install(fakebin)
+    env = fake_env(args, fakebin, log)
+    api = rabbitmq_api_standin.start_server(args.vhosts, args.queues,
+                                            latency=args.latency)
+    riak = riak_standin.start_server(latency=args.latency)
+    switches = [snmp_standin.start_server(macs=args.macs, seed=index,
+                                          latency=args.latency)
+                for index in range(args.switches)]
+    models = sorted(printer_standin.MODELS)
+    printers = [printer_standin.start_server(models[index % len(models)],
+                                             seed=index, latency=args.latency)
+                for index in range(args.printers)]
+    results = {"interpreter": time_call(
+        lambda: subprocess.run([sys.executable, "-c", "pass"]), args.runs),
+        "collectors": {}, "parsers": bench_parsers(args)}
+    try:
+        for name, path, argv, patches in collectors(fakebin, cache_dir,
+                                                    api.url, riak.url,
+                                                    [s.address for s in
+                                                     switches],
+                                                    [(p.address, p.model)
+                                                     for p in printers]):
+            if args.only and not any(o in name for o in args.only):
+                continue
+            result = {}
+            for mode in ("cold", "warm"):
+                timings = []
+                for _ in range(args.runs):
+                    if mode == "cold":
+                        clear_cache(cache_dir)
+                    else:
+                        # warm up cache outside of measured run
+                        run_collector(path, argv, patches, env, log)
+                    elapsed, calls, rc, size = run_collector(
+                        path, argv, patches, env, log)
+                    timings.append(elapsed)
+                result[mode] = median(timings)
+                result[mode + "_calls"] = calls
+                result["rc"] = rc
+                result["bytes"] = size
+            results["collectors"][name] = result
+    finally:
+        for server in [api, riak] + switches + printers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(work_dir)
+    return results
+
+
+def print_results(results, args):
+    print("%d controllers x %d disks, %d vhosts x %d queues, "
+          "%d switches x %d MACs, %d printers, %d runs, latency %.3fs" % (
+              args.controllers, args.disks, args.vhosts, args.queues,
+              args.switches, args.macs, args.printers, args.runs,
+              args.latency))
+    print("interpreter startup: %.2f ms" % (results["interpreter"] * 1000))
+    print("%-24s %10s %6s %10s %6s %4s %10s" % (
+        "collector", "cold ms", "calls", "warm ms", "calls", "rc", "bytes"))
+    for name, result in results["collectors"].items():
+        print("%-24s %10.2f %6d %10.2f %6d %4d %10d" % (
+            name, result["cold"] * 1000, result["cold_calls"],
+            result["warm"] * 1000, result["warm_calls"], result["rc"],
+            result["bytes"]))
+    print("%-40s %10s" % ("parser", "ms"))
+    for name, seconds in results["parsers"].items():
+        print("%-40s %10.2f" % (name, seconds * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark zabbix collectors and RAID checks')
+    parser.add_argument('-C', dest='controllers', type=int, default=4,
+                        help='Number of RAID controllers (default: 4)')
+    parser.add_argument('-D', dest='disks', type=int, default=500,
+                        help='Disks per controller (default: 500)')
+    parser.add_argument('-b', dest='bad_every', type=int, default=0,
+                        help='Make every Nth disk bad (default: 0, none)')
+    parser.add_argument('-V', dest='vhosts', type=int, default=10,
+                        help='Number of RabbitMQ vhosts (default: 10)')
+    parser.add_argument('-Q', dest='queues', type=int, default=10000,
+                        help='Queues per vhost (default: 10000)')
+    parser.add_argument('-S', dest='switches', type=int, default=8,
+                        help='Number of SNMP switches (default: 8)')
+    parser.add_argument('-M', dest='macs', type=int, default=1000,
+                        help='MACs per switch (default: 1000)')
+    parser.add_argument('-P', dest='printers', type=int, default=6,
+                        help='Number of printers (default: 6)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per CLI call in seconds')
+    parser.add_argument('-F', dest='fail',
+                        help='Fail CLI calls with arguments matching regexp')
+    parser.add_argument('-H', dest='hang',
+                        help='Hang CLI calls with arguments matching regexp')
+    parser.add_argument('-r', dest='runs', type=int, default=5,
+                        help='Runs per collector, median is reported '
+                             '(default: 5)')
+    parser.add_argument('-o', dest='only', action='append',
+                        help='Benchmark only collectors with names '
+                             'containing this, may be given multiple times')
+    parser.add_argument('--json', dest='json', action='store_true',
+                        help='Print results as JSON')
+    args = parser.parse_args()
+    results = benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_results(results, args)
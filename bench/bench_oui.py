@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#
+# Benchmark MAC vendor lookups
+# ===
+#
+# Generates oui.txt in IEEE format with configurable number of
+# entries and compares vendor lookup of list of MACs with the
+# awk scan mac.sh used to run per MAC, oui.py per MAC and
+# single oui.py -b batch call. Results of all modes are checked to
+# be the same.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+OUI = os.path.join(BENCH_DIR, os.pardir, "zabbix", "data_collectors",
+                   "oui.py")
+
+# the scan mac.sh did for every lookup, prefix is upper-cased
+# for awks without IGNORECASE
+AWK_SCAN = ("awk -v IGNORECASE=1 "
+            "'/hex/ && /%s/ {for (x=3; x<=NF; x++) {printf(\"%%s \",$x)}}' %s")
+
+
+def generate_oui(path, entries, seed=1):
+    """Write oui.txt with entries random registrations, return prefixes"""
+    rnd = random.Random(seed)
+    prefixes = sorted(rnd.sample(range(1 << 24), entries))
+    with open(path, "w") as f:
+        f.write("OUI/MA-L%52sOrganization\ncompany_id%50sOrganization\n"
+                "%60sAddress\n\n" % ("", "", ""))
+        for prefix in prefixes:
+            name = "Vendor %06X %s, Inc." % (prefix, rnd.choice(
+                ("Networks", "Systems", "Electronics Co.,Ltd",
+                 "Technologies")))
+            f.write("%02X-%02X-%02X   (hex)\t\t%s\n" % (
+                prefix >> 16, (prefix >> 8) & 0xff, prefix & 0xff, name))
+            f.write("%06X     (base 16)\t\t%s\n" % (prefix, name))
+            f.write("\t\t\t\t%d Industrial Road\n\t\t\t\tSpringfield  CA  "
+                    "9%04d\n\t\t\t\tUS\n\n" % (prefix % 1000, prefix % 10000))
+    return prefixes
+
+
+def random_macs(prefixes, count, seed=2):
+    """Return macs, mostly of registered prefixes"""
+    rnd = random.Random(seed)
+    macs = []
+    for _ in range(count):
+        prefix = rnd.choice(prefixes) if rnd.random() < 0.9 else \
+            rnd.randrange(1 << 24)
+        value = (prefix << 24) | rnd.randrange(1 << 24)
+        macs.append(":".join("%02x" % ((value >> shift) & 0xff)
+                             for shift in range(40, -8, -8)))
+    return macs
+
+
+def awk_lookup(mac, path):
+    prefix = mac.replace(":", "-")[:8].upper()
+    result = subprocess.run(AWK_SCAN % (prefix, path), shell=True,
+                            stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    # mac.sh printed it with unquoted echo -n
+    return " ".join(result.split()) or "no info"
+
+
+def oui_lookup(mac, path):
+    return subprocess.run([sys.executable, OUI, "-f", path, "-s", mac],
+                          stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+
+def oui_batch(macs, path):
+    output = subprocess.run([sys.executable, OUI, "-f", path, "-b"] + macs,
+                            stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return [line.split("\t", 1)[1] for line in output.splitlines()]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_oui")
+    try:
+        path = os.path.join(work_dir, "oui.txt")
+        prefixes = generate_oui(path, args.entries)
+        macs = random_macs(prefixes, args.macs)
+        results = {"oui_txt_bytes": os.path.getsize(path)}
+        results["index_build"], _ = timed(lambda: oui_batch(macs[:1], path))
+        results["index_bytes"] = os.path.getsize(path + ".idx")
+        modes = [("oui.py -b", lambda: oui_batch(macs, path)),
+                 ("oui.py per mac",
+                  lambda: [oui_lookup(mac, path) for mac in macs])]
+        if not args.no_awk:
+            modes.append(("awk per mac",
+                          lambda: [awk_lookup(mac, path) for mac in macs]))
+        vendors = None
+        for name, func in modes:
+            results[name], found = timed(func)
+            if vendors is not None and found != vendors:
+                sys.exit("%s results differ" % name)
+            vendors = found
+    finally:
+        shutil.rmtree(work_dir)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark MAC vendor lookups')
+    parser.add_argument('-e', dest='entries', type=int, default=30000,
+                        help='Entries in generated oui.txt (default: 30000)')
+    parser.add_argument('-m', dest='macs', type=int, default=200,
+                        help='MACs to resolve (default: 200)')
+    parser.add_argument('--no-awk', dest='no_awk', action='store_true',
+                        help='Skip awk scans, which take long on big lists')
+    parser.add_argument('--json', dest='json', action='store_true',
+                        help='Print results as JSON')
+    args = parser.parse_args()
+    results = benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print("oui.txt %d entries, %d bytes, index %d bytes built in %.2f ms"
+              % (args.entries, results["oui_txt_bytes"],
+                 results["index_bytes"], results["index_build"] * 1000))
+        print("%-20s %10s %12s" % ("mode", "total ms", "per mac ms"))
+        for name in ("oui.py -b", "oui.py per mac", "awk per mac"):
+            if name in results:
+                print("%-20s %10.2f %12.3f" % (
+                    name, results[name] * 1000,
+                    results[name] * 1000 / args.macs))
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+#
+# Local cAdvisor stand-in server
+# ===
+#
+# Serves recorded or generated cAdvisor and cAdvisor-companion payloads
+# for benchmarking nagios/check_cadvisor.py without a live cAdvisor:
+#
+#   /api/v1.2/machine, /api/v1.2/docker/[<name>],
+#   /api/v2.0/stats/[<name>], /api/v2.0/spec/[<name>],
+#   /api/v1.0/docker/<id>/processes (companion)
+#
+# Payloads are either generated from a seed (-n containers, -s samples)
+# or loaded from a directory recorded from live cAdvisor with --record.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+from urllib.request import urlopen
+
+NUM_CORES = 8
+MEMORY_CAPACITY = 32 * 1024 ** 3
+START_TIME = 1420070400
+
+
+def format_timestamp(seconds):
+    """Format seconds since epoch as cAdvisor RFC 3339 timestamp"""
+    whole = int(seconds // 1)
+    nanos = int(round((seconds % 1) * 1e9))
+    if nanos == 10 ** 9:
+        # fraction rounded up to next second
+        whole, nanos = whole + 1, 0
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(whole)) + \
+        ".%09dZ" % nanos
+
+
+def generate_container(rand, index, samples):
+    """Generate v1.2 data for one container"""
+    container_id = "%064x" % rand.getrandbits(256)
+    cpu_share = rand.uniform(0.01, 2.0)
+    mem_base = rand.randint(64, 2048) * 1024 ** 2
+    cpu_total = rand.randint(10 ** 9, 10 ** 12)
+    stats = []
+    for sample in range(samples):
+        cpu_used = int(cpu_share * 1e9 * rand.uniform(0.5, 1.5))
+        cpu_total += cpu_used
+        mem_usage = int(mem_base * rand.uniform(0.9, 1.1))
+        stats.append({
+            "timestamp": format_timestamp(START_TIME + sample +
+                                          rand.uniform(0, 0.01)),
+            "cpu": {
+                "usage": {
+                    "total": cpu_total,
+                    "per_cpu_usage": [cpu_total // NUM_CORES] * NUM_CORES,
+                    "user": cpu_total * 7 // 10,
+                    "system": cpu_total * 3 // 10},
+                "load_average": 0},
+            "memory": {
+                "usage": mem_usage,
+                "cache": mem_usage // 4,
+                "rss": mem_usage * 3 // 4,
+                "working_set": mem_usage * 9 // 10,
+                "failcnt": 0},
+            "network": {
+                "name": "eth0",
+                "rx_bytes": sample * 1500 * 100,
+                "rx_packets": sample * 100,
+                "tx_bytes": sample * 1500 * 80,
+                "tx_packets": sample * 80,
+                "rx_errors": 0, "rx_dropped": 0,
+                "tx_errors": 0, "tx_dropped": 0},
+            "filesystem": [{
+                "device": "/dev/mapper/docker-%s" % container_id[:12],
+                "capacity": 10 * 1024 ** 3,
+                "usage": mem_base,
+                "reads_completed": sample, "writes_completed": sample}]})
+    return {
+        "name": "/docker/" + container_id,
+        "aliases": ["container%d" % index, container_id],
+        "namespace": "docker",
+        "spec": {
+            "creation_time": format_timestamp(START_TIME - 86400),
+            "labels": {"com.example.service": "service%d" % (index % 10)},
+            "has_cpu": True,
+            "cpu": {"limit": 1024, "max_limit": 0, "mask": "0-7"},
+            "has_memory": True,
+            "memory": {"limit": rand.choice([512, 1024, 4096]) * 1024 ** 2,
+                       "swap_limit": 18446744073709551615},
+            "has_network": True,
+            "has_filesystem": True,
+            "image": "example/service%d:latest" % (index % 10)},
+        "stats": stats}
+
+
+def generate_processes(rand, count=5):
+    """Generate cAdvisor-companion processes payload"""
+    processes = []
+    for pid in range(1, count + 1):
+        processes.append({
+            "status": {"RealUid": 0, "VmRSS": rand.randint(1000, 100000),
+                       "VmSize": rand.randint(100000, 1000000)},
+            "stat": {"pid": pid, "state": "S"},
+            "relativecpuusage": rand.uniform(0, 100),
+            "cmdline": "/usr/bin/service --worker %d" % pid})
+    return [{"processes": processes}]
+
+
+def build_fixtures(containers, samples, seed=0):
+    """Generate reproducible fixtures, return dict of payloads"""
+    rand = random.Random(seed)
+    docker = {}
+    for index in range(containers):
+        container = generate_container(rand, index, samples)
+        docker[container["name"]] = container
+    return {
+        "machine": {"num_cores": NUM_CORES,
+                    "memory_capacity": MEMORY_CAPACITY,
+                    "machine_id": "standin", "cpu_frequency_khz": 2400000},
+        "docker": docker,
+        "processes": generate_processes(rand)}
+
+
+def load_fixtures(directory):
+    """Load fixtures recorded with record_fixtures"""
+    fixtures = {}
+    for name in ("machine", "docker", "processes"):
+        path = os.path.join(directory, name + ".json")
+        if os.path.exists(path):
+            with open(path) as f:
+                fixtures[name] = json.load(f)
+    fixtures.setdefault("processes", generate_processes(random.Random(0)))
+    return fixtures
+
+
+def record_fixtures(cadvisor_url, directory):
+    """Save live cAdvisor responses as fixtures"""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name, path in (("machine", "/api/v1.2/machine"),
+                       ("docker", "/api/v1.2/docker/")):
+        payload = json.loads(urlopen(cadvisor_url + path, timeout=30).read()
+                             .decode("utf-8"))
+        with open(os.path.join(directory, name + ".json"), "w") as f:
+            json.dump(payload, f)
+
+
+class Payloads(object):
+    """Pre-serialized responses for fixtures"""
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.by_alias = {}
+        for key, container in fixtures["docker"].items():
+            for alias in container.get("aliases", []) + [key]:
+                self.by_alias[alias] = key
+        self.machine = self.encode(fixtures["machine"])
+        self.docker = self.encode(fixtures["docker"])
+        self.processes = self.encode(fixtures["processes"])
+
+    @staticmethod
+    def encode(payload):
+        return json.dumps(payload).encode("utf-8")
+
+    def select(self, name):
+        """Return containers matching name, all for empty name"""
+        name = name.strip("/")
+        docker = self.fixtures["docker"]
+        if not name or name == "docker":
+            return docker
+        key = self.by_alias.get(name) or self.by_alias.get("/" + name)
+        return {key: docker[key]} if key else {}
+
+    def v1(self, name):
+        if not name.strip("/"):
+            return self.docker
+        return self.encode(self.select(name))
+
+    def v2_stats(self, name, count):
+        result = {}
+        for key, container in self.select(name).items():
+            result[key] = container["stats"][-count:]
+        return self.encode(result)
+
+    def v2_spec(self, name):
+        result = {}
+        for key, container in self.select(name).items():
+            spec = dict(container["spec"])
+            spec["aliases"] = container.get("aliases", [])
+            result[key] = spec
+        return self.encode(result)
+
+    def response(self, path, query):
+        """Return body for request path or None if not found"""
+        if path.endswith("/processes"):
+            return self.processes
+        if path == "/api/v1.2/machine" or path == "/api/v2.0/machine":
+            return self.machine
+        if path.startswith("/api/v1.2/docker"):
+            return self.v1(path[len("/api/v1.2/docker"):])
+        if path.startswith("/api/v2.0/stats"):
+            count = int(query.get("count", ["64"])[0])
+            return self.v2_stats(path[len("/api/v2.0/stats"):], count)
+        if path.startswith("/api/v2.0/spec"):
+            return self.v2_spec(path[len("/api/v2.0/spec"):])
+        return None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = self.server.payloads.response(url.path, parse_qs(url.query))
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_sent += len(body or b"")
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, payloads, latency=0):
+        HTTPServer.__init__(self, address, StandinHandler)
+        self.payloads = payloads
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+
+def start_server(fixtures, port=0, latency=0, host="127.0.0.1"):
+    """Start stand-in in background thread, return server"""
+    server = StandinServer((host, port), Payloads(fixtures), latency)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local cAdvisor stand-in')
+    parser.add_argument('-p', dest='port', type=int, default=8080,
+                        help='Port to listen on (default: 8080)')
+    parser.add_argument('-n', dest='containers', type=int, default=100,
+                        help='Number of generated containers (default: 100)')
+    parser.add_argument('-s', dest='samples', type=int, default=60,
+                        help='Stats samples per container (default: 60)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    parser.add_argument('--seed', dest='seed', type=int, default=0,
+                        help='Seed for generated fixtures (default: 0)')
+    parser.add_argument('-f', dest='fixtures_dir',
+                        help='Serve fixtures recorded into this directory')
+    parser.add_argument('--record', dest='record_url',
+                        help='Record fixtures from live cAdvisor url '
+                             'into -f directory and exit')
+    args = parser.parse_args()
+    if args.record_url:
+        if not args.fixtures_dir:
+            sys.exit("--record requires -f directory")
+        record_fixtures(args.record_url, args.fixtures_dir)
+        sys.exit(0)
+    if args.fixtures_dir:
+        fixtures = load_fixtures(args.fixtures_dir)
+    else:
+        fixtures = build_fixtures(args.containers, args.samples, args.seed)
+    server = StandinServer(("127.0.0.1", args.port), Payloads(fixtures),
+                           args.latency)
+    print("Serving %d containers on %s" % (len(fixtures["docker"]),
+                                           server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+#
+# Local Docker Engine API stand-in on unix socket
+# ===
+#
+# Serves /_ping, /version and /containers/json (with name and id filters)
+# for running nagios/check_docker_memory.py without Docker.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+
+
+def build_containers(count, seed=0):
+    """Generate reproducible list of running containers"""
+    rand = random.Random(seed)
+    containers = []
+    for index in range(count):
+        containers.append({
+            "Id": "%064x" % rand.getrandbits(256),
+            "Names": ["/container%d" % index],
+            "Image": "example/service%d:latest" % (index % 10),
+            "State": "running",
+            "Status": "Up 2 hours"})
+    return containers
+
+
+def filter_containers(containers, filters):
+    """Apply Docker API name and id filters, names are regexps"""
+    result = []
+    for container in containers:
+        names = container["Names"]
+        if "name" in filters and not any(
+                re.search(pattern, name)
+                for pattern in filters["name"] for name in names):
+            continue
+        if "id" in filters and not any(
+                container["Id"].startswith(prefix)
+                for prefix in filters["id"]):
+            continue
+        result.append(container)
+    return result
+
+
+class DockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        # Docker API may be prefixed with version, like /v1.41/containers
+        path = re.sub(r"^/v[0-9.]+", "", url.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        if path == "/_ping":
+            body = b"OK"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/version":
+            self.send_json({"Version": "20.10.0", "ApiVersion": "1.41"})
+        elif path == "/containers/json":
+            query = parse_qs(url.query)
+            try:
+                filters = json.loads(query.get("filters", ["{}"])[0])
+            except ValueError:
+                self.send_json({"message": "invalid filters"}, 400)
+                return
+            self.send_json(filter_containers(self.server.containers,
+                                             filters))
+        else:
+            self.send_json({"message": "page not found"}, 404)
+
+    def address_string(self):
+        return self.server.server_address
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class DockerStandinServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, containers, latency=0):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        UnixStreamServer.__init__(self, socket_path, DockerHandler)
+        self.containers = containers
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def start_server(socket_path, containers, latency=0):
+    """Start stand-in in background thread, return server"""
+    server = DockerStandinServer(socket_path, containers, latency)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local Docker Engine API stand-in')
+    parser.add_argument('-s', dest='socket_path',
+                        default='/tmp/docker-standin.sock',
+                        help='Unix socket to listen on '
+                             '(default: /tmp/docker-standin.sock)')
+    parser.add_argument('-n', dest='containers', type=int, default=100,
+                        help='Number of generated containers (default: 100)')
+    parser.add_argument('-f', dest='containers_file',
+                        help='JSON file with /containers/json payload '
+                             'to serve instead of generated containers')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    parser.add_argument('--seed', dest='seed', type=int, default=0,
+                        help='Seed for generated containers (default: 0)')
+    args = parser.parse_args()
+    if args.containers_file:
+        with open(args.containers_file) as f:
+            containers = json.load(f)
+    else:
+        containers = build_containers(args.containers, args.seed)
+    server = DockerStandinServer(args.socket_path, containers, args.latency)
+    print("Serving %d containers on %s" % (len(containers), args.socket_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+#
+# Fake tw-cli, hpacucli and rabbitmqctl
+# ===
+#
+# Generates realistic output of RAID and RabbitMQ CLI tools at
+# configurable scale, for benchmarking zabbix/data_collectors and
+# nagios checks without real controllers or broker.
+# Tool is chosen by name the script is called with, so install it
+# with symlinks:
+#
+#   fake_cli.py install /tmp/fakebin
+#   PATH=/tmp/fakebin:$PATH tw-cli info c0
+#
+# Scale, latency and failures are set with environment variables:
+#
+#   FAKE_CLI_CONTROLLERS - number of RAID controllers (default: 2)
+#   FAKE_CLI_DISKS       - disks per controller (default: 24)
+#   FAKE_CLI_BAD_EVERY   - every Nth disk is in bad state (default: 0, none)
+#   FAKE_CLI_VHOSTS      - number of RabbitMQ vhosts (default: 2)
+#   FAKE_CLI_QUEUES      - queues per vhost (default: 100)
+#   FAKE_CLI_LATENCY     - seconds to sleep before output, like slow
+#                          tool startup (default: 0)
+#   FAKE_CLI_FAIL        - fail calls with arguments matching regexp
+#   FAKE_CLI_HANG        - hang calls with arguments matching regexp
+#   FAKE_CLI_LOG         - file to append called command lines to
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import re
+import sys
+import time
+
+TOOLS = ("tw-cli", "hpacucli", "rabbitmqctl")
+DISKS_PER_UNIT = 8
+BAYS_PER_BOX = 24
+ALARM_TIME = 1423141446
+
+
+def setting(name, default):
+    return type(default)(os.environ.get("FAKE_CLI_" + name, default))
+
+
+def bad_disk(index):
+    every = setting("BAD_EVERY", 0)
+    return every > 0 and index % every == every - 1
+
+
+def tw_info(controllers):
+    lines = ["",
+             "Ctl   Model        (V)Ports  Drives   Units   NotOpt  RRate   "
+             "VRate  BBU",
+             "-" * 72]
+    for index in range(controllers):
+        lines.append("c%-4d 9650SE-24M8  24        24       3       0       "
+                     "1       1      OK" % index)
+    return "\n".join(lines + [""]) + "\n"
+
+
+def tw_controller(disks):
+    units = (disks + DISKS_PER_UNIT - 1) // DISKS_PER_UNIT
+    lines = ["",
+             "Unit  UnitType  Status         %RCmpl  %V/I/M  Stripe  "
+             "Size(GB)  Cache  AVrfy",
+             "-" * 78]
+    for unit in range(units):
+        degraded = any(bad_disk(i) for i in range(
+            unit * DISKS_PER_UNIT, min(disks, (unit + 1) * DISKS_PER_UNIT)))
+        lines.append("u%-4d RAID-6    %-14s -       -       64K     "
+                     "11175.8   RiW    ON" %
+                     (unit, "DEGRADED" if degraded else "OK"))
+    lines += ["",
+              "VPort Status         Unit Size      Type  Phy Encl-Slot    "
+              "Model",
+              "-" * 78]
+    for index in range(disks):
+        lines.append("p%-4d %-14s u%-3d 1.82 TB   SATA  %-3d -            "
+                     "WDC WD2003FYYS-02W0" %
+                     (index, "DEGRADED" if bad_disk(index) else "OK",
+                      index // DISKS_PER_UNIT, index))
+    # one empty port, which must be skipped
+    lines.append("p%-4d NOT-PRESENT    -    -         -     -   -            "
+                 "-" % disks)
+    return "\n".join(lines + [""]) + "\n"
+
+
+def tw_alarms(controller):
+    lines = ["",
+             "Ctl  Date                        Severity  AEN Message",
+             "-" * 78]
+    for offset, severity, message in (
+            (0, "INFO", "Battery charging started"),
+            (3600, "INFO", "Battery charging completed"),
+            (7200, "INFO", "Verify started: unit=0")):
+        stamp = time.strftime("%a %b %d %Y %H:%M:%S",
+                              time.localtime(ALARM_TIME + offset))
+        lines.append("%s   [%s]  %-8s  %s" % (controller, stamp, severity,
+                                              message))
+    return "\n".join(lines + [""]) + "\n"
+
+
+def hp_drive_id(index):
+    box = index // BAYS_PER_BOX + 1
+    port = "1I" if box % 2 else "2I"
+    return port, box, index % BAYS_PER_BOX + 1
+
+
+def hp_config(controllers, disks):
+    lines = []
+    for slot in range(controllers):
+        lines += ["", "Smart Array P812 in Slot %d    (sn: PAFGL0ARH0%04d)" %
+                  (slot, slot), ""]
+        for start in range(0, disks, DISKS_PER_UNIT):
+            drives = range(start, min(disks, start + DISKS_PER_UNIT))
+            array = start // DISKS_PER_UNIT
+            name = chr(ord("A") + array % 26) * (array // 26 + 1)
+            degraded = any(bad_disk(i) for i in drives)
+            lines += ["   array %s (SAS, Unused Space: 0  MB)" % name, "", "",
+                      "      logicaldrive %d (3.3 TB, RAID 6 (ADG), %s)" %
+                      (array + 1, "Interim Recovery Mode" if degraded
+                       else "OK"), ""]
+            for index in drives:
+                port, box, bay = hp_drive_id(index)
+                lines.append("      physicaldrive %s:%d:%d (port %s:box %d:"
+                             "bay %d, SAS, 600 GB, %s)" %
+                             (port, box, bay, port, box, bay,
+                              "Failed" if bad_disk(index) else "OK"))
+            lines.append("")
+        lines += ["   SEP (Vendor ID PMCSIERR, Model  SRC 8x6G) 250  "
+                  "(WWID: 500143800976949F)", ""]
+    return "\n".join(lines) + "\n"
+
+
+def rabbit_vhosts(vhosts):
+    return "".join("%s\n" % name for name in vhost_names(vhosts))
+
+
+def vhost_names(vhosts):
+    return ["/"] + ["vhost%d" % index for index in range(1, vhosts)]
+
+
+def rabbit_queue_value(column, vhost, index):
+    if column == "name":
+        return "queue.%d" % index
+    if column == "vhost":
+        return vhost
+    if column in ("durable", "auto_delete"):
+        return "true" if column == "durable" else "false"
+    if column == "state":
+        return "running"
+    # counters depend on queue, so metrics look different
+    return str((index * 7919 + len(vhost)) % 1000)
+
+
+def rabbit_queues(vhosts, queues, columns):
+    lines = []
+    for vhost in vhosts:
+        for index in range(queues):
+            lines.append("\t".join(rabbit_queue_value(column, vhost, index)
+                                   for column in columns))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def rabbitmqctl(args):
+    args = [a for a in args if a not in ("-q", "--quiet")]
+    if not args:
+        return 64, "", "Usage: rabbitmqctl [-q] <command> [<args>]\n"
+    vhosts = vhost_names(setting("VHOSTS", 2))
+    if args[0] == "list_vhosts":
+        return 0, rabbit_vhosts(len(vhosts)), ""
+    if args[0] == "eval":
+        # only queue listing expressions are supported
+        expression = " ".join(args[1:])
+        res = re.search(r"rabbit_amqqueue:info_all\(V, \[name, ([a-z_, ]+)\]",
+                        expression)
+        if res:
+            columns = ["vhost", "name"] + res.group(1).split(", ")
+        elif "rabbit_amqqueue:list()" in expression:
+            columns = ["vhost", "name"]
+        else:
+            return 70, "", "Error: unsupported expression\n"
+        return 0, rabbit_queues(vhosts, setting("QUEUES", 100),
+                                columns) + "ok\n", ""
+    if args[0] == "list_queues":
+        selected = ["/"]
+        columns = []
+        rest = args[1:]
+        while rest:
+            arg = rest.pop(0)
+            if arg in ("-p", "--vhost"):
+                selected = [rest.pop(0)]
+            elif not arg.startswith("-"):
+                columns.append(arg)
+        if selected[0] not in vhosts:
+            return 2, "", "Error: vhost not found\n"
+        return 0, rabbit_queues(selected, setting("QUEUES", 100),
+                                columns or ["name", "messages"]), ""
+    return 64, "", "Error: unknown command %s\n" % args[0]
+
+
+def tw_cli(args):
+    controllers = setting("CONTROLLERS", 2)
+    if args == ["info"]:
+        return 0, tw_info(controllers), ""
+    res = re.match(r"^c([0-9]+)$", args[1] if len(args) == 2 and
+                   args[0] == "info" else "")
+    if res and int(res.group(1)) < controllers:
+        return 0, tw_controller(setting("DISKS", 24)), ""
+    res = re.match(r"^/(c[0-9]+)$", args[0] if args else "")
+    if res and args[1:] == ["show", "alarms"]:
+        return 0, tw_alarms(res.group(1)), ""
+    return 1, "Error: (CLI:003) Specified controller does not exist.\n", ""
+
+
+def hpacucli(args):
+    if [a.lower() for a in args] == ["ctrl", "all", "show", "config"]:
+        return 0, hp_config(setting("CONTROLLERS", 2),
+                            setting("DISKS", 24)), ""
+    return 1, "\nError: syntax error\n", ""
+
+
+def main(tool, args):
+    log = os.environ.get("FAKE_CLI_LOG")
+    if log:
+        with open(log, "a") as f:
+            f.write("%s %s\n" % (tool, " ".join(args)))
+    latency = setting("LATENCY", 0.0)
+    if latency:
+        time.sleep(latency)
+    command = " ".join(args)
+    hang = os.environ.get("FAKE_CLI_HANG")
+    if hang and re.search(hang, command):
+        time.sleep(3600)
+    fail = os.environ.get("FAKE_CLI_FAIL")
+    if fail and re.search(fail, command):
+        sys.stderr.write("Error: injected failure\n")
+        return 1
+    if tool == "tw-cli":
+        rc, stdout, stderr = tw_cli(args)
+    elif tool == "hpacucli":
+        rc, stdout, stderr = hpacucli(args)
+    else:
+        rc, stdout, stderr = rabbitmqctl(args)
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return rc
+
+
+def install(directory):
+    """Create tool symlinks to this script in directory"""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    script = os.path.abspath(__file__)
+    for tool in TOOLS:
+        path = os.path.join(directory, tool)
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.symlink(script, path)
+
+
+if __name__ == "__main__":
+    tool = os.path.basename(sys.argv[0])
+    if tool not in TOOLS:
+        if len(sys.argv) == 3 and sys.argv[1] == "install":
+            install(sys.argv[2])
+            sys.exit(0)
+        sys.exit("usage: %s install <directory>, then run %s from there" %
+                 (sys.argv[0], ", ".join(TOOLS)))
+    sys.exit(main(tool, sys.argv[1:]))
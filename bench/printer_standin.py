@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# Local printer web interface stand-in
+# ===
+#
+# Serves toner status pages of Brother MFC-7860DW, MFC-9465CDN and
+# Xerox 6015 MFP like their embedded web servers, with configurable
+# toner levels, latency and hung printers, for running
+# zabbix/data_collectors/toner_levels.py without printers. Number of
+# requests is counted, so cache hits can be checked.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+COLORS = ("Cyan", "Magenta", "Yellow", "Black")
+BROTHER_PATH = "/etc/mnt_info.html"
+XEROX_PATH = "/status/statsuppliesx.asp"
+
+
+def brother_gauge(level):
+    return "&#x25a0;" * (level // 10) + "&#x25a1;" * (10 - level // 10)
+
+
+def brother_page(levels, colors):
+    rows = []
+    for color in colors:
+        title = "Toner**" if len(colors) == 1 else "Toner %s (%s)**" % (
+            color, color[0] if color != "Black" else "K")
+        rows.append("<tr><th>%s</th>\n<td>\n<td class=\"gauge\">%s</td>\n"
+                    "</tr>" % (title, brother_gauge(levels[color])))
+    return ("<html><head><title>Brother</title></head><body>\n"
+            "<h3>Remaining Life</h3>\n<table>\n%s\n</table>\n"
+            "</body></html>\n" % "\n".join(rows))
+
+
+def xerox_page(levels):
+    cells = "\n".join("<tr><td>%s Toner Cartridge</td><td>%d&#37;</td></tr>"
+                      % (color, levels[color]) for color in COLORS)
+    return ("<html><head><title>Consumables Status</title></head><body>\n"
+            "<table>\n%s\n</table>\n</body></html>\n" % cells)
+
+
+# model: (page path, page builder)
+MODELS = {
+    "brother_7860": (BROTHER_PATH,
+                     lambda levels: brother_page(levels, ("Black",))),
+    "brother_9465": (BROTHER_PATH,
+                     lambda levels: brother_page(levels, COLORS)),
+    "xerox_6015": (XEROX_PATH, xerox_page),
+}
+
+
+def toner_levels(seed=0):
+    """Return {color: level} in tens, like Brother gauges show"""
+    return dict((color, (seed * 3 + index * 7) % 11 * 10)
+                for index, color in enumerate(COLORS))
+
+
+class PrinterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_body(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.hang:
+            # powered off printer, client must time out
+            time.sleep(server.hang)
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        path, build = MODELS[server.model]
+        if self.path.split("?", 1)[0] != path:
+            self.send_body(b"not found", 404)
+            return
+        self.send_body(build(server.levels).encode("latin-1"))
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class PrinterStandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model, seed=0, latency=0, hang=0):
+        HTTPServer.__init__(self, address, PrinterHandler)
+        self.model = model
+        self.levels = toner_levels(seed)
+        if model == "brother_7860":
+            self.levels = {"Black": self.levels["Black"]}
+        self.latency = latency
+        self.hang = hang
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def address(self):
+        return "%s:%d" % self.server_address[:2]
+
+
+def start_server(model, port=0, seed=0, latency=0, hang=0,
+                 host="127.0.0.1"):
+    """Start stand-in in background thread, return server"""
+    server = PrinterStandinServer((host, port), model, seed, latency, hang)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local printer web interface stand-in')
+    parser.add_argument('model', choices=sorted(MODELS),
+                        help='Printer model')
+    parser.add_argument('-p', dest='port', type=int, default=8080,
+                        help='Port to listen on (default: 8080)')
+    parser.add_argument('-s', dest='seed', type=int, default=0,
+                        help='Seed of toner levels (default: 0)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    parser.add_argument('-H', dest='hang', type=float, default=0,
+                        help='Hang every request for this many seconds '
+                             'without answer, like powered off printer')
+    args = parser.parse_args()
+    server = PrinterStandinServer(("127.0.0.1", args.port), args.model,
+                                  args.seed, args.latency, args.hang)
+    print("Serving %s toner levels %s on %s" % (
+        args.model, server.levels, server.address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
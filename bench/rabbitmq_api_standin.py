@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#
+# Local RabbitMQ management API stand-in
+# ===
+#
+# Serves /api/overview, /api/vhosts and /api/queues[/<vhost>] with
+# the same vhosts and queues fake_cli.py rabbitmqctl generates,
+# for running zabbix/data_collectors RabbitMQ scripts without a broker.
+# The columns, page and page_size query parameters are supported
+# like in real API.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import json
+import time
+import base64
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, unquote
+
+import fake_cli
+
+QUEUE_FIELDS = ("name", "vhost", "durable", "auto_delete", "state",
+                "messages", "messages_ready", "messages_unacknowledged",
+                "consumers", "memory")
+
+
+def build_queues(vhosts, queues):
+    """Generate queue objects for all vhosts"""
+    result = []
+    for vhost in fake_cli.vhost_names(vhosts):
+        for index in range(queues):
+            queue = {}
+            for field in QUEUE_FIELDS:
+                value = fake_cli.rabbit_queue_value(field, vhost, index)
+                if field in ("durable", "auto_delete"):
+                    value = value == "true"
+                elif value.isdigit():
+                    value = int(value)
+                queue[field] = value
+            result.append(queue)
+    return result
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_body(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        expected = "Basic " + base64.b64encode(
+            self.server.credentials.encode("utf-8")).decode("ascii")
+        return self.headers.get("Authorization") == expected
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        if not self.authorized():
+            self.send_body(b'{"error":"not_authorised"}', 401)
+            return
+        query = parse_qs(url.query)
+        columns = query.get("columns", [""])[0]
+        page = query.get("page", [""])[0]
+        parts = [unquote(p) for p in url.path.split("/")[2:] if p]
+        if parts == ["overview"]:
+            payload = {"rabbitmq_version": "3.8.9",
+                       "object_totals": {"queues": len(self.server.queues)}}
+        elif parts == ["vhosts"]:
+            payload = [{"name": name} for name in
+                       fake_cli.vhost_names(self.server.vhosts)]
+        elif parts and parts[0] == "queues" and len(parts) <= 2 and page:
+            payload = self.server.queues_page(
+                parts[1] if len(parts) == 2 else None, columns, int(page),
+                int(query.get("page_size", ["100"])[0]))
+            if payload is None:
+                self.send_body(b'{"error":"bad_request"}', 400)
+                return
+        elif parts and parts[0] == "queues" and len(parts) <= 2:
+            self.send_body(self.server.encoded_queues(
+                parts[1] if len(parts) == 2 else None, columns))
+            return
+        else:
+            self.send_body(b'{"error":"Object Not Found"}', 404)
+            return
+        self.send_body(json.dumps(payload).encode("utf-8"))
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class ApiStandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, vhosts, queues, latency=0,
+                 credentials="guest:guest"):
+        HTTPServer.__init__(self, address, ApiHandler)
+        self.vhosts = vhosts
+        self.queues = build_queues(vhosts, queues)
+        self.latency = latency
+        self.credentials = credentials
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.encoded = {}
+        self.selected = {}
+
+    def encoded_queues(self, vhost, columns):
+        """Return serialized queues, cached per vhost and columns"""
+        key = (vhost, columns)
+        with self.lock:
+            body = self.encoded.get(key)
+        if body is None:
+            body = json.dumps(self.select_queues(vhost, columns)).encode(
+                "utf-8")
+            with self.lock:
+                self.encoded[key] = body
+        return body
+
+    def select_queues(self, vhost, columns):
+        """Return queues of vhost with columns, cached for paging"""
+        key = (vhost, columns)
+        with self.lock:
+            queues = self.selected.get(key)
+        if queues is None:
+            fields = [c for c in columns.split(",") if c]
+            queues = [q for q in self.queues
+                      if vhost is None or q["vhost"] == vhost]
+            if fields:
+                queues = [dict((f, q[f]) for f in fields if f in q)
+                          for q in queues]
+            with self.lock:
+                self.selected[key] = queues
+        return queues
+
+    def queues_page(self, vhost, columns, page, page_size):
+        """Return paged queues object, None for invalid page"""
+        queues = self.select_queues(vhost, columns)
+        page_count = max((len(queues) + page_size - 1) // page_size, 1)
+        if page < 1 or page > page_count or not 0 < page_size <= 500:
+            return None
+        items = queues[(page - 1) * page_size:page * page_size]
+        return {"items": items, "page": page, "page_size": page_size,
+                "page_count": page_count, "item_count": len(items),
+                "filtered_count": len(queues), "total_count": len(queues)}
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+
+def start_server(vhosts, queues, port=0, latency=0, host="127.0.0.1"):
+    """Start stand-in in background thread, return server"""
+    server = ApiStandinServer((host, port), vhosts, queues, latency)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local RabbitMQ management API stand-in')
+    parser.add_argument('-p', dest='port', type=int, default=15672,
+                        help='Port to listen on (default: 15672)')
+    parser.add_argument('-V', dest='vhosts', type=int, default=2,
+                        help='Number of vhosts (default: 2)')
+    parser.add_argument('-Q', dest='queues', type=int, default=100,
+                        help='Queues per vhost (default: 100)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    args = parser.parse_args()
+    server = ApiStandinServer(("127.0.0.1", args.port), args.vhosts,
+                              args.queues, args.latency)
+    print("Serving %d queues on %s" % (len(server.queues), server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+# Local Riak HTTP stats stand-in
+# ===
+#
+# Serves /stats like Riak node HTTP interface, with the usual set of
+# node, vnode, FSM timing, memory and ring stats, for running
+# zabbix/data_collectors/riak_stats.py without Riak. Counters grow with
+# every request, and number of requests is counted, so cache hits
+# can be checked.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+COUNTERS = ("node_gets", "node_puts", "vnode_gets", "vnode_puts",
+            "vnode_index_reads", "vnode_index_writes", "read_repairs",
+            "coord_redirs", "precommit_fail", "postcommit_fail",
+            "pbc_connects", "index_fsm_create", "list_fsm_create")
+TIMINGS = ("node_get_fsm_time", "node_put_fsm_time",
+           "node_get_fsm_siblings", "node_get_fsm_objsize")
+PERCENTILES = ("mean", "median", "95", "99", "100")
+MEMORY = ("mem_total", "mem_allocated", "memory_total", "memory_processes",
+          "memory_processes_used", "memory_system", "memory_atom",
+          "memory_binary", "memory_code", "memory_ets")
+
+
+def build_stats(nodes, extra):
+    """Return stats dict of node in cluster of nodes, with extra
+    padding counters to reach realistic size"""
+    members = ["riak@10.0.0.%d" % (index + 1) for index in range(nodes)]
+    stats = {
+        "nodename": members[0],
+        "connected_nodes": members[1:],
+        "ring_members": members,
+        "ring_num_partitions": 64,
+        "ring_ownership": "[{'%s',%d}]" % (members[0], 64 // nodes),
+        "ring_creation_size": 64,
+        "storage_backend": "riak_kv_eleveldb_backend",
+        "riak_kv_version": "1.4.12-0-gc6795c1",
+        "sys_otp_release": "R15B01",
+        "sys_process_count": 1754,
+        "cpu_nprocs": 1104,
+        "cpu_avg1": 135,
+        "pbc_active": 12,
+        "executing_mappers": 0,
+    }
+    for counter in COUNTERS:
+        stats[counter] = 0
+        stats[counter + "_total"] = 0
+    for timing in TIMINGS:
+        for index, percentile in enumerate(PERCENTILES):
+            stats["%s_%s" % (timing, percentile)] = 1000 * (index + 1)
+    for index, name in enumerate(MEMORY):
+        stats[name] = 1048576 * (index + 1)
+    for index in range(extra):
+        stats["stat_padding_%d" % index] = index
+    return stats
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_body(self, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.path.rstrip("/") != "/stats":
+            self.send_body(b"not found", 404)
+            return
+        self.send_body(self.server.next_stats())
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class RiakStandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, nodes=3, extra=0, latency=0):
+        HTTPServer.__init__(self, address, StatsHandler)
+        self.stats = build_stats(nodes, extra)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def next_stats(self):
+        """Count request, grow counters, return serialized stats"""
+        with self.lock:
+            self.requests += 1
+            for counter in COUNTERS:
+                self.stats[counter] += 10
+                self.stats[counter + "_total"] += 10 * self.requests
+            return json.dumps(self.stats).encode("utf-8")
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+
+def start_server(port=0, nodes=3, extra=0, latency=0, host="127.0.0.1"):
+    """Start stand-in in background thread, return server"""
+    server = RiakStandinServer((host, port), nodes, extra, latency)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local Riak HTTP stats stand-in')
+    parser.add_argument('-p', dest='port', type=int, default=8098,
+                        help='Port to listen on (default: 8098)')
+    parser.add_argument('-n', dest='nodes', type=int, default=3,
+                        help='Number of cluster nodes (default: 3)')
+    parser.add_argument('-x', dest='extra', type=int, default=0,
+                        help='Extra padding stats (default: 0)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    args = parser.parse_args()
+    server = RiakStandinServer(("127.0.0.1", args.port), args.nodes,
+                               args.extra, args.latency)
+    print("Serving %d stats on %s" % (len(server.stats), server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+#
+# Local SNMPv2c switch stand-in
+# ===
+#
+# Answers GET, GETNEXT and GETBULK requests for sysDescr and BRIDGE-MIB
+# forwarding table (dot1dTpFdbTable) of generated switch, with
+# configurable number of MACs, ports, latency and dropped requests,
+# for running zabbix/data_collectors/mac_table.py without switches.
+# Number of requests is counted, so walks and cache hits can be checked.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import time
+import bisect
+import argparse
+import threading
+from socketserver import ThreadingMixIn, UDPServer, BaseRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "zabbix", "data_collectors"))
+
+import snmp_client  # noqa: E402
+
+SYS_DESCR = (1, 3, 6, 1, 2, 1, 1, 1, 0)
+FDB_ENTRY = (1, 3, 6, 1, 2, 1, 17, 4, 3, 1)
+# agents cap GETBULK responses to fit in single datagram
+MAX_REPETITIONS = 64
+
+
+def switch_macs(macs, ports, seed=0):
+    """Return [(mac bytes, port)], MACs spread over ports"""
+    table = []
+    for index in range(macs):
+        value = (0x001b21 << 24) | ((seed * 7919 + index * 104729) & 0xffffff)
+        mac = bytes(bytearray((value >> shift) & 0xff
+                              for shift in range(40, -8, -8)))
+        table.append((mac, index % ports + 1))
+    return table
+
+
+def build_mib(macs, ports, seed=0):
+    """Return sorted [(oid, tag, value)] of switch"""
+    mib = [(SYS_DESCR, snmp_client.OCTET_STRING,
+            b"3Com Switch 4200G 48-Port Software Version 3Com OS V3.01.00s56")]
+    for mac, port in switch_macs(macs, ports, seed):
+        index = tuple(bytearray(mac))
+        mib.append((FDB_ENTRY + (1,) + index, snmp_client.OCTET_STRING, mac))
+        mib.append((FDB_ENTRY + (2,) + index, snmp_client.INTEGER, port))
+        # learned
+        mib.append((FDB_ENTRY + (3,) + index, snmp_client.INTEGER, 3))
+    mib.sort()
+    return mib
+
+
+class SnmpHandler(BaseRequestHandler):
+
+    def handle(self):
+        data, sock = self.request
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            drop = server.drop_every and \
+                server.requests % server.drop_every == 0
+        if server.latency:
+            time.sleep(server.latency)
+        if drop or server.silent:
+            return
+        try:
+            community, pdu_type, request_id, non_repeaters, repetitions, \
+                varbinds = snmp_client.decode_message(data)
+        except snmp_client.SnmpError:
+            return
+        if community != server.community:
+            return
+        if pdu_type == snmp_client.GET_REQUEST:
+            binds = [server.get(oid) for oid, _, _ in varbinds]
+        elif pdu_type == snmp_client.GET_NEXT_REQUEST:
+            binds = [server.next(oid) for oid, _, _ in varbinds]
+        elif pdu_type == snmp_client.GET_BULK_REQUEST:
+            binds = [server.next(oid) for oid, _, _ in
+                     varbinds[:non_repeaters]]
+            for oid, _, _ in varbinds[non_repeaters:]:
+                for _ in range(min(repetitions, MAX_REPETITIONS)):
+                    bind = server.next(oid)
+                    binds.append(bind)
+                    if bind[1] == snmp_client.END_OF_MIB_VIEW:
+                        break
+                    oid = bind[0]
+        else:
+            return
+        sock.sendto(snmp_client.encode_message(
+            community, snmp_client.RESPONSE, request_id, binds),
+            self.client_address)
+
+
+class SnmpStandinServer(ThreadingMixIn, UDPServer):
+    daemon_threads = True
+
+    def __init__(self, address, macs=200, ports=48, seed=0, latency=0,
+                 drop_every=0, community="public"):
+        UDPServer.__init__(self, address, SnmpHandler)
+        self.mib = build_mib(macs, ports, seed)
+        self.oids = [oid for oid, _, _ in self.mib]
+        self.macs = switch_macs(macs, ports, seed)
+        self.latency = latency
+        self.drop_every = drop_every
+        self.community = community
+        # silent stand-in is like powered off switch
+        self.silent = False
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def get(self, oid):
+        index = bisect.bisect_left(self.oids, oid)
+        if index < len(self.oids) and self.oids[index] == oid:
+            return self.mib[index]
+        return (oid, snmp_client.NO_SUCH_OBJECT, None)
+
+    def next(self, oid):
+        index = bisect.bisect_right(self.oids, oid)
+        if index < len(self.oids):
+            return self.mib[index]
+        return (oid, snmp_client.END_OF_MIB_VIEW, None)
+
+    @property
+    def address(self):
+        return "%s:%d" % self.server_address[:2]
+
+
+def start_server(port=0, macs=200, ports=48, seed=0, latency=0,
+                 drop_every=0, host="127.0.0.1"):
+    """Start stand-in in background thread, return server"""
+    server = SnmpStandinServer((host, port), macs, ports, seed, latency,
+                               drop_every)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local SNMPv2c switch stand-in')
+    parser.add_argument('-p', dest='port', type=int, default=16100,
+                        help='UDP port to listen on (default: 16100)')
+    parser.add_argument('-m', dest='macs', type=int, default=200,
+                        help='MACs in forwarding table (default: 200)')
+    parser.add_argument('-P', dest='ports', type=int, default=48,
+                        help='Switch ports (default: 48)')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    parser.add_argument('-d', dest='drop_every', type=int, default=0,
+                        help='Drop every Nth request (default: 0, none)')
+    args = parser.parse_args()
+    server = SnmpStandinServer(("127.0.0.1", args.port), args.macs,
+                               args.ports, latency=args.latency,
+                               drop_every=args.drop_every)
+    print("Serving %d MACs on %s" % (len(server.macs), server.address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
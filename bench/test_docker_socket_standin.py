@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+#
+# Behaviour test of check_docker_memory.py Docker API client
+# against docker_socket_standin.py, run with python -m pytest bench
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+NAGIOS_DIR = os.path.join(BENCH_DIR, os.pardir, "nagios")
+sys.path.insert(0, NAGIOS_DIR)
+
+import docker_socket_standin  # noqa: E402
+import check_docker_memory  # noqa: E402
+
+
+@pytest.fixture
+def docker(tmp_path):
+    containers = docker_socket_standin.build_containers(20, seed=7)
+    server = docker_socket_standin.start_server(
+        str(tmp_path / "docker.sock"), containers)
+    yield server, containers
+    server.shutdown()
+    server.server_close()
+
+
+def test_containers_listed(docker):
+    server, containers = docker
+    client = check_docker_memory.DockerClient(server.server_address)
+    try:
+        assert client.containers() == containers
+        # second request reuses kept alive connection
+        assert client.containers("container5") == [containers[5]]
+        assert client.containers("container") == []
+    finally:
+        client.close()
+
+
+def test_names_resolved_from_socket(docker, tmp_path):
+    server, containers = docker
+    # no readable metadata, so names come from API only
+    containers_dir = tmp_path / "containers"
+    containers_dir.mkdir()
+    check = check_docker_memory.CheckDockerMemory(
+        "container13", 90, 95, True, containers_dir=str(containers_dir),
+        index_file=str(tmp_path / "names.index"),
+        docker_socket=server.server_address)
+    check.binary = ["false"]
+    assert check.resolve_docker_id() == containers[13]["Id"]
+    assert check.api_names() == dict(
+        (c["Id"], c["Names"][0].lstrip("/")) for c in containers)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+# Behaviour test of riak_stats.py against riak_standin.py,
+# run with python -m pytest bench
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import json
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTORS_DIR = os.path.join(BENCH_DIR, os.pardir, "zabbix",
+                              "data_collectors")
+sys.path.insert(0, COLLECTORS_DIR)
+
+import riak_standin  # noqa: E402
+import riak_stats  # noqa: E402
+
+NODES = 3
+EXTRA = 5
+
+
+@pytest.fixture
+def riak():
+    server = riak_standin.start_server(nodes=NODES, extra=EXTRA)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def expected_stats(requests):
+    """Stats stand-in serves on given request number"""
+    stats = riak_standin.build_stats(NODES, EXTRA)
+    for counter in riak_standin.COUNTERS:
+        stats[counter] = 10 * requests
+        stats[counter + "_total"] = 10 * requests * (requests + 1) // 2
+    return stats
+
+
+def test_stats_cached(riak, tmp_path):
+    path = str(tmp_path / "riak.json")
+    assert riak_stats.get_stats(riak.url, path, 60) == expected_stats(1)
+    assert riak_stats.get_stats(riak.url, path, 60) == expected_stats(1)
+    assert riak.requests == 1
+    assert riak_stats.get_stats(riak.url, path, 0) == expected_stats(2)
+    assert riak.requests == 2
+
+
+def test_trapper_items(riak, tmp_path):
+    stats = riak_stats.get_stats(riak.url, str(tmp_path / "riak.json"), 60)
+    items = dict((key, value) for host, key, value in
+                 riak_stats.trapper_items(stats, "riakhost"))
+    expected = expected_stats(1)
+    assert len(items) == len(expected)
+    assert items["riak.stat[node_gets]"] == "10"
+    assert items["riak.stat[ring_num_partitions]"] == "64"
+    assert items["riak.stat[storage_backend]"] == "riak_kv_eleveldb_backend"
+    assert json.loads(items["riak.stat[ring_members]"]) == \
+        expected["ring_members"]
+    assert riak_stats.trapper_items(stats, "riakhost",
+                                    ["node_puts", "missing"]) == \
+        [("riakhost", "riak.stat[node_puts]", "10")]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+# Behaviour test of mac_table.py GETBULK walk against snmp_standin.py,
+# run with python -m pytest bench
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTORS_DIR = os.path.join(BENCH_DIR, os.pardir, "zabbix",
+                              "data_collectors")
+sys.path.insert(0, COLLECTORS_DIR)
+
+import snmp_standin  # noqa: E402
+import mac_table  # noqa: E402
+
+MACS = 200
+PORTS = 48
+SEED = 3
+
+
+@pytest.fixture
+def switch():
+    server = snmp_standin.start_server(macs=MACS, ports=PORTS, seed=SEED)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def expected_table():
+    """[(mac, port)] of stand-in switch in forwarding table order"""
+    return [(":".join("%02x" % octet for octet in bytearray(mac)), port)
+            for mac, port in sorted(snmp_standin.switch_macs(MACS, PORTS,
+                                                             SEED))]
+
+
+def test_walk_fdb(switch):
+    assert mac_table.walk_fdb(switch.address) == expected_table()
+    # one GETBULK per max_repetitions rows, and one past the table end
+    assert switch.requests <= MACS // mac_table.max_repetitions + 2
+
+
+def test_port_snapshot(switch, tmp_path, monkeypatch):
+    monkeypatch.setattr(mac_table, "show_vendor", False)
+    path = str(tmp_path / "mac_table.json")
+    snapshot = mac_table.get_snapshot(switch.address, path, 90)
+    requests = switch.requests
+    assert mac_table.get_snapshot(switch.address, path, 90) == snapshot
+    assert switch.requests == requests
+
+    for port in range(1, PORTS + 1):
+        macs = [mac for mac, mac_port in expected_table() if mac_port == port]
+        assert mac_table.format_port(snapshot, port) == \
+            "".join("%s, " % mac for mac in macs)
+    assert mac_table.format_port(snapshot, PORTS + 1) == "null"
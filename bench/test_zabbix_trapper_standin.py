@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# Behaviour test of raid_trapper.py push to zabbix_trapper_standin.py
+# with fake_cli.py tw-cli and hpacucli, run with python -m pytest bench
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import os
+import sys
+import json
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTORS_DIR = os.path.join(BENCH_DIR, os.pardir, "zabbix",
+                              "data_collectors")
+sys.path.insert(0, COLLECTORS_DIR)
+
+import fake_cli  # noqa: E402
+import zabbix_trapper_standin  # noqa: E402
+import raid_trapper  # noqa: E402
+import zabbix_sender  # noqa: E402
+import tw_snapshot  # noqa: E402
+import hpacucli_snapshot  # noqa: E402
+
+CONTROLLERS = 2
+DISKS = 20
+BAD_EVERY = 7
+
+
+@pytest.fixture
+def fakebin(tmp_path, monkeypatch):
+    fake_cli.install(str(tmp_path / "bin"))
+    monkeypatch.setenv("FAKE_CLI_CONTROLLERS", str(CONTROLLERS))
+    monkeypatch.setenv("FAKE_CLI_DISKS", str(DISKS))
+    monkeypatch.setenv("FAKE_CLI_BAD_EVERY", str(BAD_EVERY))
+    for module, tool in ((tw_snapshot, "tw-cli"),
+                         (hpacucli_snapshot, "hpacucli")):
+        monkeypatch.setattr(module, "binary_path",
+                            str(tmp_path / "bin" / tool))
+        monkeypatch.setattr(module, "cache_file",
+                            str(tmp_path / ("%s.json" % tool)))
+    return tmp_path / "bin"
+
+
+@pytest.fixture
+def trapper():
+    server = zabbix_trapper_standin.start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def expected_statuses():
+    """Disk statuses fake_cli.py generates, by trapper item key"""
+    statuses = {}
+    for index in range(CONTROLLERS * DISKS):
+        controller, disk = divmod(index, DISKS)
+        bad = fake_cli.bad_disk(disk)
+        statuses["3ware.status[c%du%dp%d]" % (
+            controller, disk // fake_cli.DISKS_PER_UNIT, disk)] = \
+            "DEGRADED" if bad else "OK"
+        statuses["smartarray.status[%d:%s:%d:%d]" % (
+            (controller,) + fake_cli.hp_drive_id(disk))] = \
+            "Failed" if bad else "OK"
+    return statuses
+
+
+def test_push_payload(fakebin, trapper):
+    items, errors = raid_trapper.collect(["3ware", "smartarray"], "raidhost")
+    assert errors == []
+    result = zabbix_sender.send("127.0.0.1", trapper.server_address[1],
+                                items)
+    assert result["processed"] == result["total"] == len(items)
+
+    received = dict((value["key"], value["value"])
+                    for value in trapper.received)
+    assert len(received) == len(trapper.received)
+    assert all(value["host"] == "raidhost" for value in trapper.received)
+    statuses = expected_statuses()
+    for kind, macro in (("3ware", "{#3WARE_DISK}"),
+                        ("smartarray", "{#HP_DISK}")):
+        lld = json.loads(received.pop("%s.discovery" % kind))
+        assert sorted("%s.status[%s]" % (kind, disk[macro])
+                      for disk in lld["data"]) == \
+            sorted(key for key in statuses if key.startswith(kind + "."))
+    assert received == statuses
+    assert "DEGRADED" in received.values()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# Local Zabbix trapper stand-in
+# ===
+#
+# Accepts Zabbix sender (trapper protocol) requests like Zabbix server,
+# records received values and responds with processed/failed counts,
+# for running zabbix/data_collectors trapper pushes without Zabbix.
+#
+# Keys matching -F regexp are reported as failed, like values for
+# items that do not exist on server.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import re
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+from socketserver import ThreadingMixIn, TCPServer, BaseRequestHandler
+
+ZBX_HEADER = b"ZBXD\x01"
+
+
+def pack(payload):
+    data = json.dumps(payload).encode("utf-8")
+    return ZBX_HEADER + struct.pack("<II", len(data), 0) + data
+
+
+def recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class TrapperHandler(BaseRequestHandler):
+    def handle(self):
+        start = time.perf_counter()
+        try:
+            header = recv_exactly(self.request, 13)
+            if header[:4] != b"ZBXD":
+                return
+            length = struct.unpack("<I", header[5:9])[0]
+            request = json.loads(recv_exactly(self.request, length)
+                                 .decode("utf-8"))
+        except (EOFError, ValueError):
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        values = request.get("data", [])
+        failed = [v for v in values if self.server.fail_keys and
+                  self.server.fail_keys.search(v.get("key", ""))]
+        spent = time.perf_counter() - start
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.received.extend(values)
+        if self.server.verbose:
+            for value in values:
+                print("%s %s %s" % (value.get("host"), value.get("key"),
+                                    value.get("value")))
+            sys.stdout.flush()
+        info = "processed: %d; failed: %d; total: %d; seconds spent: %f" % (
+            len(values) - len(failed), len(failed), len(values), spent)
+        self.request.sendall(pack({"response": "success", "info": info}))
+
+
+class TrapperStandinServer(ThreadingMixIn, TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, fail_keys=None, latency=0, verbose=False):
+        TCPServer.__init__(self, address, TrapperHandler)
+        self.fail_keys = re.compile(fail_keys) if fail_keys else None
+        self.latency = latency
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.received = []
+
+
+def start_server(port=0, fail_keys=None, latency=0, host="127.0.0.1"):
+    """Start stand-in in background thread, return server"""
+    server = TrapperStandinServer((host, port), fail_keys, latency)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local Zabbix trapper stand-in')
+    parser.add_argument('-p', dest='port', type=int, default=10051,
+                        help='Port to listen on (default: 10051)')
+    parser.add_argument('-F', dest='fail_keys',
+                        help='Report values with keys matching regexp '
+                             'as failed')
+    parser.add_argument('-l', dest='latency', type=float, default=0,
+                        help='Artificial latency per request in seconds')
+    parser.add_argument('-q', dest='verbose', action='store_false',
+                        help='Do not print received values')
+    args = parser.parse_args()
+    server = TrapperStandinServer(("127.0.0.1", args.port), args.fail_keys,
+                                  args.latency, args.verbose)
+    print("Listening on %s:%d" % server.server_address[:2])
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -7,39 +7,49 @@
 #
 # tw-cli requires root permissions.
 #
-# Create a file named /etc/sudoers.d/tw-cli with this line inside :
+# Create a file named /etc/sudoers.d/tw-cli with these lines inside :
 # username ALL=(ALL) NOPASSWD: /usr/sbin/tw-cli
+# Defaults:username user_command_timeouts
+# The second one lets sudo kill hung command on timeout (sudo 1.8.20+).
 #
 # You can get Debian/Ubuntu tw-cli packages here - http://hwraid.le-vert.net/
 #
+# Controllers state is read from tw_snapshot.py cache shared with
+# zabbix 3ware collectors, tw-cli runs at most once per cache TTL.
+#
+# With -a only controller alarms newer than ones seen on previous run are
+# read, and disks are re-read only for controllers with new alarms
+# or once per -R seconds, so the check can run often without loading
+# controllers.
+#
 # Copyright 2014 Alexander Bulimov <lazywolf0@gmail.com>
 #
 # Released under the MIT license, see LICENSE for details.
 #
 # Inspired by 3ware_status utility
 
-import subprocess
 import sys
-import re
 import os
+import argparse
+
+import tw_snapshot
 
 
 class Check3wareStatus:
-    def __init__(self):
+    def __init__(self, cache_file, cache_ttl, timeout, workers,
+                 rescan=None):
         self.name = 'Check3wareStatus'
         self.good_disks = []
         self.bad_disks = []
-        self.controllers = []
+        self.cache_file = cache_file
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.workers = workers
+        # full rescan interval for alarms mode, None for full polling
+        self.rescan = rescan
         self.binary = 'tw-cli'
         if os.getuid() != 0:
-            self.binary = 'sudo -n -k ' + self.binary
-
-    def execute(self, cmd):
-        # returns (rc, stdout, stderr) from shell command
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True)
-        stdout, stderr = process.communicate()
-        return (process.returncode, stdout, stderr)
+            self.binary = 'sudo -n ' + self.binary
 
     def ok(self, message):
         print("%s OK: %s" % (self.name, message))
@@ -57,54 +67,77 @@ class Check3wareStatus:
         print("%s UNKNOWN: %s" % (self.name, message))
         sys.exit(3)
 
-    def parse_controllers(self, data):
-        for line in data.splitlines():
-            if line:
-                controller = line.split()[0]
-                if re.match(r'^c[0-9]+$', controller):
-                    self.controllers.append(controller)
-
-    def parse_disks(self, data, controller):
-        for line in data.splitlines():
-            if line:
-                splitted = line.split()
-                if re.match(r'^[p][0-9]+$', splitted[0]):
-                    # '-' means the drive doesn't belong to any array
-                    # If is NOT PRESENT too, it means this is an empty port
-                    status = splitted[1]
-                    name = splitted[0]
-                    unit = splitted[2]
-                    if not unit == '-' and not unit == 'NOT-PRESENT':
-                        line = controller + unit + name + ': ' + status
-                        if status == 'OK':
-                            self.good_disks.append(line)
-                        else:
-                            self.bad_disks.append(line)
+    def parse_snapshot(self, snapshot):
+        for controller, unit, port, status in \
+                tw_snapshot.iter_disks(snapshot):
+            line = controller + unit + port + ': ' + status
+            if status == 'OK':
+                self.good_disks.append(line)
+            else:
+                self.bad_disks.append(line)
 
     def run(self):
-        rc, raw_data, err = self.execute("%s info" % self.binary)
-        if rc != 0:
-            self.unknown("tw-cli command failed with %s " % err)
-        self.parse_controllers(raw_data)
-
-        for controller in self.controllers:
-            rc, raw_data, err = self.execute("%s info %s" %
-                                             (self.binary, controller))
-            if rc != 0:
-                self.unknown("tw-cli command failed with %s " % err)
-            self.parse_disks(raw_data, controller)
+        try:
+            if self.rescan:
+                snapshot = tw_snapshot.get_snapshot_incremental(
+                    self.binary, self.cache_file, self.cache_ttl,
+                    self.timeout, self.workers, self.rescan)
+            else:
+                snapshot = tw_snapshot.get_snapshot(
+                    self.binary, self.cache_file, self.cache_ttl,
+                    self.timeout, self.workers)
+        except tw_snapshot.SnapshotError as e:
+            self.unknown(e)
+        self.parse_snapshot(snapshot)
+        errors = ', '.join('%s: %s' % (controller, error) for controller, error
+                           in sorted(snapshot.get('errors', {}).items()))
 
         if self.bad_disks:
             data = ', '.join(self.bad_disks)
             bad_count = len(self.bad_disks)
             good_count = len(self.good_disks)
             total_count = bad_count + good_count
+            if errors:
+                data += '; unknown controllers - ' + errors
             self.critical("%s of %s disks are in bad state - %s" %
                           (bad_count, total_count, data))
+        elif errors:
+            data = len(self.good_disks)
+            self.unknown("can not check controllers - %s; "
+                         "all %s disks on other controllers are OK" %
+                         (errors, data))
         else:
             data = len(self.good_disks)
             self.ok("All %s found disks are OK" % data)
 
 if __name__ == "__main__":
-    module = Check3wareStatus()
+    parser = argparse.ArgumentParser(
+        description='Check 3ware RAID disks status')
+    parser.add_argument('-f', dest='cache_file',
+                        default=tw_snapshot.cache_file,
+                        help='Shared tw-cli snapshot cache file '
+                             '(default: %s)' % tw_snapshot.cache_file)
+    parser.add_argument('-t', dest='cache_ttl', type=int,
+                        default=tw_snapshot.cache_ttl,
+                        help='Snapshot cache TTL in seconds '
+                             '(default: %d)' % tw_snapshot.cache_ttl)
+    parser.add_argument('-T', dest='timeout', type=int,
+                        default=tw_snapshot.call_timeout,
+                        help='Timeout for single tw-cli call in seconds '
+                             '(default: %d)' % tw_snapshot.call_timeout)
+    parser.add_argument('-j', dest='workers', type=int,
+                        default=tw_snapshot.max_workers,
+                        help='Number of controllers queried at once '
+                             '(default: %d)' % tw_snapshot.max_workers)
+    parser.add_argument('-a', dest='alarms', action='store_true',
+                        help='Read only new controller alarms and re-read '
+                             'disks of controllers which got them')
+    parser.add_argument('-R', dest='rescan', type=int,
+                        default=tw_snapshot.rescan_interval,
+                        help='Full rescan interval in seconds for -a '
+                             '(default: %d)' % tw_snapshot.rescan_interval)
+    args = parser.parse_args()
+    module = Check3wareStatus(args.cache_file, args.cache_ttl, args.timeout,
+                              args.workers, args.rescan if args.alarms
+                              else None)
     module.run()
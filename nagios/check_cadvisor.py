@@ -6,6 +6,24 @@
 # Checks CPU or Memory Usage status inside given container
 # via cAdvisor API
 #
+# In batch mode (-N or -r) all matching containers are checked
+# with a single request to cAdvisor, and results are reported either
+# as one multi-line Nagios result or as passive check results (-P).
+#
+# With -d responses are cached on disk, so many checks against the same
+# node share machine data (--machine-ttl) and stats (--stats-ttl).
+# Cache directory must be private to the user running the checks,
+# only successful responses are cached.
+#
+# With -A 2.0 cAdvisor v2.0 API is used, so only last -S stats samples
+# are transferred instead of full container info.
+#
+# Samples are aggregated with -a (mean, max, p95, ewma or last), CPU rates
+# are calculated from real sample timestamps.
+#
+# Processes from cAdvisor-companion (-U) are only fetched for WARNING and
+# CRITICAL results, within -B seconds.
+#
 # Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
 #
 # Released under the MIT license, see LICENSE for details.
@@ -13,39 +31,222 @@
 from __future__ import unicode_literals
 from __future__ import division
 from __future__ import print_function
+import os
 import sys
+import re
+import stat
+import time
+import math
+import calendar
+import errno
+import threading
+import hashlib
+import tempfile
 import argparse
 import json
+from array import array
 import requests
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STATUS_NAMES = ('OK', 'WARNING', 'CRITICAL', 'UNKNOWN')
+AGGREGATIONS = ('mean', 'max', 'p95', 'ewma', 'last')
+EWMA_ALPHA = 0.3
 
 
-def get_host_data(cadvisor_url, host_name):
+class ResponseCache(object):
+    """On-disk cache of cAdvisor responses shared by concurrent checks,
+    entries are only trusted in private directory of the user"""
+    def __init__(self, directory, machine_ttl, stats_ttl):
+        self.directory = directory
+        self.machine_ttl = machine_ttl
+        self.stats_ttl = stats_ttl
+
+    def path(self, url):
+        """Return cache file path for given url"""
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.json')
+
+    @staticmethod
+    def trusted(st):
+        """Return True if file with stat st is ours and only we can
+        write to it"""
+        return st.st_uid == os.getuid() and \
+            not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    def get(self, url, ttl):
+        """Return cached payload for url if it is younger than ttl"""
+        try:
+            if not self.trusted(os.stat(self.directory)):
+                return None
+            with open(self.path(url)) as f:
+                if not self.trusted(os.fstat(f.fileno())):
+                    return None
+                entry = json.load(f)
+            if entry.get("url") != url or time.time() - entry["time"] > ttl:
+                return None
+            return entry["payload"]
+        except (IOError, OSError, ValueError, KeyError, TypeError,
+                AttributeError):
+            return None
+
+    def put(self, url, payload):
+        """Store payload for url, replacing old entry atomically"""
+        try:
+            os.makedirs(self.directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+        try:
+            if not self.trusted(os.stat(self.directory)):
+                return
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"url": url, "time": time.time(),
+                           "payload": payload}, f)
+            # rename is atomic, so readers see either old or new entry
+            os.rename(tmp_path, self.path(url))
+        except (IOError, OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def fetch_json(url, session=None, cache=None, ttl=0, timeout=10,
+               deadline=None):
+    """Get url and return decoded JSON, using cache when ttl is set,
+    request timeout is cut to time left before deadline"""
+    if cache and ttl:
+        payload = cache.get(url, ttl)
+        if payload is not None:
+            return payload
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.time())
+        if timeout <= 0:
+            raise requests.exceptions.Timeout("deadline passed before %s"
+                                              % url)
+    http = session or requests
+    response = http.get(url, timeout=timeout)
+    payload = json.loads(response.text)
+    # error bodies must not be served to other checks
+    if cache and ttl and 200 <= response.status_code < 300 and \
+            isinstance(payload, dict):
+        cache.put(url, payload)
+    return payload
+
+
+def get_host_data(cadvisor_url, host_name, session=None, cache=None):
     """Get cAdvisor url, hostname, and return host data in JSON"""
-    host_raw_data = requests.get(cadvisor_url + "/api/v1.2/docker/" +
-                                 host_name,
-                                 timeout=10)
-    host_data = json.loads(host_raw_data.text)
-    host_id = host_data.keys()[0]
-    return host_data[host_id]
+    host_data = fetch_json(cadvisor_url + "/api/v1.2/docker/" + host_name,
+                           session, cache,
+                           cache.stats_ttl if cache else 0)
+    return list(host_data.values())[0]
+
+
+def get_all_hosts_data(cadvisor_url, session=None, cache=None, timeout=10,
+                       deadline=None):
+    """Get cAdvisor url and return data for all docker containers in JSON"""
+    payload = fetch_json(cadvisor_url + "/api/v1.2/docker/",
+                         session, cache,
+                         cache.stats_ttl if cache else 0, timeout, deadline)
+    return list(payload.values())
+
+
+def merge_v2_data(stats_payload, spec_payload):
+    """Build v1.2-like containers data from v2.0 stats and spec responses"""
+    hosts_data = []
+    for name, stats in stats_payload.items():
+        spec = spec_payload.get(name, {})
+        mem_limit = spec.get("memory", {}).get("limit") or sys.maxsize
+        hosts_data.append({
+            "name": name,
+            "aliases": spec.get("aliases", []),
+            "spec": {"memory": {"limit": mem_limit}},
+            "stats": stats})
+    return hosts_data
 
 
+def get_host_data_v2(cadvisor_url, host_name, samples,
+                     session=None, cache=None):
+    """Get cAdvisor url, hostname, and return last samples of host data
+    using v2.0 API"""
+    stats = fetch_json(cadvisor_url + "/api/v2.0/stats/" + host_name +
+                       "?type=docker&count=%d" % samples,
+                       session, cache, cache.stats_ttl if cache else 0)
+    spec = fetch_json(cadvisor_url + "/api/v2.0/spec/" + host_name +
+                      "?type=docker",
+                      session, cache, cache.machine_ttl if cache else 0)
+    return merge_v2_data(stats, spec)[0]
 
-def get_host_procs(companion_url, host_id, sort_by):
+
+def get_all_hosts_data_v2(cadvisor_url, samples, session=None, cache=None,
+                          timeout=10, deadline=None):
+    """Get cAdvisor url and return last samples of data for all docker
+    containers using v2.0 API"""
+    stats = fetch_json(cadvisor_url + "/api/v2.0/stats/" +
+                       "?type=docker&recursive=true&count=%d" % samples,
+                       session, cache, cache.stats_ttl if cache else 0,
+                       timeout, deadline)
+    spec = fetch_json(cadvisor_url + "/api/v2.0/spec/" +
+                      "?type=docker&recursive=true",
+                      session, cache, cache.machine_ttl if cache else 0,
+                      timeout, deadline)
+    return merge_v2_data(stats, spec)
+
+
+def get_host_procs(companion_url, host_id, sort_by, session=None, timeout=5):
     """Get cAdvisor url, hostname, and return host data in JSON"""
+    http = session or requests
     payload = {'sort': sort_by, 'limit': 5, 'interval': 30}
-    ps_response = requests.get(companion_url + "/api/v1.0" + host_id +
-                               "/processes",
-                               params=payload,
-                               timeout=5)
+    ps_response = http.get(companion_url + "/api/v1.0" + host_id +
+                           "/processes",
+                           params=payload,
+                           timeout=timeout)
     ps = json.loads(ps_response.text)
     return ps[-1]["processes"]
 
 
-def get_machine_data(cadvisor_url):
+def get_machine_data(cadvisor_url, session=None, cache=None, timeout=10,
+                     deadline=None):
     """Get cAdvisor url and return parent host data in JSON"""
-    response = requests.get(cadvisor_url + "/api/v1.2/machine")
-    payload = json.loads(response.text)
-    return payload
+    return fetch_json(cadvisor_url + "/api/v1.2/machine",
+                      session, cache,
+                      cache.machine_ttl if cache else 0, timeout, deadline)
+
+
+class BackgroundCall(threading.Thread):
+    """Run function in background thread and wait for its result later"""
+    def __init__(self, func, *args, **kwargs):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+
+    def wait(self, timeout=None):
+        """Return function result, raise its error or Timeout"""
+        self.join(timeout)
+        if self.is_alive():
+            raise requests.exceptions.Timeout("no response in %ss" % timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
 
 
 def ok(message):
@@ -68,6 +269,27 @@ def unknown(message):
     sys.exit(3)
 
 
+def report(code, message):
+    """Print message with Nagios status for code and exit"""
+    (ok, warn, critical, unknown)[code](message)
+
+
+def sample_count(value):
+    """Parse -S argument, rates need at least 2 samples"""
+    count = int(value)
+    if count < 2:
+        raise argparse.ArgumentTypeError("at least 2 samples are required")
+    return count
+
+
+def host_display_name(host_data):
+    """Return human-readable container name from its cAdvisor data"""
+    aliases = host_data.get("aliases")
+    if aliases:
+        return aliases[0]
+    return host_data["name"]
+
+
 def show_procs(procs, mem_limit):
     """Pretty print host procs in ps-like fashion"""
     mem_limit_kb = mem_limit / 1024
@@ -100,41 +322,173 @@ def calculate_mem_limit(machine_data, host_data):
     return mem_limit
 
 
-def process_cpu_checks(machine_data, host_data,
-                       warn_level, crit_level, host_procs):
-    """Process CPU checks for data"""
+def parse_timestamp(value):
+    """Convert RFC 3339 timestamp from cAdvisor to seconds since epoch"""
+    value = value.strip()
+    offset = 0
+    if value.endswith("Z"):
+        value = value[:-1]
+    elif value[-6] in "+-" and value[-3] == ":":
+        sign = 1 if value[-6] == "+" else -1
+        offset = sign * (int(value[-5:-3]) * 3600 + int(value[-2:]) * 60)
+        value = value[:-6]
+    seconds, _, fraction = value.partition(".")
+    parsed = calendar.timegm(time.strptime(seconds, "%Y-%m-%dT%H:%M:%S"))
+    if fraction:
+        parsed += float("0." + fraction)
+    return parsed - offset
+
+
+class StatsSeries(object):
+    """Compact series of container stats samples for aggregation"""
+    def __init__(self, stats):
+        times = array('d')
+        cpu = array('d')
+        mem = array('d')
+        for stat in stats:
+            try:
+                times.append(parse_timestamp(stat["timestamp"]))
+            except (KeyError, ValueError):
+                pass
+            cpu.append(stat["cpu"]["usage"]["total"])
+            mem.append(stat["memory"]["usage"])
+        if len(times) != len(cpu) or len(cpu) < 2 or times[-1] <= times[0]:
+            # without usable timestamps assume samples cover one minute
+            step = 60 / max(len(cpu) - 1, 1)
+            times = array('d', [i * step for i in range(len(cpu))])
+        if numpy is not None:
+            times = numpy.frombuffer(times, dtype=numpy.float64)
+            cpu = numpy.frombuffer(cpu, dtype=numpy.float64)
+            mem = numpy.frombuffer(mem, dtype=numpy.float64)
+        self.times = times
+        self.cpu = cpu
+        self.mem = mem
+
+    def cpu_intervals(self):
+        """Return (used CPU nanoseconds, elapsed seconds) of every interval
+        between samples, usage drops of counter resets are clamped to 0"""
+        if numpy is not None:
+            elapsed = numpy.diff(self.times)
+            used = numpy.clip(numpy.diff(self.cpu), 0, None)
+            valid = elapsed > 0
+            return used[valid], elapsed[valid]
+        used = array('d')
+        elapsed = array('d')
+        for i in range(1, len(self.cpu)):
+            seconds = self.times[i] - self.times[i - 1]
+            if seconds > 0:
+                used.append(max(self.cpu[i] - self.cpu[i - 1], 0))
+                elapsed.append(seconds)
+        return used, elapsed
+
+    def cpu_rates(self):
+        """Return CPU usage in nanoseconds per second for every interval"""
+        used, elapsed = self.cpu_intervals()
+        if numpy is not None:
+            return used / elapsed
+        return array('d', [u / e for u, e in zip(used, elapsed)])
+
+    def cpu_usage(self, aggregation='mean', alpha=EWMA_ALPHA):
+        """Return aggregated CPU usage in nanoseconds per second"""
+        if aggregation == 'mean':
+            # mean of interval rates weighted by their length
+            used, elapsed = self.cpu_intervals()
+            if not len(elapsed):
+                raise ValueError("less than 2 stats samples to calculate "
+                                 "CPU usage from")
+            if numpy is not None:
+                return numpy.sum(used) / numpy.sum(elapsed)
+            return sum(used) / sum(elapsed)
+        return aggregate(self.cpu_rates(), aggregation, alpha)
+
+    def mem_usage(self, aggregation='mean', alpha=EWMA_ALPHA):
+        """Return aggregated memory usage in bytes"""
+        return aggregate(self.mem, aggregation, alpha)
+
+
+def aggregate(values, aggregation, alpha=EWMA_ALPHA):
+    """Reduce series of values with given aggregation"""
+    if not len(values):
+        raise ValueError("no stats samples to aggregate")
+    if aggregation == 'last':
+        return values[-1]
+    if aggregation == 'max':
+        return numpy.max(values) if numpy is not None else max(values)
+    if aggregation == 'mean':
+        if numpy is not None:
+            return numpy.mean(values)
+        return sum(values) / len(values)
+    if aggregation == 'p95':
+        ordered = numpy.sort(values) if numpy is not None else sorted(values)
+        return ordered[int(math.ceil(0.95 * len(ordered))) - 1]
+    if aggregation == 'ewma':
+        result = values[0]
+        for value in values[1:]:
+            result = alpha * value + (1 - alpha) * result
+        return result
+    raise ValueError("unknown aggregation %s" % aggregation)
+
+
+def calculate_cpu_usage(machine_data, host_data, aggregation='mean'):
+    """Calculate CPU usage percent for container"""
     # Usage % = (Used CPU Time (in nanoseconds) for the interval) /
     #   (interval (in nano secs) * num cores)
-    mem_limit = calculate_mem_limit(machine_data, host_data)
-    cpu_usage_total_per_min = host_data["stats"][-1]["cpu"]["usage"]["total"] -\
-        host_data["stats"][0]["cpu"]["usage"]["total"]
+    series = StatsSeries(host_data["stats"])
     cpu_num_cores = machine_data["num_cores"]
-    cpu_usage_percent = cpu_usage_total_per_min / 60 / 10000000 / cpu_num_cores
+    return float(series.cpu_usage(aggregation)) / 10000000 / cpu_num_cores
+
+
+def calculate_mem_usage(host_data, aggregation='mean'):
+    """Calculate memory usage in bytes for container"""
+    series = StatsSeries(host_data["stats"])
+    return int(series.mem_usage(aggregation))
+
+
+def evaluate_cpu(machine_data, host_data, warn_level, crit_level,
+                 aggregation='mean'):
+    """Evaluate CPU usage, return (code, message, perfdata)"""
+    cpu_usage_percent = calculate_cpu_usage(machine_data, host_data,
+                                            aggregation)
     perfdata = ' | cpu_usage=%.2f%%;%d;%d;0;100' % \
         (cpu_usage_percent, warn_level, crit_level)
     message = '%5.2f%% CPU used!' % cpu_usage_percent
-    try:
-        procs_string = show_procs(host_procs, mem_limit)
-    except Exception:
-        procs_string = ""
 
     if cpu_usage_percent > crit_level:
-        critical(message + procs_string + perfdata)
+        return 2, message, perfdata
     if cpu_usage_percent > warn_level:
-        warn(message + procs_string + perfdata)
+        return 1, message, perfdata
+    return 0, message, perfdata
+
+
+def process_cpu_checks(machine_data, host_data,
+                       warn_level, crit_level, host_procs, aggregation='mean'):
+    """Process CPU checks for data"""
+    try:
+        code, message, perfdata = evaluate_cpu(machine_data, host_data,
+                                               warn_level, crit_level,
+                                               aggregation)
+    except ValueError as e:
+        unknown(e)
+    if code:
+        # processes are only interesting for bad results, so host_procs
+        # may be a function fetching them on demand
+        if callable(host_procs):
+            host_procs = host_procs()
+        mem_limit = calculate_mem_limit(machine_data, host_data)
+        try:
+            procs_string = show_procs(host_procs, mem_limit)
+        except Exception:
+            procs_string = ""
+        report(code, message + procs_string + perfdata)
     ok(message + perfdata)
 
 
-def process_mem_checks(machine_data, host_data, check_used,
-                       warn_level, crit_level, host_procs):
-    """Process memory checks for data"""
+def evaluate_mem(machine_data, host_data, check_used, warn_level, crit_level,
+                 aggregation='mean'):
+    """Evaluate memory usage, return (code, message, perfdata)"""
     mem_limit = calculate_mem_limit(machine_data, host_data)
 
-    mem_used_sum = 0
-    for stat in host_data["stats"]:
-        mem_used_sum += stat["memory"]["usage"]
-
-    mem_used = mem_used_sum // len(host_data["stats"])
+    mem_used = calculate_mem_usage(host_data, aggregation)
     mem_free_kb = (mem_limit - mem_used) / 1024
     mem_used_kb = mem_used / 1024
     mem_limit_kb = mem_limit / 1024
@@ -144,25 +498,141 @@ def process_mem_checks(machine_data, host_data, check_used,
                                                 warn_level * mem_limit_kb / 100,
                                                 crit_level * mem_limit_kb / 100,
                                                 mem_limit_kb)
-    try:
-        procs_string = show_procs(host_procs, mem_limit)
-    except Exception:
-        procs_string = ""
 
     if check_used:
         message = '%5.2f%% Mem (%d kB) used!' % (mem_used_percent, mem_used_kb)
         if mem_used_percent > crit_level:
-            critical(message + procs_string + perfdata)
+            return 2, message, perfdata
         if mem_used_percent > warn_level:
-            warn(message + procs_string + perfdata)
-        ok(message + perfdata)
+            return 1, message, perfdata
     else:
         message = '%5.2f%% Mem (%d kB) free!' % (mem_free_percent, mem_free_kb)
-        if mem_free_percent < args.crit:
-            critical(message + procs_string + perfdata)
-        if mem_free_percent < args.warn:
-            warn(message + procs_string + perfdata)
-        ok(message + perfdata)
+        if mem_free_percent < crit_level:
+            return 2, message, perfdata
+        if mem_free_percent < warn_level:
+            return 1, message, perfdata
+    return 0, message, perfdata
+
+
+def process_mem_checks(machine_data, host_data, check_used,
+                       warn_level, crit_level, host_procs, aggregation='mean'):
+    """Process memory checks for data"""
+    try:
+        code, message, perfdata = evaluate_mem(machine_data, host_data,
+                                               check_used, warn_level,
+                                               crit_level, aggregation)
+    except ValueError as e:
+        unknown(e)
+    if code:
+        # processes are only interesting for bad results, so host_procs
+        # may be a function fetching them on demand
+        if callable(host_procs):
+            host_procs = host_procs()
+        mem_limit = calculate_mem_limit(machine_data, host_data)
+        try:
+            procs_string = show_procs(host_procs, mem_limit)
+        except Exception:
+            procs_string = ""
+        report(code, message + procs_string + perfdata)
+    ok(message + perfdata)
+
+
+def select_hosts(hosts_data, names=None, regex=None):
+    """Filter containers data by list of names or by name regex"""
+    selected = []
+    pattern = re.compile(regex) if regex else None
+    for host_data in hosts_data:
+        aliases = host_data.get("aliases") or [host_data["name"]]
+        if names is not None and not set(aliases) & set(names):
+            continue
+        if pattern and not any(pattern.search(alias) for alias in aliases):
+            continue
+        selected.append(host_data)
+    return selected
+
+
+def fetch_batch_procs(bad, args):
+    """Fetch processes of bad containers concurrently within one
+    procs budget, return {key: procs string} for [(key, machine data,
+    host data)], fetches not done in budget are skipped"""
+    deadline = time.time() + args.procs_budget
+    calls = []
+    for key, machine_data, host_data in bad:
+        # sessions are not thread-safe, every call uses its own connection
+        calls.append((key, machine_data, host_data, BackgroundCall(
+            get_host_procs, args.companion_url, host_data["name"],
+            "cpu" if args.cpu else "mem", timeout=args.procs_budget)))
+    procs = {}
+    for key, machine_data, host_data, call in calls:
+        try:
+            host_procs = call.wait(max(deadline - time.time(), 0))
+            procs[key] = show_procs(
+                host_procs, calculate_mem_limit(machine_data, host_data))
+        except Exception:
+            pass
+    return procs
+
+
+def process_batch_checks(machine_data, hosts_data, args, names=None):
+    """Evaluate all given containers, return list of (name, code, output)"""
+    results = []
+    bad = []
+    found = set()
+    for host_data in hosts_data:
+        name = host_display_name(host_data)
+        found.update(host_data.get("aliases") or [host_data["name"]])
+        try:
+            if args.cpu:
+                code, message, perfdata = evaluate_cpu(
+                    machine_data, host_data, args.warn, args.crit,
+                    args.aggregation)
+            else:
+                code, message, perfdata = evaluate_mem(
+                    machine_data, host_data, args.mem, args.warn,
+                    args.crit, args.aggregation)
+        except ValueError as e:
+            results.append((name, 3, "Can not evaluate stats: %s" % e, ""))
+            continue
+        if code and args.companion_url:
+            bad.append((len(results), machine_data, host_data))
+        results.append((name, code, message, perfdata))
+    procs = fetch_batch_procs(bad, args) if bad else {}
+    results = [(name, code, message + procs.get(index, "") + perfdata)
+               for index, (name, code, message, perfdata)
+               in enumerate(results)]
+    for name in names or []:
+        if name not in found:
+            results.append((name, 3, "Host %s not found" % name))
+    return results
+
+
+def print_passive_results(results, host_name, service_format):
+    """Print results as Nagios external PROCESS_SERVICE_CHECK_RESULT commands"""
+    now = int(time.time())
+    for name, code, output in results:
+        output = output.replace("\n", "\\n")
+        print("[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s" %
+              (now, host_name, service_format % name, code, output))
+
+
+def report_batch_results(results):
+    """Print results as one multi-line Nagios result and exit"""
+    if not results:
+        unknown("No matching containers found")
+    worst = max(code for name, code, output in results)
+    bad = [r for r in results if r[1]]
+    summary = "%s of %s containers in bad state" % (len(bad), len(results))
+    perfdata = []
+    lines = []
+    for name, code, output in sorted(results, key=lambda r: -r[1]):
+        message, _, perf = output.partition(" | ")
+        message = message.split("\n")[0]
+        lines.append("%s: %s: %s" % (STATUS_NAMES[code], name, message))
+        for item in perf.split():
+            perfdata.append("%s_%s" % (name, item))
+    if perfdata:
+        summary += " | " + " ".join(perfdata)
+    report(worst, summary + "\n" + "\n".join(lines))
 
 
 if __name__ == "__main__":
@@ -171,8 +641,42 @@ if __name__ == "__main__":
                         help='cAdvisor url')
     parser.add_argument('-U', dest='companion_url', required=False,
                         help='cAdvisor-companion url')
-    parser.add_argument('-n', dest='name', required=True,
-                        help='Docker container name')
+    parser.add_argument('-B', dest='procs_budget', type=float, default=2,
+                        help='Max seconds to wait for cAdvisor-companion '
+                             'data on WARNING/CRITICAL (default: 2)')
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument('-n', dest='name',
+                         help='Docker container name')
+    targets.add_argument('-N', dest='names',
+                         help='Comma-separated Docker container names '
+                              'to check in batch mode')
+    targets.add_argument('-r', dest='regex',
+                         help='Regex for Docker container names '
+                              'to check in batch mode')
+    parser.add_argument('-P', dest='passive_host',
+                        help='In batch mode, print passive check results '
+                             'for this Nagios host instead of multi-line output')
+    parser.add_argument('-s', dest='service_format', default='%s',
+                        help='In batch mode, Nagios service description '
+                             'format for container name (default: %%s)')
+    parser.add_argument('-A', dest='api_version', default='1.2',
+                        choices=['1.2', '2.0'],
+                        help='cAdvisor API version to use (default: 1.2)')
+    parser.add_argument('-S', dest='samples', type=sample_count, default=60,
+                        help='Number of last stats samples to request '
+                             'with API v2.0 (default: 60)')
+    parser.add_argument('-a', dest='aggregation', default='mean',
+                        choices=AGGREGATIONS,
+                        help='How to aggregate stats samples (default: mean)')
+    parser.add_argument('-d', dest='cache_dir',
+                        help='Directory for cAdvisor responses cache, '
+                             'shared between checks (disabled by default)')
+    parser.add_argument('--machine-ttl', dest='machine_ttl', type=int,
+                        default=300,
+                        help='Seconds to cache machine data (default: 300)')
+    parser.add_argument('--stats-ttl', dest='stats_ttl', type=int,
+                        default=10,
+                        help='Seconds to cache container stats (default: 10)')
     parser.add_argument('-w', dest='warn', type=int, required=True,
                         help='Load Average when to warn')
     parser.add_argument('-c', dest='crit', type=int, required=True,
@@ -185,29 +689,64 @@ if __name__ == "__main__":
     group.add_argument('-M', dest='mem', action='store_true',
                        help='Check USED memory percent')
     args = parser.parse_args()
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir,
+                              args.machine_ttl, args.stats_ttl)
+    if args.names or args.regex:
+        names = args.names.split(',') if args.names else None
+        session = requests.Session()
+        try:
+            if args.api_version == '2.0':
+                hosts_data = get_all_hosts_data_v2(args.url, args.samples,
+                                                   session, cache)
+            else:
+                hosts_data = get_all_hosts_data(args.url, session, cache)
+            machine_data = get_machine_data(args.url, session, cache)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            unknown(e)
+        hosts_data = select_hosts(hosts_data, names, args.regex)
+        results = process_batch_checks(machine_data, hosts_data, args,
+                                       names)
+        if args.passive_host:
+            print_passive_results(results, args.passive_host,
+                                  args.service_format)
+            sys.exit(0)
+        report_batch_results(results)
     try:
-        host_data = get_host_data(args.url, args.name)
-        machine_data = get_machine_data(args.url)
+        # machine and host data are independent, fetch them concurrently
+        machine_call = BackgroundCall(get_machine_data, args.url, cache=cache)
+        if args.api_version == '2.0':
+            host_data = get_host_data_v2(args.url, args.name, args.samples,
+                                         cache=cache)
+        else:
+            host_data = get_host_data(args.url, args.name, cache=cache)
+        machine_data = machine_call.wait()
     except (requests.exceptions.RequestException, ValueError) as e:
         unknown(e)
     if host_data:
-        host_procs = ([], [])
-        if args.companion_url:
+        def host_procs():
+            """Fetch container processes within latency budget"""
+            if not args.companion_url:
+                return []
             try:
-                if args.cpu:
-                    host_procs = get_host_procs(args.companion_url,
-                                                host_data["name"], "cpu")
-                else:
-                    host_procs = get_host_procs(args.companion_url,
-                                                host_data["name"], "mem")
-            except (requests.exceptions.RequestException, ValueError) as e:
+                call = BackgroundCall(get_host_procs, args.companion_url,
+                                      host_data["name"],
+                                      "cpu" if args.cpu else "mem",
+                                      timeout=args.procs_budget)
+                return call.wait(args.procs_budget)
+            except Exception as e:
+                # companion may answer with empty list before its first
+                # sample or with error object, processes are optional
                 print("(can be ignored) Failed to fetch cAdvisor-companion data: %s" % e)
-                host_procs = []
+                return []
         if args.cpu:
             process_cpu_checks(machine_data, host_data,
-                               args.warn, args.crit, host_procs)
+                               args.warn, args.crit, host_procs,
+                               args.aggregation)
         else:
             process_mem_checks(machine_data, host_data, args.mem,
-                               args.warn, args.crit, host_procs)
+                               args.warn, args.crit, host_procs,
+                               args.aggregation)
     else:
         unknown("Host %s not found" % args.name)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+#
+# Check Docker containers stats on many hosts via cAdvisor HTTP API
+# ===
+#
+# Checks CPU or Memory Usage status of containers on a fleet of
+# Docker hosts, querying all cAdvisor endpoints concurrently,
+# and reports cluster-wide summary with the worst offenders.
+#
+# Every node gets -t seconds from the moment it is picked up, shared by
+# all its requests, and the whole run is bounded by -T seconds: nodes
+# not answered in time are reported UNKNOWN and their hung requests
+# are abandoned.
+#
+# Uses check logic from check_cadvisor.py, which must be installed
+# in the same directory. Requires Python 3.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+import time
+import argparse
+import asyncio
+import threading
+import requests
+
+from check_cadvisor import (ResponseCache, STATUS_NAMES, AGGREGATIONS,
+                            get_all_hosts_data,
+                            get_all_hosts_data_v2, get_machine_data,
+                            select_hosts, evaluate_cpu, evaluate_mem,
+                            calculate_cpu_usage, calculate_mem_usage,
+                            calculate_mem_limit, host_display_name,
+                            sample_count, report, unknown)
+
+
+def read_endpoints(path):
+    """Read cAdvisor urls from file, one per line"""
+    endpoints = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                endpoints.append(line)
+    return endpoints
+
+
+def fetch_node(url, cache, deadline, samples=None):
+    """Get machine and containers data for one cAdvisor node before
+    deadline, using v2.0 API when samples count is given"""
+    session = requests.Session()
+    try:
+        machine_data = get_machine_data(url, session, cache,
+                                        deadline=deadline)
+        if samples:
+            hosts_data = get_all_hosts_data_v2(url, samples, session, cache,
+                                               deadline=deadline)
+        else:
+            hosts_data = get_all_hosts_data(url, session, cache,
+                                            deadline=deadline)
+    finally:
+        session.close()
+    return machine_data, hosts_data
+
+
+def start_call(loop, func, *args):
+    """Run func(*args) in daemon thread, return future of its result;
+    thread is abandoned if nobody waits for the future anymore,
+    and does not delay interpreter exit"""
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run():
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            # loop is closed, nobody waits for result
+            pass
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
+
+
+async def fetch_fleet(endpoints, concurrency, timeout, cache, samples=None,
+                      budget=None):
+    """Fetch data from all endpoints, return [(url, data, error)]"""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    end = time.time() + budget if budget else None
+
+    async def fetch(url):
+        async with semaphore:
+            # node deadline starts when it gets a slot, not when queued
+            deadline = time.time() + timeout
+            cut = end is not None and end < deadline
+            if cut:
+                deadline = end
+            if deadline <= time.time():
+                return url, None, "not queried, runtime budget of %ss " \
+                    "spent" % budget
+            try:
+                data = await asyncio.wait_for(
+                    start_call(loop, fetch_node, url, cache, deadline,
+                               samples),
+                    deadline - time.time())
+                return url, data, None
+            except (asyncio.TimeoutError, requests.exceptions.Timeout):
+                if cut:
+                    return url, None, "runtime budget of %ss spent" % budget
+                return url, None, "timed out after %ss" % timeout
+            except (requests.exceptions.RequestException, ValueError) as e:
+                return url, None, e
+            except Exception as e:
+                # valid JSON of unexpected shape fails this node only
+                return url, None, unexpected(e)
+
+    return await asyncio.gather(*[fetch(url) for url in endpoints])
+
+
+def unexpected(error):
+    return "unexpected response: %s: %s" % (type(error).__name__, error)
+
+
+def evaluate_node(url, machine_data, hosts_data, args):
+    """Evaluate containers of one node,
+    return [(code, value, url, name, message)]"""
+    checks = []
+    for host_data in select_hosts(hosts_data, regex=args.regex):
+        try:
+            if args.cpu:
+                code, message, perfdata = evaluate_cpu(
+                    machine_data, host_data, args.warn, args.crit,
+                    args.aggregation)
+                value = calculate_cpu_usage(machine_data, host_data,
+                                            args.aggregation)
+            else:
+                code, message, perfdata = evaluate_mem(
+                    machine_data, host_data, args.mem, args.warn,
+                    args.crit, args.aggregation)
+                value = calculate_mem_usage(host_data,
+                                            args.aggregation) * \
+                    100 / calculate_mem_limit(machine_data, host_data)
+        except ValueError as e:
+            code, message, value = 3, "Can not evaluate stats: %s" % e, 0
+        checks.append((code, value, url, host_display_name(host_data),
+                       message))
+    return checks
+
+
+def evaluate_fleet(results, args):
+    """Evaluate containers from all nodes, return (checks, failed nodes)"""
+    checks = []
+    failed = []
+    for url, data, error in results:
+        if error is not None:
+            failed.append((url, error))
+            continue
+        machine_data, hosts_data = data
+        try:
+            checks.extend(evaluate_node(url, machine_data, hosts_data, args))
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            failed.append((url, unexpected(e)))
+    return checks, failed
+
+
+def report_fleet(checks, failed, nodes_count, top):
+    """Print cluster-wide summary with worst offenders and exit"""
+    counts = [0, 0, 0, 0]
+    for check in checks:
+        counts[check[0]] += 1
+    worst = max([check[0] for check in checks if check[0] != 3] or [0])
+    if (failed or counts[3]) and not worst:
+        worst = 3
+    summary = ("%d of %d nodes reachable, %d containers: "
+               "%d critical, %d warning, %d unknown" %
+               (nodes_count - len(failed), nodes_count, len(checks),
+                counts[2], counts[1], counts[3]))
+    perfdata = (" | nodes=%d;;;0 nodes_failed=%d;;;0 containers=%d;;;0 "
+                "containers_warning=%d;;;0 containers_critical=%d;;;0" %
+                (nodes_count, len(failed), len(checks),
+                 counts[1], counts[2]))
+    lines = []
+    offenders = sorted(checks, key=lambda c: (c[0], c[1]), reverse=True)
+    for code, value, url, name, message in offenders[:top]:
+        lines.append("%s: %s %s: %s" % (STATUS_NAMES[code], url, name,
+                                        message))
+    for url, error in failed:
+        lines.append("UNKNOWN: %s: %s" % (url, error))
+    report(worst, summary + perfdata + "\n" + "\n".join(lines))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Check Docker containers on many hosts from cAdvisor')
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument('-u', dest='urls', action='append',
+                         help='cAdvisor url, may be given multiple times')
+    targets.add_argument('-f', dest='urls_file',
+                         help='File with cAdvisor urls, one per line')
+    parser.add_argument('-r', dest='regex',
+                        help='Regex for Docker container names to check')
+    parser.add_argument('-j', dest='concurrency', type=int, default=20,
+                        help='Max nodes queried at once (default: 20)')
+    parser.add_argument('-t', dest='timeout', type=float, default=10,
+                        help='Per-node deadline in seconds (default: 10)')
+    parser.add_argument('-T', dest='budget', type=float, default=50,
+                        help='Total runtime budget in seconds, nodes not '
+                             'answered in it are UNKNOWN (default: 50)')
+    parser.add_argument('-k', dest='top', type=int, default=5,
+                        help='Number of worst offenders to show (default: 5)')
+    parser.add_argument('-A', dest='api_version', default='1.2',
+                        choices=['1.2', '2.0'],
+                        help='cAdvisor API version to use (default: 1.2)')
+    parser.add_argument('-S', dest='samples', type=sample_count, default=60,
+                        help='Number of last stats samples to request '
+                             'with API v2.0 (default: 60)')
+    parser.add_argument('-a', dest='aggregation', default='mean',
+                        choices=AGGREGATIONS,
+                        help='How to aggregate stats samples (default: mean)')
+    parser.add_argument('-d', dest='cache_dir',
+                        help='Directory for cAdvisor responses cache, '
+                             'shared with check_cadvisor.py')
+    parser.add_argument('--machine-ttl', dest='machine_ttl', type=int,
+                        default=300,
+                        help='Seconds to cache machine data (default: 300)')
+    parser.add_argument('--stats-ttl', dest='stats_ttl', type=int,
+                        default=10,
+                        help='Seconds to cache container stats (default: 10)')
+    parser.add_argument('-w', dest='warn', type=int, required=True,
+                        help='Percent when to warn')
+    parser.add_argument('-c', dest='crit', type=int, required=True,
+                        help='Percent when critical')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-C', dest='cpu', action='store_true',
+                       help='Check CPU usage percent')
+    group.add_argument('-m', dest='mem', action='store_false',
+                       help='Check FREE memory percent')
+    group.add_argument('-M', dest='mem', action='store_true',
+                       help='Check USED memory percent')
+    args = parser.parse_args()
+    try:
+        endpoints = args.urls or read_endpoints(args.urls_file)
+    except (IOError, OSError) as e:
+        unknown(e)
+    if not endpoints:
+        unknown("No cAdvisor urls given")
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir,
+                              args.machine_ttl, args.stats_ttl)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        results = loop.run_until_complete(
+            fetch_fleet(endpoints, args.concurrency, args.timeout, cache,
+                        args.samples if args.api_version == '2.0' else None,
+                        args.budget))
+    finally:
+        loop.close()
+    checks, failed = evaluate_fleet(results, args)
+    report_fleet(checks, failed, len(endpoints), args.top)
@@ -6,10 +6,33 @@
 # Checks Memory Usage status inside given container
 # just like check_memory.pl checks it on physical host.
 #
-# docker requires root permissions.
+# With -a all running containers are checked in one run,
+# both cgroup v1 and unified cgroup v2 hierarchies are supported.
 #
-# Create a file named /etc/sudoers.d/docker with this line inside :
+# With -P peak usage recorded by docker_memory_watcher.py for last
+# -W seconds is checked, so short spikes between checks are not missed.
+#
+# Container names are resolved from Docker metadata in
+# /var/lib/docker/containers, which requires read permissions
+# on that directory, for example:
+# setfacl -m u:username:rx /var/lib/docker/containers
+# setfacl -d -m u:username:rx /var/lib/docker/containers
+# setfacl -R -m u:username:rx /var/lib/docker/containers
+#
+# Names index is cached in private ~/.cache/check_docker_memory
+# directory of the user and updated when container configs change.
+# Docker writes configs with mode 0600, which masks inherited ACLs,
+# so configs of new containers may still be unreadable.
+#
+# Containers not found in readable metadata are looked up in
+# Docker Engine API on /var/run/docker.sock, which requires user to be
+# in docker group. If socket is not accessible too, docker cli is used,
+# and docker requires root permissions.
+#
+# Create a file named /etc/sudoers.d/docker with these lines inside :
 # username ALL=(ALL) NOPASSWD: /usr/bin/docker ps*
+# Defaults:username user_command_timeouts
+# The second one lets sudo kill hung command on timeout (sudo 1.8.20+).
 #
 # Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
 #
@@ -18,29 +41,120 @@
 from __future__ import unicode_literals
 from __future__ import division
 from __future__ import print_function
-import subprocess
 import sys
+import os
 import re
+import json
+import stat
+import socket
+import time
+import tempfile
 import argparse
+try:
+    import http.client as httplib
+    from urllib.parse import urlencode
+except ImportError:
+    import httplib
+    from urllib import urlencode
+
+import cmd_exec
+
+STATUS_NAMES = ('OK', 'WARNING', 'CRITICAL', 'UNKNOWN')
+# cgroupfs driver uses <id>, systemd driver uses docker-<id>.scope
+CGROUP_ID_RE = re.compile(r'^(?:docker-)?([0-9a-f]{64})(?:\.scope)?$')
+DOCKER_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+INDEX_FILE = os.path.join(os.path.expanduser('~'), '.cache',
+                          'check_docker_memory', 'names.index')
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """HTTP connection over unix socket"""
+    def __init__(self, socket_path, timeout=5):
+        httplib.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerClient:
+    """Minimal Docker Engine API client, keeps connection alive
+    between requests"""
+    def __init__(self, socket_path='/var/run/docker.sock', timeout=5):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connection = None
+
+    def get(self, path, params=None):
+        """GET path from API and return decoded JSON"""
+        if params:
+            path += '?' + urlencode(params)
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = UnixHTTPConnection(self.socket_path,
+                                                     self.timeout)
+            try:
+                self.connection.request('GET', path)
+                response = self.connection.getresponse()
+                body = response.read()
+                break
+            except (httplib.HTTPException, socket.error):
+                # server may close idle keep-alive connection, reconnect
+                self.close()
+                if attempt == 2:
+                    raise
+        if response.status != 200:
+            raise IOError("docker API returned %s for %s: %s" %
+                          (response.status, path, body))
+        return json.loads(body.decode('utf-8'))
+
+    def containers(self, name=None):
+        """List running containers, filtered by exact name on server side"""
+        params = None
+        if name is not None:
+            filters = {'name': ['^/%s$' % re.escape(name)]}
+            params = {'filters': json.dumps(filters)}
+        return self.get('/containers/json', params)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
 
 class CheckDockerMemory:
     """Check memory usage of running docker container"""
-    def __init__(self, docker_name, warn, crit, kind):
+    def __init__(self, docker_name, warn, crit, kind,
+                 containers_dir='/var/lib/docker/containers',
+                 index_file=INDEX_FILE,
+                 cgroup_root='/sys/fs/cgroup',
+                 docker_socket='/var/run/docker.sock',
+                 peaks_file=None, peaks_window=300):
         self.name = 'CheckDockerMemory'
         self.docker_name = docker_name
         self.warn_level = warn
         self.crit_level = crit
         self.check_kind = kind
+        self.containers_dir = containers_dir
+        self.index_file = index_file
+        self.cgroup_root = cgroup_root
+        self.docker_socket = docker_socket
+        self.peaks_file = peaks_file
+        self.peaks_window = peaks_window
 
-        self.binary = 'sudo -n -k docker'
+        self.binary = ['sudo', '-n', 'docker']
+        self.exec_timeout = 10
 
-    def execute(self, cmd):
-        """Run command in shell"""
-        # returns (rc, stdout, stderr) from shell command
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True)
-        stdout, stderr = process.communicate()
-        return (process.returncode, stdout, stderr)
+    def execute(self, argv):
+        """Run command from argv list"""
+        # returns (rc, stdout, stderr) from command
+        try:
+            return cmd_exec.run(argv, self.exec_timeout)
+        except cmd_exec.ExecTimeout as e:
+            self.unknown(e)
 
     def ok(self, message):
         print("%s OK: %s" % (self.name, message))
@@ -63,35 +177,223 @@ class CheckDockerMemory:
         for line in data.splitlines():
             if line:
                 splitted = line.split()
-            if re.match(r'^%s$' % self.docker_name, splitted[-1]):
-                docker_id = splitted[0]
-                return docker_id
+                if re.match(r'^%s$' % re.escape(self.docker_name),
+                            splitted[-1]):
+                    docker_id = splitted[0]
+                    return docker_id
         return None
 
+    def scan_configs(self):
+        """Return {docker_id: (config path, mtime)} of containers metadata,
+        docker rename only rewrites config, so its mtime is tracked"""
+        configs = {}
+        for docker_id in os.listdir(self.containers_dir):
+            if not DOCKER_ID_RE.match(docker_id):
+                continue
+            for config in ('config.v2.json', 'config.json'):
+                path = os.path.join(self.containers_dir, docker_id, config)
+                try:
+                    configs[docker_id] = (path, os.stat(path).st_mtime)
+                except OSError:
+                    continue
+                break
+        return configs
 
-    def run(self):
-        """Main class function"""
-        rc, raw_data, err = self.execute(
-            "%s ps -notrunc" % self.binary
-        )
+    def build_index(self, configs, cached=None):
+        """Map container names to ids from Docker metadata, names of
+        configs unchanged since cached index are reused; index is not
+        complete if some configs could not be read"""
+        cached = cached or {'names': {}, 'mtimes': {}}
+        cached_names = dict((v, k) for k, v in cached['names'].items())
+        names = {}
+        mtimes = {}
+        complete = True
+        for docker_id, (path, mtime) in configs.items():
+            mtimes[docker_id] = mtime
+            if cached['mtimes'].get(docker_id) == mtime and \
+                    docker_id in cached_names:
+                names[cached_names[docker_id]] = docker_id
+                continue
+            try:
+                with open(path) as f:
+                    name = json.load(f).get('Name', '')
+            except (IOError, OSError, ValueError):
+                complete = False
+                continue
+            names[name.lstrip('/')] = docker_id
+        return {'names': names, 'mtimes': mtimes, 'complete': complete}
+
+    def read_index(self):
+        """Return cached index, if it is ours and looks sane"""
+        try:
+            with open(self.index_file) as f:
+                st = os.fstat(f.fileno())
+                if st.st_uid != os.getuid() or \
+                        st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    return None
+                cached = json.load(f)
+            names, mtimes = cached['names'], cached['mtimes']
+            if all(DOCKER_ID_RE.match(docker_id)
+                   for docker_id in list(names.values()) + list(mtimes)):
+                return {'names': names, 'mtimes': mtimes,
+                        'complete': cached.get('complete') is True}
+        except (IOError, OSError, ValueError, KeyError, TypeError,
+                AttributeError):
+            pass
+        return None
+
+    def write_index(self, index):
+        """Replace cached index atomically, in private directory"""
+        directory = os.path.dirname(self.index_file) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.rename(tmp_path, self.index_file)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def load_index(self):
+        """Return cached names index, update it if container configs
+        changed"""
+        configs = self.scan_configs()
+        cached = self.read_index()
+        if cached is not None and cached['mtimes'] == dict(
+                (docker_id, mtime) for docker_id, (_, mtime)
+                in configs.items()):
+            return cached
+        index = self.build_index(configs, cached)
+        self.write_index(index)
+        return index
+
+    def api_names(self):
+        """Return {docker_id: name} of running containers from Docker API"""
+        client = DockerClient(self.docker_socket)
+        try:
+            containers = client.containers()
+        finally:
+            client.close()
+        names = {}
+        for container in containers:
+            if container.get('Names'):
+                names[container['Id']] = container['Names'][0].lstrip('/')
+        return names
+
+    def resolve_docker_id(self):
+        """Get container id by name from metadata, Docker API
+        or from docker cli"""
+        try:
+            docker_id = self.load_index()['names'].get(self.docker_name)
+            if docker_id is not None:
+                return docker_id
+        except (IOError, OSError):
+            pass
+        # new container or its config is not readable
+        if os.access(self.docker_socket, os.R_OK | os.W_OK):
+            client = DockerClient(self.docker_socket)
+            try:
+                for container in client.containers(self.docker_name):
+                    if '/' + self.docker_name in container.get('Names', []):
+                        return container['Id']
+                return None
+            except (IOError, OSError, ValueError, httplib.HTTPException):
+                pass
+            finally:
+                client.close()
+        rc, raw_data, err = self.execute(self.binary + ['ps', '-notrunc'])
         if rc != 0:
             error = raw_data + ' ' + err
             self.unknown("docker command failed with %s " % error)
+        return self.get_docker_id(raw_data)
 
-        docker_id = self.get_docker_id(raw_data)
-        if not docker_id:
-            self.critical("No container %s found." % self.docker_name)
-        with open('/sys/fs/cgroup/memory/docker/%s/memory.usage_in_bytes' % docker_id) as f:
+    def find_cgroups(self):
+        """Walk memory cgroup tree once, return {docker_id: (path, version)}"""
+        if os.path.exists(os.path.join(self.cgroup_root, 'cgroup.controllers')):
+            version = 2
+            parents = ('docker', 'system.slice')
+        else:
+            version = 1
+            parents = ('memory/docker', 'memory/system.slice')
+        cgroups = {}
+        for parent in parents:
+            parent_path = os.path.join(self.cgroup_root, parent)
+            try:
+                entries = os.listdir(parent_path)
+            except OSError:
+                continue
+            for entry in entries:
+                match = CGROUP_ID_RE.match(entry)
+                if match:
+                    cgroups[match.group(1)] = (
+                        os.path.join(parent_path, entry), version)
+        return cgroups
+
+    def read_cgroup_memory(self, path, version):
+        """Return (used, limit, cache) in kB for container cgroup,
+        limit is None if container memory is not limited"""
+        if version == 2:
+            files = ('memory.current', 'memory.max', 'file')
+        else:
+            files = ('memory.usage_in_bytes', 'memory.limit_in_bytes',
+                     'total_cache')
+        with open(os.path.join(path, files[0])) as f:
             mem_used_kb = int(f.read()) / 1024
-        with open('/sys/fs/cgroup/memory/docker/%s/memory.limit_in_bytes' % docker_id) as f:
-            mem_limit_kb = int(f.read()) / 1024
+        with open(os.path.join(path, files[1])) as f:
+            limit = f.read().strip()
+        mem_limit_kb = None if limit == 'max' else int(limit) / 1024
+        mem_cache_kb = 0
+        try:
+            with open(os.path.join(path, 'memory.stat')) as f:
+                for line in f:
+                    key, _, value = line.partition(' ')
+                    if key == files[2]:
+                        mem_cache_kb = int(value) / 1024
+                        break
+        except (IOError, OSError, ValueError):
+            pass
+        return mem_used_kb, mem_limit_kb, mem_cache_kb
+
+    def read_mem_total(self):
+        """Return total host memory in kB from /proc/meminfo"""
         with open('/proc/meminfo') as f:
             for line in f.readlines():
                 if line and line.startswith('MemTotal'):
-                    mem_total_kb = int(line.split()[1])
-                    break
+                    return int(line.split()[1])
+        return None
+
+    def read_peaks(self):
+        """Return {docker_id: peak kB} for last peaks_window seconds
+        from docker_memory_watcher.py state file"""
+        if not self.peaks_file:
+            return {}
+        try:
+            with open(self.peaks_file) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        since = time.time() - self.peaks_window
+        # ignore state of watcher, which is not running anymore
+        if state.get('time', 0) < since:
+            return {}
+        peaks = {}
+        for docker_id, buckets in state.get('containers', {}).items():
+            recent = [peak for start, peak in buckets
+                      if start + state['bucket'] > since]
+            if recent:
+                peaks[docker_id] = max(recent)
+        return peaks
 
-        if mem_limit_kb > mem_total_kb:
+    def evaluate(self, mem_used_kb, mem_limit_kb, mem_total_kb):
+        """Evaluate container memory, return (code, message, perfdata)"""
+        if mem_limit_kb is None or mem_limit_kb > mem_total_kb:
             mem_limit_kb = mem_total_kb
         mem_free_kb = mem_limit_kb - mem_used_kb
 
@@ -100,26 +402,101 @@ class CheckDockerMemory:
                                                                       mem_free_kb)
         if self.check_kind == 'used':
             mem_used_percent = mem_used_kb * (100 / mem_limit_kb)
-            message = '%5.3f%% (%d kB) used!' % (mem_used_percent, mem_used_kb) + perfdata
+            message = '%5.3f%% (%d kB) used!' % (mem_used_percent, mem_used_kb)
             if mem_used_percent > self.crit_level:
-                self.critical(message)
+                return 2, message, perfdata
             if mem_used_percent > self.warn_level:
-                self.warn(message)
-            self.ok(message)
-
-        elif self.check_kind == 'free':
+                return 1, message, perfdata
+        else:
             mem_free_percent = mem_free_kb * (100 / mem_limit_kb)
-            message = '%5.3f%% (%d kB) free!' % (mem_free_percent, mem_free_kb) + perfdata
+            message = '%5.3f%% (%d kB) free!' % (mem_free_percent, mem_free_kb)
             if mem_free_percent < self.crit_level:
-                self.critical(message)
+                return 2, message, perfdata
             if mem_free_percent < self.warn_level:
-                self.warn(message)
-            self.ok(message)
+                return 1, message, perfdata
+        return 0, message, perfdata
+
+    def report(self, code, message):
+        """Print message with Nagios status for code and exit"""
+        (self.ok, self.warn, self.critical, self.unknown)[code](message)
+
+    def sweep(self):
+        """Check memory of all running containers in one pass"""
+        cgroups = self.find_cgroups()
+        if not cgroups:
+            self.unknown("No docker containers cgroups found in %s" %
+                         self.cgroup_root)
+        try:
+            index = self.load_index()
+            names = dict((v, k) for k, v in index['names'].items())
+        except (IOError, OSError):
+            index = {'complete': False}
+            names = {}
+        if not index['complete']:
+            try:
+                api_names = self.api_names()
+                api_names.update(names)
+                names = api_names
+            except (IOError, OSError, ValueError, httplib.HTTPException):
+                pass
+        mem_total_kb = self.read_mem_total()
+        peaks = self.read_peaks()
+
+        results = []
+        for docker_id, (path, version) in cgroups.items():
+            name = names.get(docker_id, docker_id[:12])
+            try:
+                used, limit, cache = self.read_cgroup_memory(path, version)
+            except (IOError, OSError, ValueError):
+                # container stopped while we were walking the tree
+                continue
+            peak = max(used, peaks.get(docker_id, 0))
+            code, message, perfdata = self.evaluate(peak, limit, mem_total_kb)
+            perfdata += ' CACHE=%dKB;;;;' % cache
+            results.append((code, name, message, perfdata))
+
+        if not results:
+            self.unknown("No running docker containers found")
+        worst = max(result[0] for result in results)
+        bad_count = len([result for result in results if result[0]])
+        perfdata = []
+        lines = []
+        for code, name, message, perf in sorted(results,
+                                                key=lambda r: (-r[0], r[1])):
+            lines.append('%s: %s: %s' % (STATUS_NAMES[code], name, message))
+            for item in perf.split(' | ')[1].split():
+                perfdata.append('%s_%s' % (name, item))
+        summary = '%s of %s containers in bad state | %s' % (
+            bad_count, len(results), ' '.join(perfdata))
+        self.report(worst, summary + '\n' + '\n'.join(lines))
+
+    def run(self):
+        """Main class function"""
+        if self.docker_name is None:
+            self.sweep()
+        docker_id = self.resolve_docker_id()
+        # metadata also lists stopped containers, which have no cgroup
+        cgroup = self.find_cgroups().get(docker_id)
+        if not docker_id or not cgroup:
+            self.critical("No container %s found." % self.docker_name)
+        mem_used_kb, mem_limit_kb, _ = self.read_cgroup_memory(*cgroup)
+        mem_total_kb = self.read_mem_total()
+        if self.peaks_file:
+            # report peak since last check instead of current usage
+            mem_used_kb = max(mem_used_kb,
+                              self.read_peaks().get(docker_id, 0))
+
+        code, message, perfdata = self.evaluate(mem_used_kb, mem_limit_kb,
+                                                mem_total_kb)
+        self.report(code, message + perfdata)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Check Docker container memory')
-    parser.add_argument('-n', dest='name', required=True, help='Docker container name')
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument('-n', dest='name', help='Docker container name')
+    targets.add_argument('-a', dest='all', action='store_true',
+                         help='Check all running containers at once')
     parser.add_argument('-w', dest='warn', type=int, required=True,
                         help='Percent free/used when to warn')
     parser.add_argument('-c', dest='crit', type=int, required=True,
@@ -127,10 +504,31 @@ if __name__ == "__main__":
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-f', dest='kind', action='store_false', help='Check FREE memory')
     group.add_argument('-u', dest='kind', action='store_true', help='Check USED memory')
+    parser.add_argument('-D', dest='containers_dir',
+                        default='/var/lib/docker/containers',
+                        help='Docker containers metadata directory')
+    parser.add_argument('-i', dest='index_file',
+                        default=INDEX_FILE,
+                        help='File to cache container names index in '
+                             '(default: %(default)s)')
+    parser.add_argument('-g', dest='cgroup_root', default='/sys/fs/cgroup',
+                        help='Cgroup filesystem mount point')
+    parser.add_argument('-s', dest='docker_socket',
+                        default='/var/run/docker.sock',
+                        help='Docker Engine API unix socket')
+    parser.add_argument('-P', dest='peaks_file',
+                        help='Check peak usage recorded by '
+                             'docker_memory_watcher.py in this state file')
+    parser.add_argument('-W', dest='peaks_window', type=int, default=300,
+                        help='Seconds to look for peak usage in, '
+                             'usually check interval (default: 300)')
     args = parser.parse_args()
     if args.kind:
         check_kind = 'used'
     else:
         check_kind = 'free'
-    module = CheckDockerMemory(args.name, args.warn, args.crit, check_kind)
+    module = CheckDockerMemory(args.name, args.warn, args.crit, check_kind,
+                               args.containers_dir, args.index_file,
+                               args.cgroup_root, args.docker_socket,
+                               args.peaks_file, args.peaks_window)
     module.run()
@@ -7,37 +7,39 @@
 #
 # hpacucli requires root permissions.
 #
-# Create a file named /etc/sudoers.d/hpacucli with this line inside :
+# Create a file named /etc/sudoers.d/hpacucli with these lines inside :
 # username ALL=(ALL) NOPASSWD: /usr/sbin/hpacucli
+# Defaults:username user_command_timeouts
+# The second one lets sudo kill hung command on timeout (sudo 1.8.20+).
 #
 # You can get Debian/Ubuntu hpacucli packages here - http://hwraid.le-vert.net/
 #
+# Controllers state is read from hpacucli_snapshot.py cache shared with
+# zabbix smartarray collectors, single hpacucli ctrl all show config
+# runs at most once per cache TTL.
+#
 # Copyright 2014 Alexander Bulimov <lazywolf0@gmail.com>
 #
 # Released under the MIT license, see LICENSE for details.
 
-import subprocess
 import sys
-import re
 import os
+import argparse
+
+import hpacucli_snapshot
 
 
 class CheckSmartArrayStatus:
-    def __init__(self):
+    def __init__(self, cache_file, cache_ttl, timeout):
         self.name = 'CheckSmartArrayStatus'
         self.good_disks = []
         self.bad_disks = []
-        self.controllers = []
+        self.cache_file = cache_file
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
         self.binary = 'hpacucli'
         if os.getuid() != 0:
-            self.binary = 'sudo -n -k ' + self.binary
-
-    def execute(self, cmd):
-        # returns (rc, stdout, stderr) from shell command
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True)
-        stdout, stderr = process.communicate()
-        return (process.returncode, stdout, stderr)
+            self.binary = 'sudo -n ' + self.binary
 
     def ok(self, message):
         print("%s OK: %s" % (self.name, message))
@@ -55,42 +57,23 @@ class CheckSmartArrayStatus:
         print("%s UNKNOWN: %s" % (self.name, message))
         sys.exit(3)
 
-    def parse_controllers(self, data):
-        for line in data.splitlines():
-            if line:
-                res = re.search(r'Slot\s+([0-9]+)', line)
-                if res:
-                    self.controllers.append(res.group(1))
-
-    def parse_disks(self, data, controller):
-        for line in data.splitlines():
-            if line:
-                splitted = line.split()
-                if re.match(r'^physicaldrive$', splitted[0]):
-                    status = splitted[-1]
-                    disk = 'ctrl ' + controller + ' ' + line.strip()
-                    if status == 'OK':
-                        self.good_disks.append(disk)
-                    else:
-                        self.bad_disks.append(disk)
+    def parse_snapshot(self, snapshot):
+        for controller, _, drive, info in \
+                hpacucli_snapshot.iter_physical(snapshot):
+            disk = 'ctrl %s physicaldrive %s (%s, %s): %s' % (
+                controller, drive, info['port'], info['size'], info['status'])
+            if info['status'] == 'OK':
+                self.good_disks.append(disk)
+            else:
+                self.bad_disks.append(disk)
 
     def run(self):
-        rc, raw_data, err = self.execute(
-            "%s ctrl all show status" % self.binary
-        )
-        if rc != 0:
-            error = raw_data + ' ' + err
-            self.unknown("hpacucli command failed with %s " % error)
-        self.parse_controllers(raw_data)
-
-        for controller in self.controllers:
-            rc, raw_data, err = self.execute(
-                "%s ctrl slot=%s pd all show status" %
-                (self.binary, controller))
-            if rc != 0:
-                error = raw_data + ' ' + err
-                self.unknown("hpacucli command failed with %s " % error)
-            self.parse_disks(raw_data, controller)
+        try:
+            snapshot = hpacucli_snapshot.get_snapshot(
+                self.binary, self.cache_file, self.cache_ttl, self.timeout)
+        except hpacucli_snapshot.SnapshotError as e:
+            self.unknown(e)
+        self.parse_snapshot(snapshot)
 
         if self.bad_disks:
             data = ', '.join(self.bad_disks)
@@ -104,5 +87,21 @@ class CheckSmartArrayStatus:
             self.ok("All %s found disks are OK" % data)
 
 if __name__ == "__main__":
-    module = CheckSmartArrayStatus()
+    parser = argparse.ArgumentParser(
+        description='Check HP SmartArray RAID disks status')
+    parser.add_argument('-f', dest='cache_file',
+                        default=hpacucli_snapshot.cache_file,
+                        help='Shared hpacucli snapshot cache file '
+                             '(default: %s)' % hpacucli_snapshot.cache_file)
+    parser.add_argument('-t', dest='cache_ttl', type=int,
+                        default=hpacucli_snapshot.cache_ttl,
+                        help='Snapshot cache TTL in seconds '
+                             '(default: %d)' % hpacucli_snapshot.cache_ttl)
+    parser.add_argument('-T', dest='timeout', type=int,
+                        default=hpacucli_snapshot.call_timeout,
+                        help='Timeout for hpacucli call in seconds '
+                             '(default: %d)' % hpacucli_snapshot.call_timeout)
+    args = parser.parse_args()
+    module = CheckSmartArrayStatus(args.cache_file, args.cache_ttl,
+                                   args.timeout)
     module.run()
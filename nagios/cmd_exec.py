@@ -0,0 +1 @@
+../zabbix/data_collectors/cmd_exec.py
\ No newline at end of file
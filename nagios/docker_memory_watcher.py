@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+#
+# Docker containers memory watcher
+# ===
+#
+# Resident daemon, which subscribes to cgroup memory notifications
+# of all running docker containers and records peak memory usage
+# into a compact state file, so check_docker_memory.py -P
+# can report short spikes between checks without polling.
+#
+# On cgroup v1 eventfd thresholds are registered through
+# cgroup.event_control for memory.usage_in_bytes and memory.oom_control,
+# on cgroup v2 memory.events changes and memory.pressure (PSI) triggers
+# are watched. Containers are also sampled every -i seconds, and on
+# cgroup v2 kernel-tracked memory.peak is read and reset through one
+# file descriptor kept open per container, as resets only apply to reads
+# through the same descriptor (kernel 6.12+). Global cgroup v1
+# memory.max_usage_in_bytes is shared with other tools, so it is not
+# reset and only sampled values are used there.
+#
+# Only peaks of last -W seconds, the window of check_docker_memory.py -W,
+# are kept in state file, so it stays small with many containers.
+#
+# Registering notifications requires root permissions.
+#
+# Uses container discovery from check_docker_memory.py, which must be
+# installed in the same directory.
+#
+# Copyright 2015 Alexander Bulimov <lazywolf0@gmail.com>
+#
+# Released under the MIT license, see LICENSE for details.
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import print_function
+import os
+import sys
+import time
+import math
+import json
+import errno
+import select
+import ctypes
+import tempfile
+import argparse
+
+from check_docker_memory import CheckDockerMemory
+
+# usage thresholds in percent of limit to get notified at on cgroup v1
+THRESHOLDS = (50, 60, 70, 80, 85, 90, 95, 98)
+# PSI trigger: notify when tasks stall on memory for 100ms within 1s
+PSI_TRIGGER = b'some 100000 1000000'
+EFD_CLOEXEC = 0o2000000
+
+
+def eventfd():
+    """Create new eventfd file descriptor"""
+    if hasattr(os, 'eventfd'):
+        return os.eventfd(0, os.EFD_CLOEXEC)
+    libc = ctypes.CDLL(None, use_errno=True)
+    fd = libc.eventfd(0, EFD_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return fd
+
+
+class ContainerWatch:
+    """Memory notifications and sampling for one container cgroup"""
+    def __init__(self, check, docker_id, path, version):
+        self.check = check
+        self.docker_id = docker_id
+        self.path = path
+        self.version = version
+        self.fds = []
+        # fds of kernfs files, which must be re-read to re-arm poll
+        self.rearm_fds = []
+        self.peak_file = os.path.join(path, 'memory.peak')
+        self.peak_fd = None
+        self.peak_resettable = version == 2
+
+    def register(self, epoll, mem_total_kb):
+        """Subscribe to memory notifications, return registered fds"""
+        if self.version == 2:
+            self.register_v2(epoll)
+        else:
+            self.register_v1(epoll, mem_total_kb)
+        return self.fds
+
+    def register_v1(self, epoll, mem_total_kb):
+        _, limit_kb, _ = self.check.read_cgroup_memory(self.path, 1)
+        if limit_kb is None or limit_kb > mem_total_kb:
+            limit_kb = mem_total_kb
+        efd = eventfd()
+        self.fds.append(efd)
+        control = os.path.join(self.path, 'cgroup.event_control')
+        usage_fd = os.open(os.path.join(self.path, 'memory.usage_in_bytes'),
+                           os.O_RDONLY)
+        oom_fd = os.open(os.path.join(self.path, 'memory.oom_control'),
+                         os.O_RDONLY)
+        self.fds.extend([usage_fd, oom_fd])
+        with open(control, 'w') as f:
+            for percent in THRESHOLDS:
+                threshold = int(limit_kb * 1024 * percent / 100)
+                f.write('%d %d %d' % (efd, usage_fd, threshold))
+                f.flush()
+            f.write('%d %d' % (efd, oom_fd))
+        epoll.register(efd, select.EPOLLIN)
+
+    def register_v2(self, epoll):
+        events_fd = os.open(os.path.join(self.path, 'memory.events'),
+                            os.O_RDONLY)
+        self.fds.append(events_fd)
+        self.rearm_fds.append(events_fd)
+        os.read(events_fd, 4096)
+        epoll.register(events_fd, select.EPOLLPRI)
+        try:
+            pressure_fd = os.open(os.path.join(self.path, 'memory.pressure'),
+                                  os.O_RDWR | os.O_NONBLOCK)
+        except OSError:
+            return
+        try:
+            os.write(pressure_fd, PSI_TRIGGER + b'\0')
+        except OSError:
+            os.close(pressure_fd)
+            return
+        self.fds.append(pressure_fd)
+        epoll.register(pressure_fd, select.EPOLLPRI)
+
+    def acknowledge(self, fd):
+        """Consume notification on fd, so it can fire again"""
+        try:
+            if fd in self.rearm_fds:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.read(fd, 4096)
+            elif self.version == 1 and fd == self.fds[0]:
+                os.read(fd, 8)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def open_peak(self):
+        """Open memory.peak and reset its peak for this descriptor,
+        return fd or None if kernel does not support resets"""
+        try:
+            fd = os.open(self.peak_file, os.O_RDWR)
+        except OSError:
+            return None
+        try:
+            os.write(fd, b'0')
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def sample(self):
+        """Return peak memory usage in kB since last sample"""
+        used_kb, _, _ = self.check.read_cgroup_memory(self.path, self.version)
+        if self.peak_resettable and self.peak_fd is None:
+            self.peak_fd = self.open_peak()
+            self.peak_resettable = self.peak_fd is not None
+        if self.peak_fd is not None:
+            try:
+                os.lseek(self.peak_fd, 0, os.SEEK_SET)
+                peak_kb = int(os.read(self.peak_fd, 64)) / 1024
+                # reset peak of our fd, so next sample covers new period only
+                os.write(self.peak_fd, b'0')
+                used_kb = max(used_kb, peak_kb)
+            except (OSError, ValueError):
+                os.close(self.peak_fd)
+                self.peak_fd = None
+                self.peak_resettable = False
+        return used_kb
+
+    def close(self, epoll):
+        if self.peak_fd is not None:
+            os.close(self.peak_fd)
+            self.peak_fd = None
+        for fd in self.fds:
+            try:
+                epoll.unregister(fd)
+            except (IOError, OSError, ValueError):
+                pass
+            os.close(fd)
+        self.fds = []
+
+
+class MemoryWatcher:
+    """Track memory usage peaks of all running docker containers"""
+    def __init__(self, check, state_file, bucket=10, window=300,
+                 interval=10, rescan=30):
+        self.check = check
+        self.state_file = state_file
+        self.bucket = bucket
+        # buckets covering window, plus the one being filled
+        self.keep = int(math.ceil(window / bucket)) + 1
+        self.interval = interval
+        self.rescan_interval = rescan
+        self.epoll = select.epoll()
+        self.watches = {}
+        self.fd_watches = {}
+        self.peaks = {}
+        self.dirty = False
+
+    def rescan(self):
+        """Start watching new containers and forget removed ones"""
+        cgroups = self.check.find_cgroups()
+        mem_total_kb = self.check.read_mem_total()
+        for docker_id in list(self.watches):
+            if docker_id not in cgroups:
+                watch = self.watches.pop(docker_id)
+                for fd in watch.fds:
+                    self.fd_watches.pop(fd, None)
+                watch.close(self.epoll)
+                self.peaks.pop(docker_id, None)
+                self.dirty = True
+        for docker_id, (path, version) in cgroups.items():
+            if docker_id in self.watches:
+                continue
+            watch = ContainerWatch(self.check, docker_id, path, version)
+            try:
+                fds = watch.register(self.epoll, mem_total_kb)
+            except (IOError, OSError) as e:
+                # we still sample containers we can not subscribe to
+                print("can not subscribe to %s notifications: %s" %
+                      (docker_id[:12], e), file=sys.stderr)
+                watch.close(self.epoll)
+                fds = []
+            self.watches[docker_id] = watch
+            for fd in fds:
+                self.fd_watches[fd] = watch
+            self.sample(watch)
+
+    def sample(self, watch):
+        """Record current usage of container into its peaks"""
+        try:
+            used_kb = watch.sample()
+        except (IOError, OSError, ValueError):
+            return
+        now = int(time.time())
+        start = now - now % self.bucket
+        peaks = self.peaks.setdefault(watch.docker_id, [])
+        if peaks and peaks[-1][0] == start:
+            if used_kb <= peaks[-1][1]:
+                return
+            peaks[-1][1] = used_kb
+        else:
+            peaks.append([start, used_kb])
+            del peaks[:-self.keep]
+        self.dirty = True
+
+    def save(self):
+        """Write peaks to state file atomically"""
+        state = {'time': time.time(), 'bucket': self.bucket,
+                 'containers': self.peaks}
+        directory = os.path.dirname(self.state_file) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, self.state_file)
+        self.dirty = False
+
+    def run(self):
+        next_rescan = 0
+        next_sample = 0
+        while True:
+            now = time.time()
+            if now >= next_rescan:
+                self.rescan()
+                next_rescan = now + self.rescan_interval
+            if now >= next_sample:
+                for watch in self.watches.values():
+                    self.sample(watch)
+                next_sample = now + self.interval
+            if self.dirty:
+                self.save()
+            timeout = max(min(next_rescan, next_sample) - time.time(), 0)
+            for fd, _ in self.epoll.poll(timeout):
+                watch = self.fd_watches.get(fd)
+                if watch is None:
+                    continue
+                watch.acknowledge(fd)
+                self.sample(watch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Watch Docker containers memory peaks')
+    parser.add_argument('-o', dest='state_file',
+                        default='/run/docker_memory_peaks.json',
+                        help='State file to record peaks into')
+    parser.add_argument('-b', dest='bucket', type=int, default=10,
+                        help='Seconds per peak bucket (default: 10)')
+    parser.add_argument('-W', dest='window', type=int, default=300,
+                        help='Seconds of peaks to keep, at least -W of '
+                             'check_docker_memory.py (default: 300)')
+    parser.add_argument('-i', dest='interval', type=int, default=10,
+                        help='Seconds between safety samples (default: 10)')
+    parser.add_argument('-r', dest='rescan', type=int, default=30,
+                        help='Seconds between containers rescans '
+                             '(default: 30)')
+    parser.add_argument('-g', dest='cgroup_root', default='/sys/fs/cgroup',
+                        help='Cgroup filesystem mount point')
+    args = parser.parse_args()
+    check = CheckDockerMemory(None, 0, 0, 'used', cgroup_root=args.cgroup_root)
+    watcher = MemoryWatcher(check, args.state_file, args.bucket, args.window,
+                            args.interval, args.rescan)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1 @@
+../zabbix/data_collectors/hpacucli_snapshot.py
\ No newline at end of file
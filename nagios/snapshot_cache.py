@@ -0,0 +1 @@
+../zabbix/data_collectors/snapshot_cache.py
\ No newline at end of file
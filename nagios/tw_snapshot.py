@@ -0,0 +1 @@
+../zabbix/data_collectors/tw_snapshot.py
\ No newline at end of file
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Shared command execution for checks and collectors.
+# Commands are spawned from argv lists without /bin/sh, with
+# posix_spawn where available, in their own process group, which is
+# killed as a whole when command does not finish in timeout.
+# Commands run with sudo can not be killed by us, so sudo is asked
+# to kill them itself with -T, which must be allowed in sudoers
+# (sudo 1.8.20+):
+#   Defaults:username user_command_timeouts
+# Command which still can not be killed is abandoned after kill_grace
+# seconds, so caller never hangs on it.
+# Large outputs can be consumed line by line with stream() instead of
+# being read whole with run().
+#
+# When EXEC_METRICS_LOG environment variable (or metrics_log attribute)
+# is set, every command is recorded there as JSON line with its
+# argv, exit status, spawn and wall time, and summary can be printed with:
+#   cmd_exec.py <metrics_log>
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+from __future__ import division
+import os
+import sys
+import json
+import time
+import errno
+import math
+import signal
+import select
+import subprocess
+
+metrics_log = os.environ.get('EXEC_METRICS_LOG')
+# seconds to wait for killed command to exit before abandoning it
+kill_grace = 1
+
+
+class ExecTimeout(Exception):
+    pass
+
+
+class ExecError(Exception):
+    """Streamed command exited with non-zero code"""
+
+    def __init__(self, argv, rc, stderr):
+        Exception.__init__(self, "'%s' failed with code %s: %s" %
+                           (' '.join(argv), rc, stderr.strip()))
+        self.rc = rc
+        self.stderr = stderr
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _kill_group(pid):
+    """Kill process group of pid, return OSError if it can not
+    be killed, like sudo running as root, or None"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            return e
+    return None
+
+
+def _sudo_timeout(argv, timeout):
+    """Return argv with sudo asked to kill command after timeout,
+    rounded down so sudo kills it before our kill_grace ends"""
+    if not timeout or os.path.basename(argv[0]) != 'sudo':
+        return argv
+    return argv[:1] + ['-T', str(max(int(math.floor(timeout)), 1))] + \
+        argv[1:]
+
+
+def _spawn(argv, stdout, stderr):
+    """Start argv in new process group with given stdout and stderr
+    descriptors and stdin from /dev/null, return (pid, popen),
+    popen is None when command was started with posix_spawn"""
+    if hasattr(os, 'posix_spawnp'):
+        file_actions = [
+            (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_DUP2, stdout, 1),
+            (os.POSIX_SPAWN_DUP2, stderr, 2),
+        ]
+        return os.posix_spawnp(argv[0], argv, os.environ,
+                               file_actions=file_actions,
+                               setpgroup=0), None
+    # pythons without posix_spawn, child must be reaped through popen,
+    # as subprocess reaps its children behind our back otherwise
+    with open(os.devnull) as devnull:
+        popen = subprocess.Popen(argv, stdin=devnull, stdout=stdout,
+                                 stderr=stderr, close_fds=True,
+                                 preexec_fn=os.setpgrp)
+    return popen.pid, popen
+
+
+class _Command(object):
+    """Command running with stdout and stderr pipes"""
+
+    def __init__(self, argv, timeout):
+        self.argv = argv
+        self.timeout = timeout
+        self.start = time.time()
+        self.deadline = self.start + timeout if timeout else None
+        self.pid = None
+        self.popen = None
+        self.rc = None
+        self.spawned = 0
+        self.expired = False
+        self.killed = False
+        self.kill_error = None
+        self.finished = False
+        self.errors = []
+        self.fds = []
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        try:
+            self.pid, self.popen = _spawn(_sudo_timeout(argv, timeout),
+                                          out_w, err_w)
+        except OSError as e:
+            os.close(out_r)
+            os.close(err_r)
+            # the same code shell would return for missing command
+            self.rc = 127
+            self.errors.append(('%s: %s\n' % (argv[0], e.strerror)).encode(
+                'utf-8'))
+            return
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+        self.spawned = time.time() - self.start
+        self.stdout_fd = out_r
+        self.fds = [out_r, err_r]
+
+    def chunks(self):
+        """Yield stdout chunks as they come, collecting stderr,
+        until command closes both or timeout expires"""
+        poller = select.poll()
+        for fd in self.fds:
+            poller.register(fd, select.POLLIN)
+        open_fds = set(self.fds)
+        while open_fds:
+            wait = None
+            if self.deadline is not None:
+                wait = max(self.deadline - time.time(), 0) * 1000
+            events = poller.poll(wait)
+            if self.deadline is not None and time.time() >= self.deadline:
+                self.expired = True
+                self.kill()
+                return
+            for fd, _ in events:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    poller.unregister(fd)
+                    open_fds.discard(fd)
+                elif fd == self.stdout_fd:
+                    yield chunk
+                else:
+                    self.errors.append(chunk)
+        self.finished = True
+
+    def finish(self):
+        """Reap command and record its metrics, return exit code,
+        raise ExecTimeout if it was killed on timeout"""
+        if self.pid is not None and self.rc is None:
+            if not self.finished and not self.killed:
+                # output was abandoned
+                self.kill()
+            for fd in self.fds:
+                os.close(fd)
+            self.fds = []
+            self.rc = self.wait()
+            record(self.argv, self.pid, self.rc, self.spawned,
+                   time.time() - self.start, self.expired)
+            if self.rc is None:
+                raise ExecTimeout("'%s' %s and can not be killed: %s" % (
+                    ' '.join(self.argv),
+                    "timed out after %ss" % self.timeout if self.expired
+                    else "was abandoned", self.kill_error))
+        elif self.pid is None:
+            record(self.argv, None, self.rc, 0, time.time() - self.start,
+                   False)
+        if self.expired:
+            raise ExecTimeout("'%s' timed out after %ss" %
+                              (' '.join(self.argv), self.timeout))
+        return self.rc
+
+    def kill(self):
+        self.killed = True
+        self.kill_error = _kill_group(self.pid)
+
+    def poll(self):
+        """Reap command if it exited, return its exit code or None"""
+        if self.popen is not None:
+            return self.popen.poll()
+        while True:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+                break
+            except OSError as e:
+                if e.errno != errno.EINTR:
+                    raise
+        if pid == 0:
+            return None
+        return _exit_code(status)
+
+    def wait(self):
+        """Reap command, killing it on timeout, return its exit code,
+        or None if it did not exit in kill_grace seconds after kill"""
+        if self.deadline is None and not self.killed:
+            if self.popen is not None:
+                return self.popen.wait()
+            while True:
+                try:
+                    _, status = os.waitpid(self.pid, 0)
+                    return _exit_code(status)
+                except OSError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+        # command may close its output and keep running, so it is
+        # waited for until deadline only
+        limit = time.time() + kill_grace if self.killed else self.deadline
+        delay = 0.001
+        while True:
+            rc = self.poll()
+            if rc is not None:
+                return rc
+            now = time.time()
+            if now >= limit:
+                if self.killed:
+                    return None
+                self.expired = True
+                self.kill()
+                limit = now + kill_grace
+            time.sleep(max(min(delay, limit - now), 0))
+            delay = min(delay * 2, 0.05)
+
+    def stderr(self):
+        return b''.join(self.errors).decode('utf-8', 'replace')
+
+
+def record(argv, pid, rc, spawned, wall, expired):
+    """Append command metrics to metrics log, if it is enabled"""
+    if not metrics_log:
+        return
+    line = json.dumps({
+        'time': round(time.time(), 3),
+        'caller': os.path.basename(sys.argv[0]),
+        'argv': argv,
+        'pid': pid,
+        'rc': rc,
+        'spawn': round(spawned, 6),
+        'wall': round(wall, 6),
+        'timeout': expired,
+    }) + '\n'
+    try:
+        # single O_APPEND write, so concurrent checks do not mix lines
+        fd = os.open(metrics_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o666)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+    except (IOError, OSError):
+        pass
+
+
+def run(argv, timeout=None):
+    """Run command from argv list, return (rc, stdout, stderr),
+    raise ExecTimeout if it does not finish in timeout seconds"""
+    command = _Command(list(argv), timeout)
+    stdout = b''.join(command.chunks())
+    rc = command.finish()
+    return (rc, stdout.decode('utf-8', 'replace'), command.stderr())
+
+
+def stream(argv, timeout=None):
+    """Run command from argv list, yield its stdout lines without
+    newlines as they are printed, so output is never held whole.
+    Raise ExecError if command exits with non-zero code and
+    ExecTimeout if it does not finish in timeout seconds"""
+    command = _Command(list(argv), timeout)
+    tail = b''
+    try:
+        for chunk in command.chunks():
+            lines = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                yield line.decode('utf-8', 'replace')
+        if tail:
+            yield tail.decode('utf-8', 'replace')
+    except GeneratorExit:
+        # consumer stopped reading, do not leave command behind
+        try:
+            command.finish()
+        except ExecTimeout:
+            pass
+        raise
+    rc = command.finish()
+    if rc != 0:
+        raise ExecError(command.argv, rc, command.stderr())
+
+
+def summary(path):
+    """Print per command count, spawn and wall time from metrics log"""
+    commands = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            # skip sudo and its flags to group by real command
+            argv = [a for a in entry['argv'] if a != 'sudo' and
+                    not a.startswith('-')]
+            name = ' '.join([os.path.basename(argv[0])] + argv[1:2])
+            stats = commands.setdefault(name, [0, 0.0, 0.0, 0, 0])
+            stats[0] += 1
+            stats[1] += entry['spawn']
+            stats[2] += entry['wall']
+            stats[3] += entry['rc'] != 0
+            stats[4] += entry['timeout']
+    print("%-30s %6s %10s %10s %10s %6s %8s" % (
+        'command', 'calls', 'spawn ms', 'wall ms', 'total s', 'failed',
+        'timeouts'))
+    for name, (calls, spawn, wall, failed, timeouts) in sorted(
+            commands.items(), key=lambda item: -item[1][2]):
+        print("%-30s %6d %10.2f %10.2f %10.2f %6d %8d" % (
+            name, calls, spawn / calls * 1000, wall / calls * 1000, wall,
+            failed, timeouts))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: %s metrics_log" % sys.argv[0])
+        sys.exit(1)
+    summary(sys.argv[1])
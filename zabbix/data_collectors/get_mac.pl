@@ -15,7 +15,9 @@ use strict;
 use Net::SNMP qw(snmp_dispatcher oid_lex_sort);
 
 my $show_vendor = 1;
-my $script = "/usr/share/zabbix/scripts/mac.sh";
+#don't forget that Zabbix don't set $PATH when running scripts
+my $python = "/usr/bin/python";
+my $script = "/usr/share/zabbix/scripts/oui.py";
 my $debug = 0;
 my $file_name = "/tmp/$ARGV[0]-getmac.tmp";
 my $interval = 90; #refresh rate
@@ -78,6 +80,23 @@ if($new == 1) {
                         printf("ERROR: %s\n\n", $session->error());
                 }
         }
+#=== Resolve vendors of all macs in single oui.py call ===
+        # macs oui.py could not resolve get empty vendor
+        my %vendor = map { $_ => "" } @tmp;
+        if ($show_vendor == 1 && @tmp) {
+                my @lines = `$python $script -b @tmp`;
+                if ($? == 0) {
+                        foreach (@lines) {
+                                chomp;
+                                # skip anything but "mac<TAB>vendor" lines
+                                if (/^([0-9a-f]{2}(?::[0-9a-f]{2}){5})\t(.*)$/ && exists $vendor{$1}) {
+                                        $vendor{$1} = $2;
+                                }
+                        }
+                }elsif ($debug == 1) {
+                        printf("ERROR: %s failed with code %d\n", $script, $? >> 8);
+                }
+        }
 #==========================================
 #=== Print the returned MAC ports ===
         $result;
@@ -91,7 +110,7 @@ if($new == 1) {
                         if($result->{$_} == $port) {
                                 $res = 1;
                 if( $show_vendor == 1) {
-                    $out = `/usr/share/zabbix/scripts/mac.sh -s $tmp[$i]`;
+                    $out = $vendor{$tmp[$i]};
                                     printf("%s(%s)", $tmp[$i], $out);
                 }else {
                     printf("%s", $tmp[$i]);
@@ -99,7 +118,7 @@ if($new == 1) {
                                 print ", ";
                         };
             if( $show_vendor == 1) {
-                $out = `/usr/share/zabbix/scripts/mac.sh -s $tmp[$i]`;
+                $out = $vendor{$tmp[$i]};
                             printf FH ("%s;%s(%s)\n", $result->{$_}, $tmp[$i], $out);
             }else {
                 printf FH ("%s;%s\n", $result->{$_}, $tmp[$i]);
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Shared snapshot of HP SmartArray RAID controllers state.
+# Runs single hpacucli ctrl all show config once per TTL and caches parsed
+# controller -> array -> logical/physical drives model in a file,
+# so smartarray_discovery.py, smartarray_status.py and
+# nagios check_smartarray.py share one slow hpacucli call.
+#
+# Caching is done by snapshot_cache.py, which must be installed
+# in the same directory.
+#
+# Can also be run directly to refresh the cache, for example from cron:
+#   hpacucli_snapshot.py [cache_file [ttl]]
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import sys
+import re
+import time
+
+import snapshot_cache
+
+binary_path = "/usr/sbin/hpacucli"
+cache_file = "/var/cache/raid-snapshot/hpacucli_snapshot.json"
+cache_ttl = 60
+# timeout for hpacucli call, its startup alone may take several seconds
+call_timeout = 20
+
+SnapshotError = snapshot_cache.SnapshotError
+
+SLOT_RE = re.compile(r'^(.*?)\s+in\s+Slot\s+([0-9]+)')
+ARRAY_RE = re.compile(r'^array\s+(\S+)')
+DRIVE_RE = re.compile(r'^\w+\s+(\S+)\s+\((.*)\)$')
+
+
+def _drive_fields(line):
+    # 'physicaldrive 1I:1:1 (port 1I:box 1:bay 1, SAS, 146 GB, OK)'
+    # returns ('1I:1:1', ['port 1I:box 1:bay 1', 'SAS', '146 GB', 'OK'])
+    res = DRIVE_RE.match(line)
+    if res is None:
+        return line.split()[1], []
+    return res.group(1), [f.strip() for f in res.group(2).split(',')]
+
+
+def parse_config(data):
+    """Parse hpacucli ctrl all show config output, return
+    {slot: {'model': model, 'arrays': {array: {'logicaldrives': {},
+    'physicaldrives': {}}}}}, unassigned drives go to 'unassigned' array"""
+    controllers = {}
+    controller = None
+    array = None
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        res = 'Slot' in line and SLOT_RE.match(line)
+        if res:
+            controller = {'model': res.group(1), 'arrays': {}}
+            controllers[res.group(2)] = controller
+            array = None
+            continue
+        if controller is None:
+            continue
+        res = ARRAY_RE.match(line)
+        if res or line == 'unassigned':
+            name = res.group(1) if res else 'unassigned'
+            array = {'logicaldrives': {}, 'physicaldrives': {}}
+            controller['arrays'][name] = array
+            continue
+        if array is None:
+            continue
+        if line.startswith('logicaldrive'):
+            number, fields = _drive_fields(line)
+            array['logicaldrives'][number] = {
+                'size': fields[0] if fields else '',
+                'raid': fields[1] if len(fields) > 1 else '',
+                'status': ', '.join(fields[2:]) or line.split()[-1]}
+        elif line.startswith('physicaldrive'):
+            drive, fields = _drive_fields(line)
+            # status may be followed by 'spare' or 'active spare'
+            array['physicaldrives'][drive] = {
+                'port': fields[0] if fields else '',
+                'type': fields[1] if len(fields) > 1 else '',
+                'size': fields[2] if len(fields) > 2 else '',
+                'status': fields[3] if len(fields) > 3 else line.split()[-1],
+                'spare': any('spare' in f for f in fields[4:])}
+        else:
+            # SEP, expanders and enclosures end array listing
+            array = None
+    return controllers
+
+
+def take_snapshot(binary=binary_path, timeout=call_timeout):
+    """Query all controllers with single hpacucli call, return snapshot"""
+    rc, raw_data, err = snapshot_cache.run(
+        binary, ['ctrl', 'all', 'show', 'config'], timeout)
+    if rc != 0:
+        raise SnapshotError("hpacucli command failed with %s %s" %
+                            (raw_data, err))
+    # all controllers are queried at once, so there are no partial errors
+    return {'time': time.time(), 'controllers': parse_config(raw_data),
+            'errors': {}}
+
+
+def get_snapshot(binary=binary_path, path=cache_file, ttl=cache_ttl,
+                 timeout=call_timeout):
+    """Return snapshot from cache, refreshing it if it is too old"""
+    return snapshot_cache.get_cached(path, ttl,
+                                     lambda: take_snapshot(binary, timeout))
+
+
+def iter_physical(snapshot):
+    """Yield (slot, array, drive, info) for all physical drives"""
+    for slot, controller in sorted(snapshot['controllers'].items()):
+        for name, array in sorted(controller['arrays'].items()):
+            for drive, info in sorted(array['physicaldrives'].items()):
+                yield slot, name, drive, info
+
+
+def iter_logical(snapshot):
+    """Yield (slot, array, number, info) for all logical drives"""
+    for slot, controller in sorted(snapshot['controllers'].items()):
+        for name, array in sorted(controller['arrays'].items()):
+            for number, info in sorted(array['logicaldrives'].items()):
+                yield slot, name, number, info
+
+
+def disk_statuses(snapshot):
+    """Return [(name, status)] for all physical drives,
+    name is in form slot:drive"""
+    return [(slot + ':' + drive, info['status'])
+            for slot, _, drive, info in iter_physical(snapshot)]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else cache_file
+    ttl = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    try:
+        get_snapshot(path=path, ttl=ttl)
+    except SnapshotError as e:
+        print(e)
+        sys.exit(1)
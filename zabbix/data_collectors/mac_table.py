@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This script is used to get a list of
+# mac addresses per port on switches, like get_mac.pl.
+# Forwarding table (BRIDGE-MIB dot1dTpFdbPort, indexed by MAC)
+# is walked with SNMPv2c GETBULK requests, and parsed port -> MACs
+# index is cached per switch for cache TTL, so all per-port items
+# of one switch share single walk:
+#
+#   UserParameter=mac.port[*],mac_table.py "$1" "$2"
+#   mac_table.py switch[:snmp_port] port
+#
+# Many switches are refreshed concurrently with bounded number of
+# workers with -r, for example from cron:
+#   mac_table.py -r [-j workers] switch [switch...]
+#
+# Vendors are resolved with oui.py, caching is done by snapshot_cache.py,
+# both must be installed in the same directory, caches are kept
+# in /var/cache/zabbix (-d).
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import sys
+import argparse
+
+import oui
+import snapshot_cache
+import snmp_client
+
+# one cache per switch, see cache_path
+cache_dir = "/var/cache/zabbix"
+# refresh rate of get_mac.pl
+cache_ttl = 90
+community = "public"
+# per request timeout and retries, so dead switch fails in 3 seconds
+snmp_timeout = 1.0
+snmp_retries = 2
+max_repetitions = 32
+max_workers = 8
+show_vendor = True
+
+FDB_PORT = snmp_client.parse_oid('1.3.6.1.2.1.17.4.3.1.2')
+
+SnapshotError = snapshot_cache.SnapshotError
+
+
+def parse_switch(switch):
+    """Return (host, port) of switch given as host or host:port"""
+    host, sep, port = switch.rpartition(':')
+    if sep and port.isdigit() and ':' not in host:
+        return host, int(port)
+    return switch, 161
+
+
+def cache_path(switch, directory=None):
+    return os.path.join(directory or cache_dir, "mac_table_%s.json" %
+                        switch.replace(':', '_').replace('/', '_'))
+
+
+def walk_fdb(switch, community=community):
+    """Return [(mac, bridge port)] of switch forwarding table"""
+    host, port = parse_switch(switch)
+    session = snmp_client.Session(host, port, community, snmp_timeout,
+                                  snmp_retries)
+    table = []
+    try:
+        for oid, tag, value in session.bulk_walk(FDB_PORT, max_repetitions):
+            mac = oid[len(FDB_PORT):]
+            if len(mac) == 6 and tag == snmp_client.INTEGER:
+                table.append((':'.join('%02x' % octet for octet in mac),
+                              value))
+    except snmp_client.SnmpError as e:
+        raise SnapshotError(str(e))
+    finally:
+        session.close()
+    return table
+
+
+def take_snapshot(switch, community=community):
+    """Return {'ports': {port: [[mac, vendor]]}} of switch,
+    vendor is None if it is not resolved"""
+    table = walk_fdb(switch, community)
+    index = None
+    if show_vendor:
+        try:
+            index = oui.open_index()
+        except oui.OuiError:
+            pass
+    ports = {}
+    for mac, port in table:
+        vendor = index.lookup(mac) if index is not None else None
+        ports.setdefault(str(port), []).append([mac, vendor])
+    return {'ports': ports}
+
+
+def get_snapshot(switch, path=None, ttl=cache_ttl, community=community):
+    """Return snapshot from cache, refreshing it if it is too old"""
+    return snapshot_cache.get_cached(path or cache_path(switch), ttl,
+                                     lambda: take_snapshot(switch, community))
+
+
+def refresh(switches, workers=max_workers, community=community,
+            directory=None):
+    """Walk switches concurrently and replace their caches,
+    return {switch: (snapshot, error)}"""
+    return snapshot_cache.run_parallel(
+        lambda switch: get_snapshot(switch, cache_path(switch, directory), 0,
+                                    community),
+        switches, workers)
+
+
+def format_port(snapshot, port):
+    """Return MACs on port like get_mac.pl printed them:
+    'mac(vendor), mac(vendor), ', or 'null' if there are none"""
+    entries = snapshot['ports'].get(str(port))
+    if not entries:
+        return "null"
+    return ''.join("%s(%s), " % (mac, vendor) if vendor else "%s, " % mac
+                   for mac, vendor in entries)
+
+
+def _fail(msg):
+    print(msg)
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='MAC addresses per switch port from shared cache')
+    parser.add_argument('args', nargs='+', metavar='switch',
+                        help='switch and port, or switches with -r')
+    parser.add_argument('-r', dest='refresh', action='store_true',
+                        help='Refresh caches of given switches')
+    parser.add_argument('-j', dest='workers', type=int, default=max_workers,
+                        help='Switches walked at once with -r '
+                             '(default: %(default)s)')
+    parser.add_argument('-C', dest='community', default=community,
+                        help='SNMP community (default: %(default)s)')
+    parser.add_argument('-d', dest='cache_dir', default=cache_dir,
+                        help='Cache directory (default: %(default)s)')
+    parser.add_argument('-t', dest='cache_ttl', type=int, default=cache_ttl,
+                        help='Cache TTL in seconds (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.refresh:
+        failed = False
+        results = refresh(args.args, args.workers, args.community,
+                          args.cache_dir)
+        for switch in args.args:
+            snapshot, error = results[switch]
+            if error is not None:
+                failed = True
+                print("%s: %s" % (switch, error))
+            else:
+                print("%s: %d MACs" % (switch, sum(
+                    len(entries) for entries in snapshot['ports'].values())))
+        if failed:
+            sys.exit(1)
+        return
+
+    if len(args.args) != 2:
+        parser.error("switch and port are required")
+    switch, port = args.args
+    try:
+        snapshot = get_snapshot(switch, cache_path(switch, args.cache_dir),
+                                args.cache_ttl, args.community)
+    except SnapshotError as e:
+        _fail(e)
+    print(format_port(snapshot, port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# MAC address vendor lookup in IEEE oui.txt.
+# oui.txt is compiled once into sorted binary index next to it
+# (oui.txt.idx), which is memory-mapped and searched with bisection,
+# so lookup does not read the whole multi-megabyte list.
+# Index is rebuilt automatically when oui.txt changes, for example
+# after update with -u. If directory of oui.txt is not writable, index
+# is kept in index_dir.
+#
+# Usage:
+#   oui.py [-s] mac            - print vendor of single mac, like mac.sh
+#   oui.py -b [mac...]         - print "mac<TAB>vendor" line for every mac
+#                                from arguments, or from stdin if none given
+#   oui.py -u                  - download fresh oui.txt and rebuild index
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import re
+import sys
+import mmap
+import struct
+import argparse
+import tempfile
+
+# don't forget that Zabbix don't set $PATH when running scripts
+oui_file = "/usr/share/zabbix/scripts/oui.txt"
+oui_url = "http://standards.ieee.org/develop/regauth/oui/oui.txt"
+download_timeout = 60
+# index location when directory of oui.txt is not writable
+index_dir = "/var/cache/zabbix"
+
+NO_INFO = "no info"
+
+# magic, entries count, oui.txt mtime and size the index was built from
+HEADER = struct.Struct('<4sIdQ')
+MAGIC = b'OUI1'
+ENTRY_RE = re.compile(br'^\s*([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})-'
+                      br'([0-9A-Fa-f]{2})\s+\(hex\)\s+(.*?)\s*$')
+HEX_RE = re.compile(r'[^0-9A-Fa-f]')
+
+
+class OuiError(Exception):
+    pass
+
+
+def parse_oui(f):
+    """Return {prefix int: vendor bytes} from oui.txt lines,
+    first entry wins for duplicate prefixes"""
+    vendors = {}
+    for line in f:
+        res = ENTRY_RE.match(line)
+        if res:
+            prefix = int(b''.join(res.group(1, 2, 3)), 16)
+            # the same spacing awk in mac.sh printed
+            vendors.setdefault(prefix, b' '.join(res.group(4).split()))
+    return vendors
+
+
+def build_index(vendors, mtime=0, size=0):
+    """Return index bytes: header, sorted uint32 prefixes,
+    count + 1 uint32 offsets of vendor names, then the names"""
+    prefixes = sorted(vendors)
+    offsets = [0]
+    for prefix in prefixes:
+        offsets.append(offsets[-1] + len(vendors[prefix]))
+    count = len(prefixes)
+    return b''.join([
+        HEADER.pack(MAGIC, count, mtime, size),
+        struct.pack('<%dI' % count, *prefixes),
+        struct.pack('<%dI' % (count + 1), *offsets),
+    ] + [vendors[prefix] for prefix in prefixes])
+
+
+class OuiIndex(object):
+    """Vendor lookup in index built by build_index, data may be
+    bytes or mmap"""
+
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise OuiError("index is truncated")
+        magic, self.count, self.mtime, self.size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise OuiError("index has wrong format")
+        self.data = data
+        self.prefixes = HEADER.size
+        self.offsets = self.prefixes + 4 * self.count
+        self.names = self.offsets + 4 * (self.count + 1)
+
+    def _prefix(self, i):
+        return struct.unpack_from('<I', self.data, self.prefixes + 4 * i)[0]
+
+    def vendor(self, prefix):
+        """Return vendor of 24-bit prefix, None if it is not registered"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._prefix(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count or self._prefix(lo) != prefix:
+            return None
+        start, end = struct.unpack_from('<II', self.data,
+                                        self.offsets + 4 * lo)
+        return self.data[self.names + start:self.names + end].decode(
+            'utf-8', 'replace')
+
+    def lookup(self, mac):
+        """Return vendor of mac in any usual notation, NO_INFO if
+        it is unknown"""
+        prefix = mac_prefix(mac)
+        vendor = None if prefix is None else self.vendor(prefix)
+        return vendor or NO_INFO
+
+
+def mac_prefix(mac):
+    """Return 24-bit OUI of mac like 00:1a:2b:.., 00-1A-2B, 001a.2b..
+    or just its first 6 hex digits, None if it is too short"""
+    digits = HEX_RE.sub('', mac)
+    if len(digits) < 6:
+        return None
+    return int(digits[:6], 16)
+
+
+def replace_file(path, data):
+    """Replace file with data atomically, return False if it is not
+    writable"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                        suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def index_paths(path, index_path=None):
+    """Return index locations of oui.txt, preferred first"""
+    if index_path:
+        return [index_path]
+    return [path + '.idx',
+            os.path.join(index_dir, os.path.basename(path) + '.idx')]
+
+
+def write_index(path, data, index_path=None):
+    """Write index of oui.txt to first writable location,
+    complain to stderr if there is none, as lookups get slow"""
+    paths = index_paths(path, index_path)
+    for target in paths:
+        if replace_file(target, data):
+            return
+    sys.stderr.write("can't write index of %s to %s, it is rebuilt "
+                     "on every call\n" % (path, ' or '.join(paths)))
+
+
+def compile_oui(path=None, index_path=None):
+    """Build index of oui.txt and write it, return index bytes,
+    which are usable even if index could not be written"""
+    path = path or oui_file
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            vendors = parse_oui(f)
+    except (IOError, OSError) as e:
+        raise OuiError("can't read %s: %s" % (path, e))
+    data = build_index(vendors, st.st_mtime, st.st_size)
+    write_index(path, data, index_path)
+    return data
+
+
+def open_index(path=None, index_path=None):
+    """Return OuiIndex of oui.txt, rebuilding index if it is missing
+    or was built from another version of oui.txt"""
+    path = path or oui_file
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise OuiError("can't read %s: %s" % (path, e))
+    for candidate in index_paths(path, index_path):
+        try:
+            with open(candidate, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index = OuiIndex(data)
+            if index.mtime == st.st_mtime and index.size == st.st_size:
+                return index
+        except (IOError, OSError, ValueError, OuiError):
+            pass
+    return OuiIndex(compile_oui(path, index_path))
+
+
+def update(path=None, url=None):
+    """Download fresh oui.txt over path and rebuild its index"""
+    # urllib takes longer to import than lookup itself
+    try:
+        from urllib.request import urlopen
+        from urllib.error import URLError
+    except ImportError:
+        from urllib2 import urlopen, URLError
+    path = path or oui_file
+    try:
+        response = urlopen(url or oui_url, timeout=download_timeout)
+        data = response.read()
+    except (URLError, IOError) as e:
+        raise OuiError("download error: %s" % e)
+    vendors = parse_oui(data.splitlines())
+    if not vendors:
+        raise OuiError("downloaded file has no OUI entries")
+    if not replace_file(path, data):
+        raise OuiError("can't write %s" % path)
+    st = os.stat(path)
+    write_index(path, build_index(vendors, st.st_mtime, st.st_size))
+
+
+def _fail(msg):
+    print(msg)
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='MAC address vendor lookup in IEEE oui.txt')
+    parser.add_argument('macs', nargs='*', metavar='mac')
+    parser.add_argument('-s', dest='silent', action='store_true',
+                        help='Print only vendor')
+    parser.add_argument('-b', dest='batch', action='store_true',
+                        help='Print "mac<TAB>vendor" for every mac from '
+                             'arguments or stdin')
+    parser.add_argument('-u', dest='update', action='store_true',
+                        help='Download fresh oui.txt and rebuild index')
+    parser.add_argument('-f', dest='oui_file', default=oui_file,
+                        help='oui.txt location (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.update:
+        print("Trying to download from %s" % oui_url)
+        try:
+            update(args.oui_file)
+        except OuiError as e:
+            _fail(e)
+        print("Success!")
+        return
+    if not args.batch and len(args.macs) != 1:
+        _fail("no mac specified, exiting!")
+
+    try:
+        index = open_index(args.oui_file)
+    except OuiError as e:
+        if args.silent:
+            sys.exit(1)
+        _fail("%s, download it with -u" % e)
+
+    if args.batch:
+        macs = args.macs or (line.strip() for line in sys.stdin)
+        for mac in macs:
+            if mac:
+                sys.stdout.write("%s\t%s\n" % (mac, index.lookup(mac)))
+        return
+    if not args.silent:
+        print("Searching for %s..." % args.macs[0])
+    # no newline, like mac.sh, get_mac.pl puts it in parentheses
+    sys.stdout.write(index.lookup(args.macs[0]))
+
+if __name__ == "__main__":
+    main()
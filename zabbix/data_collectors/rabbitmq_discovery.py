@@ -4,58 +4,195 @@
 # This script is used to get a list of
 # RabbitMQ vhosts and queues in JSON
 # to provide Zabbix low-level discovery
+# Queues of all vhosts are listed with single rabbitmqctl eval call
+# (falling back to list_queues per vhost if eval is not allowed),
+# or with paged management API requests with -a.
+# Queues are parsed and printed in small batches as they are read, so
+# memory use does not grow with number of queues.
 # License: MIT
 # Author: Alexander Bulimov, lazywolf0@gmail.com
 
-import subprocess
 import sys
 import json
+import base64
+import argparse
+try:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urlparse
+except ImportError:
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urlparse import urlparse
 
-def _run(cmd):
-    # returns (rc, stdout, stderr) from shell command
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE, shell=True)
-    stdout, stderr = process.communicate()
-    return (process.returncode, stdout, stderr)
-
-def parse_vhosts(data):
-    vhosts = []
-    for line in data.splitlines():
-        vhosts.append(line.strip())
-    return vhosts
-
-def parse_stat(data, vhost):
-    stat = []
-    for line in data.splitlines():
-        stat.append({
-            '{#RABBITMQ_VHOST_NAME}': vhost,
-            '{#RABBITMQ_QUEUE_NAME}': line.strip(),
-        })
-    return stat
+import cmd_exec
+
+# rabbitmqctl may hang on unreachable node, do not block agent forever
+call_timeout = 20
+
+# queues per management API request, API limit is 500
+page_size = 500
+
+# prints "vhost<TAB>queue" line for every queue in every vhost,
+# element 2 of queue record is its name in all RabbitMQ versions
+EVAL_QUEUES = ('[io:format("~ts\\t~ts~n", [V, N]) || '
+               '{resource, V, queue, N} <- '
+               '[element(2, Q) || Q <- rabbit_amqqueue:list()]], ok.')
+
+def _entry(vhost, queue):
+    return {
+        '{#RABBITMQ_VHOST_NAME}': vhost,
+        '{#RABBITMQ_QUEUE_NAME}': queue,
+    }
+
+def _stream(argv):
+    # yields stdout lines of command, fails on error or timeout
+    try:
+        for line in cmd_exec.stream(argv, call_timeout):
+            yield line
+    except (cmd_exec.ExecError, cmd_exec.ExecTimeout) as e:
+        _fail("rabbitmqctl command failed with %s "%e)
+
+def parse_vhosts(lines):
+    for line in lines:
+        yield line.strip()
+
+def parse_stat(lines, vhost):
+    for line in lines:
+        yield _entry(vhost, line.strip())
+
+def parse_queues(lines):
+    """Parse "vhost<TAB>queue" lines, yield LLD entries"""
+    for line in lines:
+        splitted = line.split('\t')
+        if len(splitted) == 2:
+            yield _entry(splitted[0], splitted[1].strip())
 
 def _fail(msg):
     print(msg)
     sys.exit(1)
 
 
-def main():
-    rc, raw_data, err = _run("rabbitmqctl -q list_vhosts name")
-    if rc != 0:
-        _fail("rabbitmqctl command failed with %s "%err)
-    vhosts = parse_vhosts(raw_data)
+def discover_cli():
+    entries = parse_queues(cmd_exec.stream(
+        ['rabbitmqctl', '-q', 'eval', EVAL_QUEUES], call_timeout))
+    try:
+        # eval failure is known before first queue is printed
+        first = next(entries)
+    except StopIteration:
+        return
+    except cmd_exec.ExecError:
+        first = None
+    except cmd_exec.ExecTimeout as e:
+        _fail(e)
+    if first is not None:
+        yield first
+        try:
+            for entry in entries:
+                yield entry
+        except (cmd_exec.ExecError, cmd_exec.ExecTimeout) as e:
+            _fail("rabbitmqctl command failed with %s "%e)
+        return
 
-    raw_stats = []
+    # eval may be forbidden, list queues vhost by vhost
+    vhosts = list(parse_vhosts(_stream(
+        ['rabbitmqctl', '-q', 'list_vhosts', 'name'])))
     for vhost_name in vhosts:
-        rc, raw_data, err = _run("rabbitmqctl -q list_queues -p %s name"%vhost_name)
-        if rc != 0:
-          _fail("rabbitmqctl command failed with %s "%err)
-        raw_stats = raw_stats + parse_stat(raw_data, vhost_name)
+        for entry in parse_stat(_stream(['rabbitmqctl', '-q', 'list_queues',
+                                         '-p', vhost_name, 'name']),
+                                vhost_name):
+            yield entry
 
-    data = {
-        'data': raw_stats
-    }
-    #print json.dumps(data,sort_keys=True, indent=4, separators=(',', ': '))
-    print json.dumps(data)
+
+def _api_get(connection, path, headers):
+    connection.request('GET', path, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise IOError("HTTP %s %s" % (response.status, response.reason))
+    return json.loads(body.decode('utf-8'))
+
+
+# errors of management API requests and responses
+API_ERRORS = (HTTPException, IOError, ValueError, KeyError)
+
+def api_queues(url, user, password, columns):
+    """Yield queue objects with columns from management API, page by
+    page over one connection, so only one page is held at a time,
+    raise one of API_ERRORS on failure"""
+    url = urlparse(url)
+    connection_class = HTTPConnection
+    if url.scheme == 'https':
+        connection_class = HTTPSConnection
+    credentials = ('%s:%s' % (user, password)).encode('utf-8')
+    headers = {'Authorization':
+               'Basic ' + base64.b64encode(credentials).decode('ascii')}
+    base = '%s/api/queues?columns=%s' % (url.path.rstrip('/'),
+                                         ','.join(columns))
+    connection = connection_class(url.netloc, timeout=call_timeout)
+    page = 1
+    try:
+        while True:
+            queues = _api_get(connection, '%s&page=%d&page_size=%d' % (
+                base, page, page_size), headers)
+            if isinstance(queues, list):
+                # API before 3.6 ignores paging and returns all queues
+                items, page_count = queues, page
+            else:
+                items, page_count = queues['items'], queues['page_count']
+            for queue in items:
+                yield queue
+            if page >= page_count:
+                break
+            page += 1
+    finally:
+        connection.close()
+
+
+def discover_api(url, user, password):
+    try:
+        for queue in api_queues(url, user, password, ['vhost', 'name']):
+            yield _entry(queue['vhost'], queue['name'])
+    except API_ERRORS as e:
+        _fail("management API request failed with %s "%e)
+
+
+def write_lld(entries, out, batch=1000):
+    """Write {"data": [...]} JSON by batches of entries, formatted
+    the same as json.dumps of whole document"""
+    # header goes out with first batch, so failure before it
+    # prints only error message
+    header = '{"data": ['
+    separator = header
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) == batch:
+            out.write(separator + json.dumps(chunk)[1:-1])
+            separator = ', '
+            chunk = []
+    if chunk:
+        out.write(separator + json.dumps(chunk)[1:-1])
+    elif separator == header:
+        out.write(header)
+    out.write(']}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='RabbitMQ queues low-level discovery')
+    parser.add_argument('-a', dest='api_url',
+                        help='Use management API at this url, '
+                             'like http://localhost:15672')
+    parser.add_argument('-u', dest='user', default='guest',
+                        help='Management API user (default: guest)')
+    parser.add_argument('-p', dest='password', default='guest',
+                        help='Management API password (default: guest)')
+    args = parser.parse_args()
+
+    if args.api_url:
+        entries = discover_api(args.api_url, args.user, args.password)
+    else:
+        entries = discover_cli()
+    write_lld(entries, sys.stdout)
 
 if __name__ == "__main__":
     main()
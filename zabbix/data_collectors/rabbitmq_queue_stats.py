@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This script is used to get metrics of RabbitMQ queues
+# discovered by rabbitmq_discovery.py for Zabbix items.
+# Metrics of all queues of all vhosts are fetched with single
+# rabbitmqctl eval call (falling back to list_queues per vhost
+# if eval is not allowed), or with paged management API requests
+# with -a, at most once per cache TTL, and cached in a file
+# keyed by vhost and queue, so every item is answered from the cache
+# without starting rabbitmqctl:
+#
+#   UserParameter=rabbitmq.queue[*],rabbitmq_queue_stats.py "$1" "$2" "$3"
+#   rabbitmq.queue[{#RABBITMQ_VHOST_NAME},{#RABBITMQ_QUEUE_NAME},messages]
+#
+# Can also be run with -r to refresh the cache, for example from cron.
+# Caching is done by snapshot_cache.py, which must be installed
+# in the same directory, cache is kept in /var/cache/zabbix (-d).
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import sys
+import argparse
+
+import cmd_exec
+import snapshot_cache
+import rabbitmq_discovery
+
+cache_dir = "/var/cache/zabbix"
+cache_ttl = 60
+# rabbitmqctl may hang on unreachable node, do not block agent forever
+call_timeout = 20
+
+METRICS = ['messages', 'messages_ready', 'messages_unacknowledged',
+           'consumers', 'memory']
+
+# prints "vhost<TAB>queue<TAB>metric..." line for every queue
+# in every vhost, metrics are in METRICS order
+EVAL_STATS = ('[io:format("~ts\\t~ts~s~n", [V, N, '
+              '[io_lib:format("\\t~w", [X]) || {_, X} <- tl(I)]]) || '
+              'V <- rabbit_vhost:list(), '
+              'I <- rabbit_amqqueue:info_all(V, [name, %s]), '
+              '{resource, _, queue, N} <- [proplists:get_value(name, I)]], '
+              'ok.' % ', '.join(METRICS))
+
+def parse_stats(lines, vhost=None):
+    """Parse "vhost<TAB>queue<TAB>metric..." lines, or "queue<TAB>metric..."
+    lines of given vhost, return {vhost: {queue: [metric...]}}"""
+    queues = {}
+    skip = 2 if vhost is None else 1
+    fields = len(METRICS) + skip
+    for line in lines:
+        splitted = line.split('\t')
+        if len(splitted) != fields:
+            continue
+        if vhost is None:
+            vhost_queues = queues.setdefault(splitted[0], {})
+        else:
+            vhost_queues = queues.setdefault(vhost, {})
+        try:
+            values = list(map(int, splitted[skip:]))
+        except ValueError:
+            # metrics of queues on down nodes are empty or atoms
+            values = [int(field) if field.isdigit() else None
+                      for field in splitted[skip:]]
+        vhost_queues[splitted[skip - 1]] = values
+    return queues
+
+def _stream(argv):
+    # yields stdout lines of command, raises SnapshotError on failure
+    try:
+        for line in cmd_exec.stream(argv, call_timeout):
+            yield line
+    except (cmd_exec.ExecError, cmd_exec.ExecTimeout) as e:
+        raise snapshot_cache.SnapshotError(
+            "rabbitmqctl command failed with %s" % e)
+
+def query_cli():
+    try:
+        return parse_stats(cmd_exec.stream(
+            ['rabbitmqctl', '-q', 'eval', EVAL_STATS], call_timeout))
+    except cmd_exec.ExecTimeout as e:
+        raise snapshot_cache.SnapshotError(str(e))
+    except cmd_exec.ExecError:
+        pass
+
+    # eval may be forbidden, list queues vhost by vhost
+    queues = {}
+    vhosts = rabbitmq_discovery.parse_vhosts(_stream(
+        ['rabbitmqctl', '-q', 'list_vhosts', 'name']))
+    for vhost in vhosts:
+        queues.update(parse_stats(_stream(
+            ['rabbitmqctl', '-q', 'list_queues', '-p', vhost, 'name'] +
+            METRICS), vhost))
+    return queues
+
+def query_api(url, user, password):
+    queues = {}
+    try:
+        for queue in rabbitmq_discovery.api_queues(
+                url, user, password, ['vhost', 'name'] + METRICS):
+            queues.setdefault(queue['vhost'], {})[queue['name']] = [
+                queue.get(metric) for metric in METRICS]
+    except rabbitmq_discovery.API_ERRORS as e:
+        raise snapshot_cache.SnapshotError(
+            "management API request failed with %s" % e)
+    return queues
+
+def cache_path(directory=None):
+    return os.path.join(directory or cache_dir, "rabbitmq_queue_stats.json")
+
+def take_snapshot(api_url=None, user='guest', password='guest'):
+    """Return {'metrics', 'queues'} of all queues,
+    snapshot time is added by cache"""
+    if api_url:
+        queues = query_api(api_url, user, password)
+    else:
+        queues = query_cli()
+    return {'metrics': METRICS, 'queues': queues}
+
+def get_snapshot(path=None, ttl=cache_ttl, api_url=None,
+                 user='guest', password='guest'):
+    """Return snapshot from cache, refreshing it if it is too old"""
+    return snapshot_cache.get_cached(
+        path or cache_path(), ttl,
+        lambda: take_snapshot(api_url, user, password))
+
+def lookup(snapshot, vhost, queue, metric):
+    """Return metric of queue from snapshot, None if it is unknown"""
+    values = snapshot['queues'].get(vhost, {}).get(queue)
+    if values is None or metric not in snapshot['metrics']:
+        return None
+    return values[snapshot['metrics'].index(metric)]
+
+def _fail(msg):
+    print(msg)
+    sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='RabbitMQ queue metrics from shared cache')
+    parser.add_argument('vhost', nargs='?')
+    parser.add_argument('queue', nargs='?')
+    parser.add_argument('metric', nargs='?', choices=METRICS)
+    parser.add_argument('-r', dest='refresh', action='store_true',
+                        help='Only refresh cache')
+    parser.add_argument('-a', dest='api_url',
+                        help='Use management API at this url, '
+                             'like http://localhost:15672')
+    parser.add_argument('-u', dest='user', default='guest',
+                        help='Management API user (default: guest)')
+    parser.add_argument('-p', dest='password', default='guest',
+                        help='Management API password (default: guest)')
+    parser.add_argument('-d', dest='cache_dir', default=cache_dir,
+                        help='Cache directory (default: %(default)s)')
+    parser.add_argument('-t', dest='cache_ttl', type=int, default=cache_ttl,
+                        help='Cache TTL in seconds (default: %(default)s)')
+    args = parser.parse_args()
+    if not args.refresh and args.metric is None:
+        parser.error("vhost, queue and metric are required")
+
+    try:
+        snapshot = get_snapshot(cache_path(args.cache_dir),
+                                0 if args.refresh else args.cache_ttl,
+                                args.api_url, args.user, args.password)
+    except snapshot_cache.SnapshotError as e:
+        _fail(e)
+    if args.refresh:
+        return
+
+    value = lookup(snapshot, args.vhost, args.queue, args.metric)
+    if value is None:
+        _fail("no %s of queue %s in vhost %s" % (args.metric, args.queue,
+                                                 args.vhost))
+    print(value)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This script collects statuses of all disks in 3ware and
+# HP SmartArray RAID controllers and pushes them together with
+# low-level discovery data to Zabbix in single trapper request,
+# so collection cost does not grow with number of disks.
+# Run it from cron or as single UserParameter instead of
+# per-disk 3ware_status.py/smartarray_status.py items.
+#
+# Pushed trapper items (item type must be "Zabbix trapper"):
+#   3ware.discovery               - LLD data with {#3WARE_DISK}
+#   3ware.status[{#3WARE_DISK}]   - disk status, like OK or DEGRADED
+#   smartarray.discovery          - LLD data with {#HP_DISK}
+#   smartarray.status[{#HP_DISK}] - disk status, like OK or Failed
+# Item prototypes created by discovery in the same push
+# get their values starting from the next run.
+#
+# Controllers state is read from shared tw_snapshot.py and
+# hpacucli_snapshot.py caches.
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import sys
+import json
+import socket
+import argparse
+
+import tw_snapshot
+import hpacucli_snapshot
+import zabbix_sender
+
+SOURCES = {
+    '3ware': (tw_snapshot, '{#3WARE_DISK}'),
+    'smartarray': (hpacucli_snapshot, '{#HP_DISK}'),
+}
+
+
+def collect(kinds, host):
+    """Return ((host, key, value) items, errors) for given controller kinds"""
+    items = []
+    errors = []
+    for kind in kinds:
+        module, macro = SOURCES[kind]
+        try:
+            snapshot = module.get_snapshot(module.binary_path,
+                                           module.cache_file,
+                                           module.cache_ttl)
+        except module.SnapshotError as e:
+            errors.append("%s: %s" % (kind, e))
+            continue
+        for controller, error in sorted(snapshot.get('errors', {}).items()):
+            errors.append("%s %s: %s" % (kind, controller, error))
+        disks = module.disk_statuses(snapshot)
+        lld = {'data': [{macro: name} for name, _ in disks]}
+        items.append((host, '%s.discovery' % kind, json.dumps(lld)))
+        for name, status in disks:
+            items.append((host, '%s.status[%s]' % (kind, name), status))
+    return items, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Push RAID disks statuses to Zabbix trapper')
+    parser.add_argument('-z', dest='server',
+                        help='Zabbix server or proxy to send data to')
+    parser.add_argument('-p', dest='port', type=int,
+                        help='Zabbix trapper port (default: 10051)')
+    parser.add_argument('-s', dest='host',
+                        help='Host name as registered in Zabbix '
+                             '(default: from config or hostname)')
+    parser.add_argument('-c', dest='config',
+                        default='/etc/zabbix/zabbix_agentd.conf',
+                        help='Agent config to take ServerActive and '
+                             'Hostname from (default: %(default)s)')
+    parser.add_argument('-t', dest='kinds', action='append',
+                        choices=sorted(SOURCES),
+                        help='Controllers kind, may be given multiple times '
+                             '(default: all with installed CLI tools)')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                        help='Print items instead of sending them')
+    args = parser.parse_args()
+
+    server = port = host = None
+    if os.path.exists(args.config):
+        server, port, host = zabbix_sender.read_agent_config(args.config)
+    server = args.server or server
+    port = args.port or port or 10051
+    host = args.host or host or socket.gethostname()
+    kinds = args.kinds or [kind for kind, (module, _) in
+                           sorted(SOURCES.items())
+                           if os.path.exists(module.binary_path)]
+    if not kinds:
+        print("no RAID controllers CLI tools found")
+        sys.exit(1)
+
+    items, errors = collect(kinds, host)
+    for error in errors:
+        sys.stderr.write(error + '\n')
+    if args.dry_run:
+        for item in items:
+            print("%s %s %s" % item)
+    elif items:
+        if server is None:
+            print("no Zabbix server given and no ServerActive in %s" %
+                  args.config)
+            sys.exit(1)
+        try:
+            result = zabbix_sender.send(server, port, items)
+        except zabbix_sender.SenderError as e:
+            print(e)
+            sys.exit(1)
+        print("processed: %(processed)d; failed: %(failed)d; "
+              "total: %(total)d" % result)
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
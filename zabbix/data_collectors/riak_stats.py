@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This script is used to get Riak node stats for Zabbix.
+# /stats is fetched as JSON at most once per cache TTL and cached
+# in a file, so any number of items is answered from one download:
+#
+#   UserParameter=riak.stat[*],riak_stats.py -a http://127.0.0.1:8098 "$1"
+#   riak_stats.py [-a url] key [key...]
+#
+# With --trapper all stats (or only given keys) are pushed to Zabbix
+# in single trapper request instead, as riak.stat[<key>] trapper items;
+# run it from cron with the same -z/-p/-s/-c options as raid_trapper.py.
+#
+# Caching is done by snapshot_cache.py, which must be installed
+# in the same directory, caches are kept in /var/cache/zabbix (-d).
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import sys
+import json
+import socket
+import argparse
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import URLError
+except ImportError:
+    from urllib2 import Request, urlopen, URLError
+
+import snapshot_cache
+import zabbix_sender
+
+riak_url = "http://127.0.0.1:8098"
+# one cache per Riak node, see cache_path
+cache_dir = "/var/cache/zabbix"
+cache_ttl = 60
+# Riak may stall on overloaded node, do not block agent forever
+call_timeout = 10
+
+SnapshotError = snapshot_cache.SnapshotError
+
+
+def fetch_stats(url, timeout=call_timeout):
+    """Return stats dict from Riak HTTP /stats endpoint"""
+    request = Request(url.rstrip('/') + '/stats',
+                      headers={'Accept': 'application/json'})
+    try:
+        response = urlopen(request, timeout=timeout)
+        stats = json.loads(response.read().decode('utf-8'))
+    except (URLError, IOError, ValueError) as e:
+        raise SnapshotError("Riak stats request failed with %s" % e)
+    if not isinstance(stats, dict):
+        raise SnapshotError("Riak stats are not JSON object")
+    return stats
+
+
+def cache_path(url, directory=None):
+    """Return cache file of Riak node at url"""
+    node = url.split('://', 1)[-1].strip('/').replace('/', '_')
+    return os.path.join(directory or cache_dir,
+                        "riak_stats_%s.json" % node.replace(':', '_'))
+
+
+def get_stats(url=riak_url, path=None, ttl=cache_ttl, timeout=call_timeout):
+    """Return stats from cache, refreshing them if they are too old"""
+    snapshot = snapshot_cache.get_cached(
+        path or cache_path(url), ttl,
+        lambda: {'stats': fetch_stats(url, timeout)})
+    return snapshot['stats']
+
+
+def format_value(value):
+    """Return stat as Zabbix item value, lists like ring_members
+    are returned as JSON"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+def trapper_items(stats, host, keys=None):
+    """Return (host, key, value) items of given or all stats"""
+    return [(host, 'riak.stat[%s]' % key, format_value(stats[key]))
+            for key in sorted(keys or stats) if key in stats]
+
+
+def _fail(msg):
+    print(msg)
+    sys.exit(1)
+
+
+def push(stats, args):
+    server = port = host = None
+    if os.path.exists(args.config):
+        server, port, host = zabbix_sender.read_agent_config(args.config)
+    server = args.server or server
+    port = args.port or port or 10051
+    host = args.host or host or socket.gethostname()
+    items = trapper_items(stats, host, args.keys)
+    if args.dry_run:
+        for item in items:
+            print("%s %s %s" % item)
+        return
+    if server is None:
+        _fail("no Zabbix server given and no ServerActive in %s" %
+              args.config)
+    try:
+        result = zabbix_sender.send(server, port, items)
+    except zabbix_sender.SenderError as e:
+        _fail(e)
+    print("processed: %(processed)d; failed: %(failed)d; "
+          "total: %(total)d" % result)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Riak node stats from shared cache')
+    parser.add_argument('keys', nargs='*', metavar='key',
+                        help='Stats to print or push, like node_gets')
+    parser.add_argument('-a', dest='url', default=riak_url,
+                        help='Riak HTTP interface url '
+                             '(default: %(default)s)')
+    parser.add_argument('-d', dest='cache_dir', default=cache_dir,
+                        help='Cache directory (default: %(default)s)')
+    parser.add_argument('-t', dest='cache_ttl', type=int, default=cache_ttl,
+                        help='Cache TTL in seconds (default: %(default)s)')
+    parser.add_argument('--trapper', dest='trapper', action='store_true',
+                        help='Push stats to Zabbix trapper')
+    parser.add_argument('-z', dest='server',
+                        help='Zabbix server or proxy to send data to')
+    parser.add_argument('-p', dest='port', type=int,
+                        help='Zabbix trapper port (default: 10051)')
+    parser.add_argument('-s', dest='host',
+                        help='Host name as registered in Zabbix '
+                             '(default: from config or hostname)')
+    parser.add_argument('-c', dest='config',
+                        default='/etc/zabbix/zabbix_agentd.conf',
+                        help='Agent config to take ServerActive and '
+                             'Hostname from (default: %(default)s)')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                        help='Print trapper items instead of sending them')
+    args = parser.parse_args()
+    if not args.trapper and not args.keys:
+        parser.error("at least one key is required without --trapper")
+
+    try:
+        stats = get_stats(args.url, cache_path(args.url, args.cache_dir),
+                          args.cache_ttl)
+    except SnapshotError as e:
+        _fail(e)
+
+    if args.trapper:
+        push(stats, args)
+        return
+    missing = [key for key in args.keys if key not in stats]
+    if missing:
+        _fail("no such stat %s" % ', '.join(missing))
+    for key in args.keys:
+        print(format_value(stats[key]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# TTL cache of RAID controllers snapshots shared between
+# zabbix collectors and nagios checks.
+#
+# Cache file is replaced atomically, refresh is serialized with flock
+# on cache_file.lock, so concurrent callers query controllers only once.
+# Callers wait for lock at most lock_timeout seconds, then get previous
+# snapshot, so hung refresh does not pile up agent pollers behind it.
+# Cache directory must be writable by all users running the scripts,
+# and nobody else, for example for nagios and zabbix users:
+#   groupadd monitoring; usermod -a -G monitoring nagios (and zabbix)
+#   install -d -m 2775 -g monitoring /var/cache/raid-snapshot
+# Cache files of other users are only trusted in directories not
+# writable by everybody, so nobody can plant fake statuses in /tmp.
+# Collectors run by zabbix user only keep their caches in
+# its own directory:
+#   install -d -o zabbix -g zabbix -m 755 /var/cache/zabbix
+#
+# Controller CLI calls are run by cmd_exec.py with timeout, which kills
+# the whole process group, and per-controller calls can be run on
+# a bounded thread pool, so one hung controller does not block the others.
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import json
+import errno
+import stat
+import time
+import shlex
+import fcntl
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import cmd_exec
+
+# seconds to wait for refresh by other process, Zabbix agent item Timeout
+lock_timeout = 3
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def run(binary, args, timeout=None):
+    """Run CLI tool with args, return (rc, stdout, stderr),
+    raise SnapshotError if it does not finish in timeout seconds,
+    binary may be prefixed with sudo, like 'sudo -n tw-cli'"""
+    try:
+        return cmd_exec.run(shlex.split(binary) + list(args), timeout)
+    except cmd_exec.ExecTimeout as e:
+        raise SnapshotError(str(e))
+
+
+def run_parallel(func, items, workers):
+    """Call func(item) for all items on thread pool of workers threads,
+    return {item: (result, error)}, error is SnapshotError message"""
+    def call(item):
+        try:
+            return item, func(item), None
+        except SnapshotError as e:
+            return item, None, str(e)
+
+    if not items:
+        return {}
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        results = pool.map(call, items)
+    finally:
+        pool.close()
+    return dict((item, (result, error)) for item, result, error in results)
+
+
+def trusted(st, path):
+    """Return True if cache file with stat st is written by us, root
+    or by users allowed to write to its directory"""
+    if st.st_uid in (os.getuid(), 0):
+        return True
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    try:
+        directory = os.stat(os.path.dirname(path) or '.')
+    except OSError:
+        return False
+    return not directory.st_mode & stat.S_IWOTH
+
+
+def read_cache(path, ttl):
+    """Return cached snapshot if it is younger than ttl"""
+    try:
+        with open(path) as f:
+            if not trusted(os.fstat(f.fileno()), path):
+                return None
+            snapshot = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if time.time() - snapshot.get('time', 0) > ttl:
+        return None
+    return snapshot
+
+
+def write_cache(path, snapshot):
+    """Replace cache file with snapshot atomically"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                        suffix='.tmp')
+    except (IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def lock(fd, timeout):
+    """Take exclusive flock on fd, return False if it is not free
+    in timeout seconds"""
+    deadline = time.time() + timeout
+    delay = 0.01
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except (IOError, OSError) as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EINTR):
+                raise
+        now = time.time()
+        if now >= deadline:
+            return False
+        time.sleep(min(delay, deadline - now))
+        delay = min(delay * 2, 0.1)
+
+
+def update_cached(path, ttl, update, timeout=None):
+    """Return snapshot from cache, replacing it with update(old_snapshot)
+    if it is too old, old_snapshot is None if there is no cache.
+    If other process refreshes cache for longer than timeout
+    (lock_timeout by default), old snapshot is returned,
+    or SnapshotError raised if there is none"""
+    snapshot = read_cache(path, ttl)
+    if snapshot is not None:
+        return snapshot
+    try:
+        # flock works on read-only fds, so lock files created by other
+        # users are usable whatever umask they had
+        lock_fd = os.open(path + '.lock', os.O_RDONLY | os.O_CREAT, 0o664)
+    except OSError:
+        return update(read_cache(path, float('inf')))
+    try:
+        if not lock(lock_fd, lock_timeout if timeout is None else timeout):
+            snapshot = read_cache(path, float('inf'))
+            if snapshot is None:
+                raise SnapshotError("%s is being refreshed by other process "
+                                    "for too long" % path)
+            return snapshot
+        # somebody could refresh cache while we were waiting for lock
+        snapshot = read_cache(path, ttl)
+        if snapshot is None:
+            snapshot = update(read_cache(path, float('inf')))
+            snapshot.setdefault('time', time.time())
+            write_cache(path, snapshot)
+        return snapshot
+    finally:
+        os.close(lock_fd)
+
+
+def get_cached(path, ttl, take_snapshot, timeout=None):
+    """Return snapshot from cache, refreshing it with take_snapshot()
+    if it is too old"""
+    return update_cached(path, ttl, lambda old: take_snapshot(), timeout)
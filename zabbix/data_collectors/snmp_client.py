@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Minimal SNMPv2c client (BER encoding, GET and GETBULK walk),
+# used by collectors to walk tables with few requests
+# without Net::SNMP or net-snmp tools installed.
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import random
+import socket
+import struct
+
+VERSION_2C = 1
+
+# universal and SNMP application types
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_ID = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIME_TICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+# varbind exceptions
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+# PDUs
+GET_REQUEST = 0xa0
+GET_NEXT_REQUEST = 0xa1
+RESPONSE = 0xa2
+SET_REQUEST = 0xa3
+GET_BULK_REQUEST = 0xa5
+
+EXCEPTIONS = (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)
+UNSIGNED = (COUNTER32, GAUGE32, TIME_TICKS, COUNTER64)
+
+
+class SnmpError(Exception):
+    pass
+
+
+def parse_oid(oid):
+    """Return OID tuple from dotted string like '1.3.6.1.2.1'"""
+    return tuple(int(part) for part in oid.strip('.').split('.'))
+
+
+def _length(size):
+    if size < 0x80:
+        return struct.pack('B', size)
+    octets = []
+    while size:
+        octets.insert(0, size & 0xff)
+        size >>= 8
+    return struct.pack('B', 0x80 | len(octets)) + bytes(bytearray(octets))
+
+
+def encode(tag, payload):
+    return struct.pack('B', tag) + _length(len(payload)) + payload
+
+
+def encode_int(value, tag=INTEGER):
+    octets = []
+    while True:
+        octets.insert(0, value & 0xff)
+        value >>= 8
+        # stop when remaining value is only the sign of last octet
+        if value in (0, -1) and (value < 0) == bool(octets[0] & 0x80):
+            break
+    return encode(tag, bytes(bytearray(octets)))
+
+
+def encode_oid(oid):
+    octets = [40 * oid[0] + oid[1]]
+    for part in oid[2:]:
+        encoded = [part & 0x7f]
+        part >>= 7
+        while part:
+            encoded.insert(0, 0x80 | (part & 0x7f))
+            part >>= 7
+        octets.extend(encoded)
+    return encode(OBJECT_ID, bytes(bytearray(octets)))
+
+
+def encode_value(tag, value):
+    """Encode varbind value of given type"""
+    if tag in (INTEGER,) + UNSIGNED:
+        return encode_int(value, tag)
+    if tag == OBJECT_ID:
+        return encode_oid(value)
+    if value is None:
+        return encode(tag, b'')
+    return encode(tag, value)
+
+
+def encode_message(community, pdu_type, request_id, varbinds,
+                   error_status=0, error_index=0):
+    """Return SNMPv2c message with PDU of (oid, tag, value) varbinds,
+    for GETBULK error_status and error_index are non-repeaters and
+    max-repetitions"""
+    binds = b''.join(encode(SEQUENCE, encode_oid(oid) +
+                            encode_value(tag, value))
+                     for oid, tag, value in varbinds)
+    pdu = encode(pdu_type, encode_int(request_id) +
+                 encode_int(error_status) + encode_int(error_index) +
+                 encode(SEQUENCE, binds))
+    return encode(SEQUENCE, encode_int(VERSION_2C) +
+                  encode(OCTET_STRING, community.encode('utf-8')) + pdu)
+
+
+def decode(data, pos=0):
+    """Decode BER element at pos, return (tag, value, next pos),
+    constructed values are lists of (tag, value)"""
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    if pos + 2 > len(data):
+        raise SnmpError("truncated BER element")
+    tag = data[pos]
+    size = data[pos + 1]
+    pos += 2
+    if size & 0x80:
+        count = size & 0x7f
+        size = 0
+        for octet in data[pos:pos + count]:
+            size = (size << 8) | octet
+        pos += count
+    end = pos + size
+    if end > len(data):
+        raise SnmpError("truncated BER element")
+    if tag & 0x20:
+        items = []
+        item_pos = pos
+        while item_pos < end:
+            item_tag, item, item_pos = decode(data, item_pos)
+            items.append((item_tag, item))
+        return tag, items, end
+    payload = data[pos:end]
+    if tag in (INTEGER,) + UNSIGNED:
+        value = 0
+        for octet in payload:
+            value = (value << 8) | octet
+        if tag == INTEGER and payload and payload[0] & 0x80:
+            value -= 1 << (8 * len(payload))
+        return tag, value, end
+    if tag == OBJECT_ID:
+        if not payload:
+            raise SnmpError("empty OID")
+        oid = list(divmod(payload[0], 40)) if payload[0] < 80 else \
+            [2, payload[0] - 80]
+        part = 0
+        for octet in payload[1:]:
+            part = (part << 7) | (octet & 0x7f)
+            if not octet & 0x80:
+                oid.append(part)
+                part = 0
+        return tag, tuple(oid), end
+    if tag == NULL or tag in EXCEPTIONS:
+        return tag, None, end
+    return tag, bytes(payload), end
+
+
+def decode_message(data):
+    """Return (community, pdu type, request id, error status,
+    error index, [(oid, tag, value)]) from SNMPv2c message"""
+    try:
+        tag, message, _ = decode(data)
+        if tag != SEQUENCE or len(message) != 3:
+            raise SnmpError("not SNMP message")
+        (_, version), (_, community), (pdu_type, pdu) = message
+        if version != VERSION_2C:
+            raise SnmpError("unsupported SNMP version %s" % version)
+        (_, request_id), (_, error_status), (_, error_index), \
+            (_, binds) = pdu
+        varbinds = []
+        for _, bind in binds:
+            (_, oid), (value_tag, value) = bind
+            varbinds.append((oid, value_tag, value))
+    except (ValueError, TypeError) as e:
+        raise SnmpError("malformed SNMP message: %s" % e)
+    return (community.decode('utf-8', 'replace'), pdu_type, request_id,
+            error_status, error_index, varbinds)
+
+
+class Session(object):
+    """SNMPv2c session with one agent, requests are retried on timeout"""
+
+    def __init__(self, host, port=161, community='public', timeout=1.0,
+                 retries=2):
+        self.address = (host, port)
+        self.community = community
+        self.timeout = timeout
+        self.retries = retries
+        self.request_id = random.randint(1, 0x7fffffff)
+        self.requests = 0
+        self.sock = None
+
+    def _socket(self):
+        if self.sock is None:
+            family, _, _, _, address = socket.getaddrinfo(
+                self.address[0], self.address[1], 0, socket.SOCK_DGRAM)[0]
+            self.sock = socket.socket(family, socket.SOCK_DGRAM)
+            self.sock.connect(address)
+        return self.sock
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def request(self, pdu_type, oids, error_status=0, error_index=0):
+        """Send request for oids, return response [(oid, tag, value)]"""
+        self.request_id = self.request_id % 0x7fffffff + 1
+        message = encode_message(self.community, pdu_type, self.request_id,
+                                 [(oid, NULL, None) for oid in oids],
+                                 error_status, error_index)
+        try:
+            sock = self._socket()
+            for _ in range(self.retries + 1):
+                self.requests += 1
+                sock.send(message)
+                sock.settimeout(self.timeout)
+                try:
+                    while True:
+                        response = decode_message(sock.recv(65535))
+                        # late answers to timed out requests are skipped
+                        if response[1] == RESPONSE and \
+                                response[2] == self.request_id:
+                            break
+                except socket.timeout:
+                    continue
+                if response[3]:
+                    raise SnmpError("agent %s:%d returned error %d" % (
+                        self.address + (response[3],)))
+                return response[5]
+        except socket.error as e:
+            raise SnmpError("request to %s:%d failed: %s" % (
+                self.address + (e,)))
+        raise SnmpError("no response from %s:%d in %ss" % (
+            self.address + (self.timeout * (self.retries + 1),)))
+
+    def get(self, oids):
+        return self.request(GET_REQUEST, oids)
+
+    def bulk_walk(self, root, max_repetitions=25):
+        """Yield (oid, tag, value) of subtree of root OID tuple,
+        fetching max_repetitions rows per GETBULK request"""
+        oid = root
+        size = len(root)
+        while True:
+            varbinds = self.request(GET_BULK_REQUEST, [oid], 0,
+                                    max_repetitions)
+            if not varbinds:
+                return
+            for next_oid, tag, value in varbinds:
+                if tag == END_OF_MIB_VIEW or next_oid[:size] != root:
+                    return
+                if next_oid <= oid:
+                    raise SnmpError("agent %s:%d returned OIDs out of "
+                                    "order" % self.address)
+                oid = next_oid
+                yield next_oid, tag, value
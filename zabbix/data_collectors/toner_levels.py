@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This script is used to get toner levels of printers for Zabbix,
+# like get_toner_*.pl. All printers from printers file are scraped
+# concurrently with short timeout, and printer -> toner levels table
+# is cached for cache TTL, so items are answered from the table:
+#
+#   UserParameter=toner.level[*],toner_levels.py "$1" "$2"
+#   toner_levels.py printer color
+#
+# Color is Cyan, Magenta, Yellow or Black, mono printers have only Black.
+# Unreachable printer keeps its last read levels marked as stale,
+# which is returned by 'stale' pseudo color (1 if levels are stale).
+# Table can be refreshed from cron, so items never wait for printers:
+#   toner_levels.py -r [-j workers]
+#
+# Printers file has 'printer model' lines, models are keys of MODELS:
+#   10.0.0.15 brother_9465
+#
+# Caching is done by snapshot_cache.py, which must be installed
+# in the same directory, cache is kept in /var/cache/zabbix (-d).
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import os
+import re
+import sys
+import time
+import argparse
+try:
+    from urllib.request import urlopen
+    from urllib.error import URLError
+except ImportError:
+    from urllib2 import urlopen, URLError
+
+import snapshot_cache
+
+printers_file = "/etc/zabbix/toner_printers.conf"
+cache_dir = "/var/cache/zabbix"
+# refresh rate of get_toner_*.pl
+cache_ttl = 90
+# powered off printer must not stall agent pollers
+http_timeout = 3
+max_workers = 8
+
+COLORS = ['Cyan', 'Magenta', 'Yellow', 'Black']
+
+SnapshotError = snapshot_cache.SnapshotError
+
+
+def _squares(line):
+    """Return toner level from Brother gauge of ten squares"""
+    return line.count('&#x25a0;') * 10
+
+
+def parse_brother_mono(page):
+    """Return {'Black': level} from Brother MFC-7860DW maintenance page"""
+    lines = page.splitlines()
+    for index, line in enumerate(lines):
+        if 'Toner**' in line and index + 2 < len(lines):
+            return {'Black': _squares(lines[index + 2])}
+    return {}
+
+
+BROTHER_TONER = re.compile(r'Toner (Yellow|Black|Magenta|Cyan) \([CMYK]\)\*\*')
+
+
+def parse_brother_color(page):
+    """Return {color: level} from Brother MFC-9465CDN maintenance page"""
+    levels = {}
+    lines = page.splitlines()
+    for index, line in enumerate(lines):
+        match = BROTHER_TONER.search(line)
+        if match and index + 2 < len(lines):
+            levels[match.group(1)] = _squares(lines[index + 2])
+    return levels
+
+
+XEROX_LEVEL = re.compile(r'(\d+)&#37;')
+
+
+def parse_xerox(page):
+    """Return {color: level} from Xerox 6015 MFP supplies page,
+    levels are listed in CMYK order"""
+    return dict(zip(COLORS, (int(level) for level in
+                             XEROX_LEVEL.findall(page))))
+
+
+# model: (status page path, parser returning {color: level} from page),
+# new models are supported by adding their parser here
+MODELS = {
+    'brother_7860': ('/etc/mnt_info.html?kind=item', parse_brother_mono),
+    'brother_9465': ('/etc/mnt_info.html?kind=item', parse_brother_color),
+    'xerox_6015': ('/status/statsuppliesx.asp', parse_xerox),
+}
+
+
+def read_printers(path=printers_file):
+    """Return [(printer, model)] from printers file"""
+    printers = []
+    try:
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                if len(fields) != 2 or fields[1] not in MODELS:
+                    raise SnapshotError("%s:%d: expected 'printer model', "
+                                        "model one of %s" % (
+                                            path, number,
+                                            ', '.join(sorted(MODELS))))
+                printers.append(tuple(fields))
+    except (IOError, OSError) as e:
+        raise SnapshotError("can't read printers file: %s" % e)
+    return printers
+
+
+def scrape(printer, model, timeout=http_timeout):
+    """Return {color: level} read from printer status page"""
+    path, parse = MODELS[model]
+    try:
+        response = urlopen('http://%s%s' % (printer, path), timeout=timeout)
+        page = response.read().decode('latin-1')
+    except (URLError, IOError) as e:
+        raise SnapshotError("%s request failed with %s" % (printer, e))
+    levels = parse(page)
+    if not levels:
+        raise SnapshotError("no toner levels on %s status page" % printer)
+    return levels
+
+
+def poll(printers, old=None, workers=max_workers, timeout=http_timeout):
+    """Scrape printers concurrently, return {printer: entry} table,
+    entry of unreachable printer keeps levels of old table marked stale"""
+    old_table = (old or {}).get('printers', {})
+    models = dict(printers)
+    results = snapshot_cache.run_parallel(
+        lambda printer: scrape(printer, models[printer], timeout),
+        list(models), workers)
+    now = time.time()
+    table = {}
+    for printer, (levels, error) in results.items():
+        if error is None:
+            table[printer] = {'model': models[printer], 'levels': levels,
+                              'updated': now, 'stale': False, 'error': None}
+            continue
+        previous = old_table.get(printer, {})
+        if previous.get('model') != models[printer]:
+            previous = {}
+        table[printer] = {'model': models[printer],
+                          'levels': previous.get('levels', {}),
+                          'updated': previous.get('updated'),
+                          'stale': True, 'error': error}
+    return {'printers': table}
+
+
+def cache_path(directory=None):
+    return os.path.join(directory or cache_dir, "toner_levels.json")
+
+
+def get_table(path=None, ttl=cache_ttl, printers=None, workers=max_workers):
+    """Return printers table from cache, polling printers from
+    printers file if it is too old"""
+    def update(old):
+        return poll(printers if printers is not None else read_printers(),
+                    old, workers)
+    return snapshot_cache.update_cached(path or cache_path(), ttl,
+                                        update)['printers']
+
+
+def lookup(table, printer, color):
+    """Return toner level of printer, or 1/0 stale marker"""
+    entry = table.get(printer)
+    if entry is None:
+        raise SnapshotError("no such printer %s" % printer)
+    if color == 'stale':
+        return int(entry['stale'])
+    if color not in entry['levels']:
+        if entry['error']:
+            raise SnapshotError(entry['error'])
+        raise SnapshotError("no %s toner on %s" % (color, printer))
+    return entry['levels'][color]
+
+
+def _fail(msg):
+    print(msg)
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Printer toner levels from shared cache')
+    parser.add_argument('args', nargs='*', metavar='printer',
+                        help='printer and color (or stale)')
+    parser.add_argument('-r', dest='refresh', action='store_true',
+                        help='Poll all printers and replace cached table')
+    parser.add_argument('-j', dest='workers', type=int, default=max_workers,
+                        help='Printers polled at once (default: %(default)s)')
+    parser.add_argument('-f', dest='printers', default=printers_file,
+                        help='Printers file (default: %(default)s)')
+    parser.add_argument('-d', dest='cache_dir', default=cache_dir,
+                        help='Cache directory (default: %(default)s)')
+    parser.add_argument('-t', dest='cache_ttl', type=int, default=cache_ttl,
+                        help='Cache TTL in seconds (default: %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        printers = read_printers(args.printers)
+    except SnapshotError as e:
+        _fail(e)
+
+    if args.refresh:
+        table = get_table(cache_path(args.cache_dir), 0, printers,
+                          args.workers)
+        failed = False
+        for printer, _ in printers:
+            entry = table[printer]
+            if entry['stale']:
+                failed = True
+                print("%s: %s" % (printer, entry['error']))
+            else:
+                print("%s: %s" % (printer, ', '.join(
+                    "%s %d" % item for item in sorted(
+                        entry['levels'].items()))))
+        if failed:
+            sys.exit(1)
+        return
+
+    if len(args.args) != 2:
+        parser.error("printer and color are required")
+    printer, color = args.args
+    try:
+        print(lookup(get_table(cache_path(args.cache_dir), args.cache_ttl,
+                               printers, args.workers), printer, color))
+    except SnapshotError as e:
+        _fail(e)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Shared snapshot of 3ware RAID controllers state.
+# Runs tw-cli info and tw-cli info cX once per TTL and caches parsed
+# controller -> unit -> port -> status model in a file,
+# so 3ware_discovery.py, 3ware_status.py and nagios check_3ware.py
+# share one set of tw-cli calls.
+# Controllers are queried in parallel, controllers which failed or timed
+# out are reported in 'errors' of the model, so others are still checked.
+#
+# Incremental mode (get_snapshot_incremental) reads only controller alarms
+# (AENs) newer than cursor persisted in the cache file and re-reads disks
+# of controllers which got new alarms, full rescan is done once per
+# rescan interval.
+#
+# Caching is done by snapshot_cache.py, which must be installed
+# in the same directory.
+#
+# Can also be run directly to refresh the cache, for example from cron:
+#   tw_snapshot.py [cache_file [ttl]]
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+# inspired by 3ware_status utility
+
+import sys
+import re
+import time
+
+import snapshot_cache
+
+binary_path = "/usr/sbin/tw-cli"
+cache_file = "/var/cache/raid-snapshot/tw_snapshot.json"
+cache_ttl = 60
+# timeout for single tw-cli call and number of controllers queried at once
+call_timeout = 8
+max_workers = 4
+# full rescan interval for incremental mode
+rescan_interval = 3600
+
+SnapshotError = snapshot_cache.SnapshotError
+
+CONTROLLER_RE = re.compile(r'^c[0-9]+$')
+PORT_RE = re.compile(r'^p[0-9]+$')
+ALARM_RE = re.compile(r'^c[0-9]+\s+\[([^\]]+)\]\s+(\S+)\s+(.*?)\s*$')
+
+
+def parse_controllers(data):
+    controllers = []
+    for line in data.splitlines():
+        if line:
+            controller = line.split()[0]
+            if CONTROLLER_RE.match(controller):
+                controllers.append(controller)
+    return controllers
+
+
+def parse_disks(data):
+    """Parse tw-cli info cX output, return {unit: {port: status}}"""
+    units = {}
+    for line in data.splitlines():
+        if line:
+            splitted = line.split()
+            if PORT_RE.match(splitted[0]):
+                # '-' means the drive doesn't belong to any array
+                # If is NOT PRESENT too, it just means this is an empty port
+                port, status, unit = splitted[0], splitted[1], splitted[2]
+                if not unit == '-' and not status == 'NOT-PRESENT':
+                    units.setdefault(unit, {})[port] = status
+    return units
+
+
+def parse_alarms(data):
+    """Parse tw-cli /cX show alarms output,
+    return [(timestamp, severity, message)]"""
+    alarms = []
+    for line in data.splitlines():
+        res = ALARM_RE.match(line)
+        if res is None:
+            continue
+        try:
+            timestamp = time.mktime(time.strptime(res.group(1),
+                                                  '%a %b %d %Y %H:%M:%S'))
+        except ValueError:
+            continue
+        alarms.append((timestamp, res.group(2), res.group(3)))
+    return alarms
+
+
+def new_alarms(alarms, cursor):
+    """Return (alarms newer than cursor, new cursor),
+    cursor is None for never seen controller, all its alarms are old"""
+    if cursor is None:
+        new = []
+        cursor = {'time': 0, 'seen': []}
+    else:
+        # alarms have one second resolution, remember ones already seen
+        new = [a for a in alarms if a[0] > cursor['time'] or
+               (a[0] == cursor['time'] and a[2] not in cursor['seen'])]
+    latest = max([a[0] for a in alarms] + [cursor['time']])
+    seen = [a[2] for a in alarms if a[0] == latest]
+    if latest == cursor['time']:
+        seen = sorted(set(seen + cursor['seen']))
+    return new, {'time': latest, 'seen': seen}
+
+
+def query_controllers(binary, timeout):
+    rc, raw_data, err = snapshot_cache.run(binary, ['info'], timeout)
+    if rc != 0:
+        raise SnapshotError("tw-cli command failed with %s " % err)
+    return parse_controllers(raw_data)
+
+
+def query_disks(binary, controller, timeout):
+    rc, raw_data, err = snapshot_cache.run(binary, ['info', controller],
+                                           timeout)
+    if rc != 0:
+        raise SnapshotError("tw-cli command failed with %s " % err)
+    return parse_disks(raw_data)
+
+
+def query_alarms(binary, controller, timeout):
+    rc, raw_data, err = snapshot_cache.run(
+        binary, ['/' + controller, 'show', 'alarms'], timeout)
+    if rc != 0:
+        raise SnapshotError("tw-cli command failed with %s " % err)
+    return parse_alarms(raw_data)
+
+
+def take_snapshot(binary=binary_path, timeout=call_timeout,
+                  workers=max_workers):
+    """Query all controllers with tw-cli, return snapshot model"""
+    controllers = {}
+    errors = {}
+    results = snapshot_cache.run_parallel(
+        lambda controller: query_disks(binary, controller, timeout),
+        query_controllers(binary, timeout), workers)
+    for controller, (units, error) in results.items():
+        if error is None:
+            controllers[controller] = units
+        else:
+            errors[controller] = error
+    return {'time': time.time(), 'controllers': controllers,
+            'errors': errors}
+
+
+def get_snapshot(binary=binary_path, path=cache_file, ttl=cache_ttl,
+                 timeout=call_timeout, workers=max_workers):
+    """Return snapshot from cache, refreshing it if it is too old"""
+    def update(old):
+        snapshot = take_snapshot(binary, timeout, workers)
+        # keep state of incremental mode sharing the file, full snapshot
+        # is as good as its rescan
+        snapshot['rescan'] = snapshot['time']
+        snapshot['alarms'] = (old or {}).get('alarms', {})
+        return snapshot
+    return snapshot_cache.update_cached(path, ttl, update)
+
+
+def refresh_snapshot(old, binary=binary_path, timeout=call_timeout,
+                     workers=max_workers, rescan=rescan_interval):
+    """Return snapshot updated from old one by new controller alarms,
+    do full rescan if there is no old snapshot or it is too old"""
+    now = time.time()
+    full = old is None or now - old.get('rescan', 0) > rescan
+    if full:
+        controllers = query_controllers(binary, timeout)
+        old = old or {'controllers': {}}
+    else:
+        controllers = list(old['controllers']) + list(old.get('errors', {}))
+    cursors = old.get('alarms', {})
+
+    def poll(controller):
+        # alarms are read before disks, so alarm raised in between
+        # is seen on next run
+        alarms, cursor = new_alarms(query_alarms(binary, controller, timeout),
+                                    cursors.get(controller))
+        units = old['controllers'].get(controller)
+        if full or alarms or units is None:
+            units = query_disks(binary, controller, timeout)
+        return units, cursor
+
+    snapshot = {'time': now, 'rescan': now if full else old['rescan'],
+                'controllers': {}, 'errors': {}, 'alarms': {}}
+    results = snapshot_cache.run_parallel(poll, controllers, workers)
+    for controller, (result, error) in results.items():
+        if error is None:
+            units, cursor = result
+            snapshot['controllers'][controller] = units
+            snapshot['alarms'][controller] = cursor
+        else:
+            snapshot['errors'][controller] = error
+            if controller in cursors:
+                snapshot['alarms'][controller] = cursors[controller]
+    return snapshot
+
+
+def get_snapshot_incremental(binary=binary_path, path=cache_file,
+                             ttl=cache_ttl, timeout=call_timeout,
+                             workers=max_workers, rescan=rescan_interval):
+    """Return snapshot from cache, updating it by new alarms
+    if it is too old"""
+    return snapshot_cache.update_cached(
+        path, ttl,
+        lambda old: refresh_snapshot(old, binary, timeout, workers, rescan))
+
+
+def iter_disks(snapshot):
+    """Yield (controller, unit, port, status) for all disks in snapshot"""
+    for controller, units in sorted(snapshot['controllers'].items()):
+        for unit, ports in sorted(units.items()):
+            for port, status in sorted(ports.items()):
+                yield controller, unit, port, status
+
+
+def disk_statuses(snapshot):
+    """Return [(name, status)] for all disks, name is in form cNuNpN"""
+    return [(controller + unit + port, status) for controller, unit, port,
+            status in iter_disks(snapshot)]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else cache_file
+    ttl = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    try:
+        get_snapshot(path=path, ttl=ttl)
+    except SnapshotError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Minimal Zabbix sender (trapper protocol) implementation,
+# used by collectors to push many values in single request
+# instead of forking zabbix_sender or one UserParameter per item.
+#
+# License: MIT
+# Author: Alexander Bulimov, lazywolf0@gmail.com
+
+import re
+import json
+import time
+import zlib
+import socket
+import struct
+
+ZBX_HEADER = b'ZBXD'
+ZBX_FLAG_PROTOCOL = 0x01
+ZBX_FLAG_COMPRESSED = 0x02
+ZBX_FLAG_LARGE = 0x04
+
+
+class SenderError(Exception):
+    pass
+
+
+def read_agent_config(path):
+    """Return (server, port, hostname) from zabbix agent config,
+    missing values are None"""
+    server = port = hostname = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#') or '=' not in line:
+                continue
+            key, value = [s.strip() for s in line.split('=', 1)]
+            if key == 'Hostname':
+                hostname = value
+            elif key == 'ServerActive' and server is None:
+                # first active server, may be in form host:port
+                server = value.split(',')[0].strip()
+                res = re.match(r'^\[?([^\]]+?)\]?:([0-9]+)$', server)
+                if res:
+                    server, port = res.group(1), int(res.group(2))
+    return server, port, hostname
+
+
+def pack(request):
+    """Pack request dict into trapper protocol packet"""
+    data = json.dumps(request).encode('utf-8')
+    return (ZBX_HEADER + struct.pack('<B', ZBX_FLAG_PROTOCOL) +
+            struct.pack('<II', len(data), 0) + data)
+
+
+def build_request(items, clock=None):
+    """Build sender data request from (host, key, value) items"""
+    clock = int(clock or time.time())
+    data = [{'host': host, 'key': key, 'value': value, 'clock': clock}
+            for host, key, value in items]
+    return {'request': 'sender data', 'data': data, 'clock': clock}
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise SenderError("connection closed by server")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_packet(sock):
+    """Read one trapper protocol packet from socket, return decoded dict"""
+    header = _recv_exactly(sock, 5)
+    if header[:4] != ZBX_HEADER:
+        raise SenderError("bad response header %r" % header)
+    flags = struct.unpack('<B', header[4:5])[0]
+    if flags & ZBX_FLAG_LARGE:
+        length, _ = struct.unpack('<QQ', _recv_exactly(sock, 16))
+    else:
+        length, _ = struct.unpack('<II', _recv_exactly(sock, 8))
+    data = _recv_exactly(sock, length)
+    if flags & ZBX_FLAG_COMPRESSED:
+        data = zlib.decompress(data)
+    try:
+        return json.loads(data.decode('utf-8'))
+    except ValueError:
+        raise SenderError("bad response %r" % data[:100])
+
+
+def parse_info(info):
+    """Parse 'processed: 1; failed: 0; total: 1; ...' response info"""
+    result = {}
+    for name in ('processed', 'failed', 'total'):
+        res = re.search(r'%s:\s*([0-9]+)' % name, info)
+        result[name] = int(res.group(1)) if res else 0
+    return result
+
+
+def send(server, port, items, timeout=10, clock=None):
+    """Send (host, key, value) items in single request,
+    return dict with processed, failed and total counts"""
+    packet = pack(build_request(items, clock))
+    try:
+        sock = socket.create_connection((server, port), timeout)
+    except (socket.error, socket.timeout) as e:
+        raise SenderError("can not connect to %s:%s - %s" % (server, port, e))
+    try:
+        sock.sendall(packet)
+        response = read_packet(sock)
+    except (socket.error, socket.timeout) as e:
+        raise SenderError("error talking to %s:%s - %s" % (server, port, e))
+    finally:
+        sock.close()
+    if response.get('response') != 'success':
+        raise SenderError("server responded with %s" % response)
+    return parse_info(response.get('info', ''))